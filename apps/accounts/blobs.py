@@ -0,0 +1,277 @@
+import hashlib
+import os
+import secrets
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, router, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Attachment, Blob, UploadSession
+from .sharding import data_databases
+
+CHUNK_SIZE = 64 * 1024
+# A write claims its session for this long, and keeps renewing the claim
+# while it writes; the claim of a writer that died expires.
+UPLOAD_CLAIM_TIMEOUT = getattr(settings, 'UPLOAD_CLAIM_TIMEOUT', timedelta(seconds=30))
+
+
+class UploadError(Exception):
+    pass
+
+
+class UploadConflict(UploadError):
+    def __init__(self, offset):
+        super().__init__('Przesunięcie nie zgadza się z ilością odebranych danych.')
+        self.offset = offset
+
+
+class _PartFile(File):
+    # FileSystemStorage moves files that expose a temporary path instead of
+    # copying them.
+    def temporary_file_path(self):
+        return self.name
+
+
+def blob_path(sha256):
+    return f'blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}'
+
+
+def file_sha256(file):
+    digest = hashlib.sha256()
+    for chunk in file.chunks(CHUNK_SIZE):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _acquire(sha256, using):
+    updated = Blob.objects.using(using).filter(sha256=sha256).update(ref_count=F('ref_count') + 1)
+    if updated:
+        return Blob.objects.using(using).get(sha256=sha256)
+    return None
+
+
+def store_blob(file, sha256=None, using='default'):
+    """Return the Blob for the file content, storing it only if it is new."""
+    sha256 = sha256 or file_sha256(file)
+    blob = _acquire(sha256, using)
+    if blob is not None:
+        return blob
+
+    file.seek(0)
+    name = default_storage.save(blob_path(sha256), file)
+    try:
+        with transaction.atomic(using=using):
+            return Blob.objects.using(using).create(
+                sha256=sha256, file=name, size=default_storage.size(name), ref_count=1
+            )
+    except IntegrityError:
+        # Someone stored the same content first; keep theirs.
+        default_storage.delete(name)
+        blob = _acquire(sha256, using)
+        if blob is None:
+            raise
+        return blob
+
+
+def release_blob(blob_id, using='default'):
+    Blob.objects.using(using).filter(pk=blob_id, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+    orphan = Blob.objects.using(using).filter(pk=blob_id, ref_count=0).values_list('file', flat=True).first()
+    if orphan is None:
+        return
+    deleted, _ = Blob.objects.using(using).filter(pk=blob_id, ref_count=0).delete()
+    if not deleted:
+        # Attached again since the read above; the file is in use.
+        return
+    # Blobs are per shard, but shards with the same content share its file.
+    if any(Blob.objects.using(alias).filter(file=orphan).exists() for alias in data_databases() if alias != using):
+        return
+    transaction.on_commit(lambda: default_storage.delete(orphan), using=using)
+
+
+def attach_file(task, user, file, name=None, sha256=None, using=None):
+    using = using or router.db_for_write(Attachment, instance=task)
+    with transaction.atomic(using=using):
+        blob = store_blob(file, sha256=sha256, using=using)
+        attachment = Attachment(
+            task=task,
+            file=blob.file.name,
+            blob=blob,
+            name=(name or os.path.basename(file.name))[:255],
+            size=blob.size,
+            uploaded_by=user,
+        )
+        attachment.save(using=using)
+    return attachment
+
+
+def attach_existing(task, user, name, sha256, using=None):
+    """Attach already stored content by hash without receiving it again."""
+    using = using or router.db_for_write(Attachment, instance=task)
+    with transaction.atomic(using=using):
+        blob = _acquire(sha256, using)
+        if blob is None:
+            return None
+        attachment = Attachment(
+            task=task, file=blob.file.name, blob=blob, name=name[:255], size=blob.size, uploaded_by=user
+        )
+        attachment.save(using=using)
+    return attachment
+
+
+def start_upload(task, user, filename, size, sha256='', using=None):
+    using = using or router.db_for_write(UploadSession, instance=task)
+    if size > settings.ATTACHMENT_MAX_SIZE:
+        raise UploadError(f'Plik jest za duży (maks. {settings.ATTACHMENT_MAX_SIZE} bajtów).')
+    session = UploadSession.objects.using(using).create(
+        task=task, user=user, filename=filename[:255], size=size, sha256=sha256
+    )
+    os.makedirs(settings.UPLOAD_SESSION_DIR, exist_ok=True)
+    open(session.part_path, 'wb').close()
+    return session
+
+
+def _conflict(session, using):
+    session.refresh_from_db(using=using, fields=['offset'])
+    return UploadConflict(session.offset)
+
+
+def append_chunk(session, stream, offset, length=None, using=None):
+    """Write the request body at offset and return the new offset.
+
+    The body is copied in CHUNK_SIZE reads, so a chunk of any size is never
+    held in memory. A writer first claims the session at the stored offset,
+    so concurrent requests for the same bytes get a conflict instead of
+    writing over each other; the offset advances when the claim is released.
+    """
+    using = using or router.db_for_write(UploadSession, instance=session)
+    if offset != session.offset:
+        raise UploadConflict(session.offset)
+    remaining = session.size - offset
+    if length is not None and length > remaining:
+        raise UploadError('Fragment wykracza poza zadeklarowany rozmiar pliku.')
+
+    sessions = UploadSession.objects.using(using).filter(pk=session.pk)
+    token = secrets.token_hex(16)
+    claimed = sessions.filter(offset=offset).filter(
+        Q(writer='') | Q(updated_at__lt=timezone.now() - UPLOAD_CLAIM_TIMEOUT)
+    ).update(writer=token, updated_at=timezone.now())
+    if not claimed:
+        raise _conflict(session, using)
+    claim = sessions.filter(writer=token)
+
+    written = 0
+    renewed = time.monotonic()
+    with open(session.part_path, 'r+b') as part:
+        try:
+            part.seek(offset)
+            while True:
+                chunk = stream.read(min(CHUNK_SIZE, remaining - written + 1))
+                if not chunk:
+                    break
+                if written + len(chunk) > remaining:
+                    raise UploadError('Fragment wykracza poza zadeklarowany rozmiar pliku.')
+                if time.monotonic() - renewed > UPLOAD_CLAIM_TIMEOUT.total_seconds() / 3:
+                    # Reading the body can stall; never write once the claim
+                    # may have passed to another request.
+                    if not claim.update(updated_at=timezone.now()):
+                        raise _conflict(session, using)
+                    renewed = time.monotonic()
+                part.write(chunk)
+                written += len(chunk)
+            # Drop anything a writer that died left past the new offset.
+            part.truncate()
+        except BaseException:
+            if claim.update(writer='', updated_at=timezone.now()):
+                part.truncate(offset)
+            raise
+
+    if not claim.update(offset=offset + written, writer='', updated_at=timezone.now()):
+        raise _conflict(session, using)
+    session.offset = offset + written
+    return session.offset
+
+
+def complete_upload(session, using=None):
+    using = using or router.db_for_write(UploadSession, instance=session)
+    if session.offset != session.size:
+        raise UploadConflict(session.offset)
+    path = str(session.part_path)
+    if not os.path.exists(path):
+        # Moved into storage by an attempt that rolled back afterwards.
+        session.delete(using=using)
+        raise UploadError('Odebrane dane zostały utracone; rozpocznij przesyłanie od nowa.')
+    with _PartFile(open(path, 'rb'), name=path) as part:
+        sha256 = file_sha256(part)
+        if session.sha256 and session.sha256 != sha256:
+            raise UploadError('Suma kontrolna SHA-256 nie zgadza się z odebranymi danymi.')
+        # The session goes with the attachment, so a retry never finds one
+        # whose part file was already moved into storage.
+        with transaction.atomic(using=using):
+            attachment = attach_file(
+                session.task, session.user, part, name=session.filename, sha256=sha256, using=using
+            )
+            session.delete(using=using)
+    if os.path.exists(path):
+        # Content that was already stored leaves the part file behind.
+        os.remove(path)
+    return attachment
+
+
+def abort_upload(session, using=None):
+    using = using or router.db_for_write(UploadSession, instance=session)
+    path = session.part_path
+    session.delete(using=using)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _stored_files(directory):
+    directories, files = default_storage.listdir(directory)
+    for name in files:
+        yield f'{directory}/{name}'
+    for subdirectory in directories:
+        yield from _stored_files(f'{directory}/{subdirectory}')
+
+
+def cleanup_uploads(max_age=None, dry_run=False, using=None):
+    """Remove abandoned upload sessions and stored files nothing refers to.
+
+    Cleans ``using``, or every shard; files are kept while any shard refers
+    to them, and while they are newer than ``max_age``.
+    """
+    max_age = max_age if max_age is not None else settings.UPLOAD_SESSION_MAX_AGE
+    databases = [using] if using else data_databases()
+    sessions, unused = [], []
+    for alias in databases:
+        stale = UploadSession.objects.using(alias).filter(updated_at__lt=timezone.now() - max_age)
+        sessions += stale
+        unused += Blob.objects.using(alias).filter(ref_count=0).values_list('file', flat=True)
+    if not dry_run:
+        for session in sessions:
+            abort_upload(session, using=session._state.db)
+        for alias in databases:
+            Blob.objects.using(alias).filter(ref_count=0, attachments__isnull=True).delete()
+
+    referenced = set()
+    for alias in {*databases, *data_databases()}:
+        referenced.update(Blob.objects.using(alias).filter(ref_count__gt=0).values_list('file', flat=True))
+        referenced.update(Attachment.objects.using(alias).values_list('file', flat=True))
+    orphans = set(unused) - referenced
+    for directory in ('attachments', 'blobs'):
+        if default_storage.exists(directory):
+            orphans.update(name for name in _stored_files(directory) if name not in referenced)
+    # A file saved moments ago may belong to a row that is not committed yet.
+    cutoff = timezone.now() - max_age
+    orphans = {
+        name for name in orphans
+        if default_storage.exists(name) and default_storage.get_modified_time(name) < cutoff
+    }
+    if not dry_run:
+        for name in orphans:
+            default_storage.delete(name)
+    return len(sessions), sorted(orphans)
@@ -0,0 +1,104 @@
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+from rest_framework.exceptions import NotFound, ValidationError
+
+from .fractional import keys_between
+from .membership import get_team_ids
+from .models import Team, Task
+from .sharding import databases_for_teams
+from .signals import tasks_bulk_updated
+
+BULK_FIELDS = ('status', 'priority', 'assigned_to', 'due_date')
+
+
+def _load_members(team_ids, user_ids, using):
+    if not user_ids:
+        return {}
+    rows = Team.members.through.objects.using(using).filter(
+        team_id__in=team_ids, user_id__in=user_ids
+    ).select_related('user')
+    return {(row.team_id, row.user_id): row.user for row in rows}
+
+
+def _column_tops(columns, using):
+    rows = Task.objects.using(using).filter(
+        project_id__in={project_id for project_id, _ in columns}, status__in={status for _, status in columns}
+    ).exclude(position='').order_by().values('project_id', 'status').annotate(first=Min('position'))
+    return {(row['project_id'], row['status']): row['first'] for row in rows}
+
+
+def bulk_update_tasks(user, changes, using=None):
+    changes = {change['id']: change for change in changes}
+    team_ids = get_team_ids(user)
+    # With shards the tasks can be in several databases; each gets a
+    # transaction, and none commits unless every change is valid.
+    databases = {using: team_ids} if using else databases_for_teams(team_ids)
+    with ExitStack() as stack:
+        for alias in databases:
+            stack.enter_context(transaction.atomic(using=alias))
+        tasks = [
+            task
+            for alias in databases
+            for task in Task.objects.using(alias).select_related('project', 'assigned_to').filter(
+                pk__in=changes
+            ).select_for_update(of=('self',))
+        ]
+        # Access is decided per project, not per task.
+        allowed = {}
+        tasks = [
+            task for task in tasks
+            if allowed.setdefault(task.project_id, task.project.team_id in team_ids)
+        ]
+        missing = set(changes) - {task.pk for task in tasks}
+        if missing:
+            raise NotFound(f'Nie znaleziono zadań: {", ".join(map(str, sorted(missing)))}')
+
+        by_database = defaultdict(list)
+        for task in tasks:
+            by_database[task._state.db].append(task)
+        assignees = {change['assigned_to'] for change in changes.values() if change.get('assigned_to')}
+        members = {}
+        for alias, group in by_database.items():
+            members.update(_load_members({task.project.team_id for task in group}, assignees, alias))
+        errors = {}
+        fields = set()
+        now = timezone.now()
+        order = {pk: i for i, pk in enumerate(changes)}
+        tasks.sort(key=lambda task: order[task.pk])
+        arriving = defaultdict(lambda: defaultdict(list))
+        for task in tasks:
+            change = changes[task.pk]
+            if change.get('status', task.status) != task.status:
+                arriving[task._state.db][task.project_id, change['status']].append(task)
+            for field in BULK_FIELDS:
+                if field not in change:
+                    continue
+                value = change[field]
+                if field == 'assigned_to' and value is not None:
+                    value = members.get((task.project.team_id, value))
+                    if value is None:
+                        errors[str(task.pk)] = 'Użytkownik nie jest członkiem zespołu.'
+                        continue
+                setattr(task, field, value)
+                fields.add(field)
+            task.updated_at = now
+        if errors:
+            raise ValidationError({'tasks': errors})
+
+        # Cards sent to another column go to its top, in request order.
+        for alias, columns in arriving.items():
+            tops = _column_tops(columns, alias)
+            for column, group in columns.items():
+                for task, position in zip(group, keys_between(None, tops.get(column), len(group))):
+                    task.position = position
+            fields.add('position')
+
+        for alias, group in by_database.items():
+            Task.objects.using(alias).bulk_update(group, [*sorted(fields), 'updated_at'])
+            tasks_bulk_updated.send(sender=Task, tasks=group, fields=fields, using=alias)
+
+    return tasks
@@ -0,0 +1,136 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+from .membership import get_team_ids
+from .models import Change
+
+CHANGE_PAGE_SIZE = 500
+CHANGE_MAX_PAGE_SIZE = 1000
+COMPACT_BATCH_SIZE = 1000
+
+
+class CursorExpired(Exception):
+    """The entries after the cursor were compacted away; a full resync is needed."""
+
+
+def project_data(project):
+    return {
+        'id': project.pk,
+        'name': project.name,
+        'description': project.description,
+        'team_id': project.team_id,
+        'updated_at': project.updated_at,
+    }
+
+
+def task_data(task):
+    return {
+        'id': task.pk,
+        'project_id': task.project_id,
+        'title': task.title,
+        'description': task.description,
+        'status': task.status,
+        'position': task.position,
+        'priority': task.priority,
+        'due_date': task.due_date,
+        'assigned_to_id': task.assigned_to_id,
+        'updated_at': task.updated_at,
+    }
+
+
+def comment_data(comment):
+    return {
+        'id': comment.pk,
+        'task_id': comment.task_id,
+        'author_id': comment.author_id,
+        'content': comment.content,
+        'created_at': comment.created_at,
+        'updated_at': comment.updated_at,
+    }
+
+
+def attachment_data(attachment):
+    return {
+        'id': attachment.pk,
+        'task_id': attachment.task_id,
+        'name': attachment.display_name,
+        'size': attachment.size,
+        'uploaded_by_id': attachment.uploaded_by_id,
+        'created_at': attachment.created_at,
+    }
+
+
+def change(kind, object_id, action, team_id=None, project_id=None, user_id=None, data=None):
+    """Build an unsaved entry; deletions carry only the id by default."""
+    if data is None:
+        data = {'id': object_id}
+    return Change(
+        kind=kind, object_id=object_id, action=action,
+        team_id=team_id, project_id=project_id, user_id=user_id, data=data,
+    )
+
+
+def record_changes(changes, using='default'):
+    # Written in the same transaction as the change itself, so a rolled
+    # back write never shows up in the feed.
+    changes = list(changes)
+    if using in settings.DATABASE_SHARDS:
+        # The feed is in 'default'; changes on a shard can only follow its
+        # commit, and are lost if the process dies in between.
+        transaction.on_commit(lambda: record_changes(changes), using=using)
+        return
+    if len(changes) == 1:
+        changes[0].save(using=using)
+    elif changes:
+        Change.objects.using(using).bulk_create(changes)
+
+
+def latest_cursor(using='default'):
+    return Change.objects.using(using).aggregate(cursor=Max('id'))['cursor'] or 0
+
+
+def changes_since(user, cursor, limit=CHANGE_PAGE_SIZE):
+    """
+    Return (entries, next_cursor, has_more) for changes after the cursor
+    that the user may see: everything in their teams, plus their own
+    membership entries so that removals reach them too.
+
+    Cursors are Change ids. Joining a team makes no entries for its existing
+    projects and tasks, so clients should do a full fetch of a team when
+    they see their own 'membership' 'created' entry.
+    """
+    # Compaction always keeps the newest entry, so the first retained id
+    # tells whether anything after the cursor was removed.
+    oldest = Change.objects.aggregate(oldest=Min('id'))['oldest']
+    if oldest is not None and cursor + 1 < oldest:
+        raise CursorExpired(cursor)
+    entries = list(
+        Change.objects.filter(
+            Q(team_id__in=get_team_ids(user)) | Q(kind='membership', user_id=user.pk), id__gt=cursor
+        ).order_by('id')[:limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    return entries, entries[-1].pk if entries else cursor, has_more
+
+
+def compact_changes(max_age=None, dry_run=False, using='default'):
+    """Delete entries older than CHANGE_LOG_RETENTION; return how many."""
+    max_age = max_age if max_age is not None else settings.CHANGE_LOG_RETENTION
+    before = timezone.now() - max_age
+    changes = Change.objects.using(using)
+    newest = changes.aggregate(newest=Max('id'))['newest']
+    if newest is None:
+        return 0
+    expired = changes.filter(created_at__lt=before, id__lt=newest)
+    if dry_run:
+        return expired.count()
+    deleted = 0
+    while True:
+        # Small batches keep each write lock on SQLite short.
+        batch = list(expired.order_by('id').values_list('id', flat=True)[:COMPACT_BATCH_SIZE])
+        if not batch:
+            return deleted
+        deleted += changes.filter(id__in=batch).delete()[0]
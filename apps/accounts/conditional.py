@@ -0,0 +1,100 @@
+import hashlib
+
+from django.contrib import messages
+from django.db.models import Count, F, Max, OuterRef, Subquery, Sum
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .membership import get_team_ids
+from .models import Profile, Project, Task, Comment, Attachment
+
+
+def _make_etag(*parts):
+    return quote_etag(hashlib.md5(repr(parts).encode()).hexdigest())
+
+
+def _last_modified(row):
+    # HTTP dates have whole-second precision; rounding up would turn every
+    # If-Modified-Since request into a miss.
+    timestamps = [value.timestamp() for value in row.values() if hasattr(value, 'timestamp')]
+    return int(max(timestamps, default=0)) or None
+
+
+def _latest_subquery(queryset, group_by, field):
+    return Subquery(queryset.order_by().values(group_by).annotate(latest=Max(field)).values('latest'))
+
+
+def project_validators(project, user):
+    # The team narrows the query to the project's shard.
+    row = Project.objects.filter(pk=project.pk, team_id=project.team_id).annotate(
+        tasks_modified=_latest_subquery(
+            Task.objects.filter(project_id=OuterRef('pk')), 'project_id', 'updated_at'
+        ),
+        comments_modified=_latest_subquery(
+            Comment.objects.filter(task__project_id=OuterRef('pk')), 'task__project_id', 'updated_at'
+        ),
+        attachments_modified=_latest_subquery(
+            Attachment.objects.filter(task__project_id=OuterRef('pk')), 'task__project_id', 'created_at'
+        ),
+        # Cards show the assignee's name and avatar, the page the viewer's.
+        # Profile edits and new thumbnails set updated_at.
+        assignees_modified=_latest_subquery(
+            Task.objects.filter(project_id=OuterRef('pk')), 'project_id', 'assigned_to__profile__updated_at'
+        ),
+        viewer_modified=Subquery(Profile.objects.filter(user_id=user.pk).values('updated_at')[:1]),
+    ).values(
+        'team_id', 'updated_at', 'team__updated_at', 'todo_count', 'in_progress_count', 'done_count',
+        'board_changed_at', 'team__members_changed_at', 'tasks_modified', 'comments_modified', 'attachments_modified', 'assignees_modified', 'viewer_modified',
+    ).first()
+    if row is None:
+        return None, None
+
+    etag = _make_etag(user.pk, user.username, sorted(row.items()))
+    return etag, _last_modified(row)
+
+
+def project_list_validators(queryset, user):
+    team_ids = sorted(get_team_ids(user))
+    row = queryset.order_by().aggregate(
+        count=Count('pk'),
+        modified=Max('updated_at'),
+        team_modified=Max('team__updated_at'),
+        tasks=Sum(F('todo_count') + F('in_progress_count') + F('done_count')),
+        # Teams without projects have nothing to list.
+        members_changed=Max('team__members_changed_at'),
+        projects_changed=Max('team__projects_changed_at'),
+    )
+    etag = _make_etag(user.pk, team_ids, sorted(row.items()))
+    return etag, _last_modified(row)
+
+
+def project_resource_validators(project, user):
+    row = {
+        'pk': project.pk,
+        'updated_at': project.updated_at,
+        'team__updated_at': project.team.updated_at,
+        'task_count': project.task_count,
+        'team__members_changed_at': project.team.members_changed_at,
+        'team__projects_changed_at': project.team.projects_changed_at,
+    }
+    etag = _make_etag(user.pk, sorted(row.items()))
+    return etag, _last_modified(row)
+
+
+def has_pending_messages(request):
+    return len(messages.get_messages(request)) > 0
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def not_modified_response(request, etag, last_modified):
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
@@ -0,0 +1,86 @@
+from collections import defaultdict
+
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Team, Project, Task
+
+TASK_COUNT_FIELDS = {status: f'{status}_count' for status, _ in Task.STATUS_CHOICES}
+
+
+def _count(queryset, group_by):
+    counts = queryset.order_by().values(group_by).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+def team_counter_expressions():
+    return {
+        'member_count': _count(
+            Team.members.through.objects.filter(team_id=OuterRef('pk')), 'team_id'
+        ),
+        'project_count': _count(Project.objects.filter(team_id=OuterRef('pk')), 'team_id'),
+    }
+
+
+def project_counter_expressions():
+    return {
+        field: _count(Task.objects.filter(project_id=OuterRef('pk'), status=status), 'project_id')
+        for status, field in TASK_COUNT_FIELDS.items()
+    }
+
+
+def adjust_task_counts(deltas, using='default'):
+    updates = defaultdict(dict)
+    for (project_id, status), delta in deltas.items():
+        field = TASK_COUNT_FIELDS.get(status)
+        if delta and project_id and field:
+            updates[project_id][field] = F(field) + delta
+    for project_id, fields in updates.items():
+        Project.objects.using(using).filter(pk=project_id).update(**fields)
+
+
+def adjust_project_count(team_id, delta, using='default'):
+    Team.objects.using(using).filter(pk=team_id).update(project_count=F('project_count') + delta)
+
+
+def refresh_member_counts(team_ids, using='default'):
+    Team.objects.using(using).filter(pk__in=team_ids).update(
+        member_count=team_counter_expressions()['member_count']
+    )
+
+
+def refresh_task_counts(project_ids, using='default'):
+    Project.objects.using(using).filter(pk__in=project_ids).update(**project_counter_expressions())
+
+
+def _batches(queryset, batch_size):
+    pks = list(queryset.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(pks), batch_size):
+        yield pks[start:start + batch_size]
+
+
+def find_drift(using='default'):
+    drift = []
+    for model, expressions in (
+        (Team, team_counter_expressions()),
+        (Project, project_counter_expressions()),
+    ):
+        expected = {f'expected_{field}': expression for field, expression in expressions.items()}
+        rows = model.objects.using(using).annotate(**expected).values('pk', *expressions, *expected)
+        for row in rows.iterator(chunk_size=2000):
+            for field in expressions:
+                if row[field] != row[f'expected_{field}']:
+                    drift.append((model.__name__, row['pk'], field, row[field], row[f'expected_{field}']))
+    return drift
+
+
+def rebuild_counters(batch_size=1000, using='default'):
+    updated = 0
+    for model, expressions in (
+        (Team, team_counter_expressions()),
+        (Project, project_counter_expressions()),
+    ):
+        queryset = model.objects.using(using)
+        for pks in _batches(queryset, batch_size):
+            updated += queryset.filter(pk__in=pks).update(**expressions)
+    return updated
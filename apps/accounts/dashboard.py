@@ -0,0 +1,102 @@
+import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count, F, Q, Window
+from django.utils import timezone
+
+from .membership import get_team_ids
+from .models import Team, Task, User
+from .routers import primary_reads
+from .sharding import per_database
+
+DASHBOARD_CACHE_TIMEOUT = getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 24 * 60 * 60)
+URGENT_TASK_LIMIT = 10
+OPEN_STATUSES = ('todo', 'in_progress')
+
+
+def _dashboard_key(user, today):
+    # Overdue counts change at midnight, so entries are per day.
+    return f'dashboard:{user.pk}:{user.date_joined.timestamp()}:{user.dashboard_version}:{today.isoformat()}'
+
+
+def compute_dashboard_summary(user, today=None):
+    today = today or timezone.localdate()
+    teams = list(
+        Team.objects.filter(pk__in=get_team_ids(user)).order_by('name', 'pk').values(
+            'id', 'name', 'owner_id', 'member_count', 'updated_at'
+        )
+    )
+    statuses = dict(Task.STATUS_CHOICES)
+    # The window counts over all open tasks before the LIMIT applies, so
+    # the overdue total comes with the urgent list in one query.
+    tasks = Task.objects.filter(assigned_to=user, status__in=OPEN_STATUSES).annotate(
+        overdue_total=Window(Count('pk', filter=Q(due_date__lt=today)))
+    ).order_by('due_date').values(
+        'id', 'title', 'priority', 'status', 'due_date', 'project__name', 'overdue_total'
+    )
+    # With shards every shard counts its own tasks.
+    rows, overdue_count = [], 0
+    for queryset in per_database(tasks):
+        shard_rows = list(queryset[:URGENT_TASK_LIMIT])
+        rows += shard_rows
+        overdue_count += shard_rows[0]['overdue_total'] if shard_rows else 0
+    rows.sort(key=lambda task: (task['due_date'] is not None, task['due_date'] or datetime.date.min))
+    rows = rows[:URGENT_TASK_LIMIT]
+    urgent_tasks = [
+        {
+            'id': task['id'],
+            'title': task['title'],
+            'priority': task['priority'],
+            'status': task['status'],
+            'status_label': statuses[task['status']],
+            'due_date': task['due_date'],
+            'project_name': task['project__name'],
+        }
+        for task in rows
+    ]
+    return {
+        'teams': teams,
+        'urgent_tasks': urgent_tasks,
+        'overdue_count': overdue_count,
+    }
+
+def get_dashboard_summary(user):
+    today = timezone.localdate()
+    # Like the team ids in membership.py, the entry is keyed on a version
+    # that comes with the user row, so changes reach every process.
+    key = _dashboard_key(user, today)
+    summary = cache.get(key)
+    if summary is None:
+        with primary_reads():
+            summary = compute_dashboard_summary(user, today)
+        cache.set(key, summary, DASHBOARD_CACHE_TIMEOUT)
+    return summary
+
+
+def invalidate_dashboards(user_ids, using=DEFAULT_DB_ALIAS):
+    """Bump the dashboard version of users affected by a change in ``using``."""
+    user_ids = {user_id for user_id in user_ids if user_id}
+    if not user_ids:
+        return
+
+    def bump():
+        User.objects.filter(pk__in=user_ids).update(dashboard_version=F('dashboard_version') + 1)
+
+    if using == DEFAULT_DB_ALIAS:
+        bump()
+    else:
+        # A request that read the new version before the shard commits would
+        # cache the old rows under it.
+        transaction.on_commit(bump, using=using)
+
+
+def invalidate_team_dashboards(team_ids, using='default'):
+    team_ids = set(team_ids) - {None}
+    if not team_ids:
+        return
+    invalidate_dashboards(
+        Team.members.through.objects.using(using).filter(team_id__in=team_ids).values_list('user_id', flat=True),
+        using=using,
+    )
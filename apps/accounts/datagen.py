@@ -0,0 +1,152 @@
+import math
+import random
+from collections import Counter
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from .counters import rebuild_counters
+from .fractional import keys_between
+from .imports import keep_timestamps
+from .models import Comment, Profile, Project, Task, Team, User
+
+DEFAULT_PASSWORD = 'benchmark'
+WORDS = (
+    'serwer baza danych migracja wdrożenie testy klient faktura raport błąd poprawka '
+    'spotkanie dokumentacja interfejs logowanie uprawnienia kopia zapasowa monitoring '
+    'aplikacja mobilna płatność integracja kolejka wydajność zapytanie indeks'
+).split()
+STATUS_WEIGHTS = {'todo': 35, 'in_progress': 20, 'done': 45}
+PRIORITY_WEIGHTS = {'low': 25, 'medium': 50, 'high': 25}
+# Project sizes follow a log-normal curve: most are small, a few are huge.
+SIZE_SIGMA = 0.75
+
+
+class DatasetExists(Exception):
+    pass
+
+
+def _sentence(rng, length):
+    # Zipf-like skew so that some words are common and others rare.
+    return ' '.join(WORDS[min(int(rng.expovariate(0.15)), len(WORDS) - 1)] for _ in range(length))
+
+
+def _skewed(rng, mean):
+    if mean <= 0:
+        return 0
+    return int(mean * rng.lognormvariate(0, SIZE_SIGMA) / math.exp(SIZE_SIGMA ** 2 / 2) + 0.5)
+
+
+def _weighted(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def generate_dataset(teams, members, projects, tasks, comments, seed=42, prefix='user', batch_size=5000,
+                     progress=None, using='default'):
+    """
+    Insert a synthetic data set with bulk_create(): ``teams`` teams of
+    ``members`` members from a shared pool of users, ``projects`` projects
+    per team, on average ``tasks`` tasks per project and ``comments``
+    comments per task. The same arguments and seed give the same data, with
+    dates relative to the current time.
+    Returns a Counter of the rows created.
+    """
+    if User.objects.using(using).filter(username__startswith=prefix).exists():
+        raise DatasetExists(f'Users named {prefix}* already exist.')
+    rng = random.Random(seed)
+    now = timezone.now()
+    counts = Counter()
+
+    # Each user is in about 1.5 teams, like people on several projects.
+    password = make_password(DEFAULT_PASSWORD)
+    pool = User.objects.using(using).bulk_create(
+        [
+            User(username=f'{prefix}{i}', email=f'{prefix}{i}@example.com', password=password)
+            for i in range(max(members, teams * members * 2 // 3, 1))
+        ],
+        batch_size=batch_size,
+    )
+    Profile.objects.using(using).bulk_create([Profile(user=user) for user in pool], batch_size=batch_size)
+    counts['users'] = len(pool)
+
+    team_objects = Team.objects.using(using).bulk_create(
+        [Team(name=f'Zespół {i}', description=_sentence(rng, 8), owner=pool[i % len(pool)]) for i in range(teams)],
+        batch_size=batch_size,
+    )
+    team_members = {}
+    memberships = []
+    for team in team_objects:
+        others = [user for user in rng.sample(pool, min(members, len(pool))) if user.pk != team.owner_id]
+        team_members[team.pk] = [team.owner_id] + [user.pk for user in others[:max(members - 1, 0)]]
+        memberships += [Team.members.through(team_id=team.pk, user_id=user_id) for user_id in team_members[team.pk]]
+    Team.members.through.objects.using(using).bulk_create(memberships, batch_size=batch_size)
+    counts['teams'], counts['memberships'] = len(team_objects), len(memberships)
+
+    project_objects = Project.objects.using(using).bulk_create(
+        [
+            Project(name=f'Projekt {team.pk}-{i}', description=_sentence(rng, 12), team=team)
+            for team in team_objects for i in range(projects)
+        ],
+        batch_size=batch_size,
+    )
+    counts['projects'] = len(project_objects)
+
+    with keep_timestamps(Task, Comment):
+        for project in project_objects:
+            with transaction.atomic(using=using):
+                _generate_tasks(rng, project, team_members[project.team_id], tasks, comments, now, batch_size,
+                                counts, using)
+            if progress:
+                progress(counts)
+
+    # bulk_create() skips the signals that keep the stored counters.
+    rebuild_counters(using=using)
+    return counts
+
+
+def _generate_tasks(rng, project, member_ids, tasks, comments, now, batch_size, counts, using):
+    task_objects = []
+    for _ in range(_skewed(rng, tasks)):
+        created_at = now - timedelta(seconds=rng.randint(0, 365 * 24 * 60 * 60))
+        due_date = None
+        if rng.random() < 0.6:
+            due_date = (now + timedelta(days=rng.randint(-30, 60))).date()
+        task_objects.append(Task(
+            project=project,
+            title=_sentence(rng, rng.randint(2, 6)).capitalize(),
+            description=_sentence(rng, rng.randint(0, 40)),
+            status=_weighted(rng, STATUS_WEIGHTS),
+            priority=_weighted(rng, PRIORITY_WEIGHTS),
+            due_date=due_date,
+            assigned_to_id=rng.choice(member_ids) if rng.random() < 0.85 else None,
+            created_by_id=rng.choice(member_ids),
+            created_at=created_at,
+            updated_at=created_at + timedelta(seconds=rng.randint(0, 30 * 24 * 60 * 60)),
+        ))
+    # Cards in each column get evenly spread keys, as after a rebalance.
+    for status in STATUS_WEIGHTS:
+        column = [task for task in task_objects if task.status == status]
+        for task, position in zip(column, keys_between(None, None, len(column))):
+            task.position = position
+    Task.objects.using(using).bulk_create(task_objects, batch_size=batch_size)
+    counts['tasks'] += len(task_objects)
+
+    comment_objects = []
+    for task in task_objects:
+        for _ in range(_skewed(rng, comments)):
+            created_at = task.created_at + timedelta(seconds=rng.randint(60, 14 * 24 * 60 * 60))
+            comment_objects.append(Comment(
+                task=task,
+                author_id=rng.choice(member_ids),
+                content=_sentence(rng, rng.randint(3, 30)),
+                created_at=created_at,
+                updated_at=created_at,
+            ))
+        if len(comment_objects) >= batch_size:
+            Comment.objects.using(using).bulk_create(comment_objects)
+            counts['comments'] += len(comment_objects)
+            comment_objects = []
+    Comment.objects.using(using).bulk_create(comment_objects)
+    counts['comments'] += len(comment_objects)
@@ -0,0 +1,139 @@
+import hashlib
+import mimetypes
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+# Types a browser shows without running anything in our origin; the rest
+# (HTML, SVG, XML, scripts...) are always downloaded.
+INLINE_CONTENT_TYPES = frozenset({
+    'image/png', 'image/jpeg', 'image/gif', 'image/webp', 'application/pdf',
+})
+
+
+class _RangeFile:
+    # No seek/tell/name, so FileResponse leaves Content-Length to us.
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        size = self.remaining if size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """Return (start, end) for a single "bytes=" range, None to send the
+    whole file, or False when the range cannot be satisfied."""
+    match = RANGE_RE.match(header.strip()) if header else None
+    if match is None or match.groups() == ('', ''):
+        # Multiple ranges and other units are allowed to be ignored.
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if int(last or start) < start:
+            return None
+    else:
+        start, end = max(size - int(last), 0), size - 1
+    if start >= size or end < start:
+        return False
+    return start, end
+
+
+def _if_range_matches(request, etag, last_modified):
+    value = request.headers.get('If-Range')
+    if not value:
+        return True
+    if value.startswith(('"', 'W/')):
+        return not value.startswith('W/') and value == etag
+    parsed = parse_http_date_safe(value)
+    return parsed is not None and last_modified is not None and parsed >= last_modified
+
+
+def file_etag(name, size, mtime):
+    return '"%s"' % hashlib.md5(f'{name}:{size}:{mtime}'.encode()).hexdigest()
+
+
+def serve_file(request, file, filename, etag=None, as_attachment=False, cache_control=None):
+    """Stream a stored file after the caller has checked permissions.
+
+    With SENDFILE_BACKEND set, only headers are produced and the web server
+    sends the body (and handles Range) itself. Otherwise the file is
+    streamed by FileResponse in blocks, honouring a single byte range.
+    Only INLINE_CONTENT_TYPES are shown inline.
+    """
+    storage, name = file.storage, file.name
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    as_attachment = as_attachment or content_type not in INLINE_CONTENT_TYPES
+    size = storage.size(name)
+    try:
+        last_modified = int(storage.get_modified_time(name).timestamp())
+    except NotImplementedError:
+        last_modified = None
+    etag = etag or file_etag(name, size, last_modified)
+    cache_control = cache_control or {'private': True, 'no_cache': True}
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = _file_response(
+            request, storage, name, size, filename, content_type, etag, last_modified, as_attachment
+        )
+    # Uploaded content must not script our origin, even if a type is guessed wrong.
+    response['Content-Security-Policy'] = 'sandbox'
+    response['X-Content-Type-Options'] = 'nosniff'
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, **cache_control)
+    return response
+
+
+def _file_response(request, storage, name, size, filename, content_type, etag, last_modified, as_attachment):
+    backend = settings.SENDFILE_BACKEND
+    if backend:
+        response = HttpResponse(content_type=content_type)
+        if backend == 'x-accel-redirect':
+            response['X-Accel-Redirect'] = quote(settings.SENDFILE_URL + name)
+        else:
+            response['X-Sendfile'] = storage.path(name)
+        response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+        return response
+
+    byte_range = None
+    if request.method in ('GET', 'HEAD') and _if_range_matches(request, etag, last_modified):
+        byte_range = parse_range(request.headers.get('Range'), size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    start, end = byte_range or (0, size - 1)
+    stream = storage.open(name, 'rb')
+    if start:
+        stream.seek(start)
+    response = FileResponse(
+        _RangeFile(stream, end - start + 1),
+        content_type=content_type,
+        as_attachment=as_attachment,
+        filename=filename,
+        status=206 if byte_range else 200,
+    )
+    response['Content-Length'] = str(end - start + 1)
+    response['Accept-Ranges'] = 'bytes'
+    if byte_range:
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
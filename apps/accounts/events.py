@@ -0,0 +1,187 @@
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from contextlib import asynccontextmanager
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+try:
+    import redis
+    import redis.asyncio as redis_asyncio
+except ImportError:  # pragma: no cover
+    redis = redis_asyncio = None
+
+REDIS_CONNECTION_ERRORS = (OSError,) if redis is None else (redis.ConnectionError, redis.TimeoutError, OSError)
+
+logger = logging.getLogger('apps.accounts.events')
+
+EVENT_RETRY_MS = 3000
+EVENT_HEARTBEAT = getattr(settings, 'BOARD_EVENTS_HEARTBEAT', 15)
+# Streams are closed after this many seconds and the browser reconnects, so a
+# user who lost access to the project stops receiving events.
+EVENT_STREAM_MAX_AGE = getattr(settings, 'BOARD_EVENTS_MAX_AGE', 300)
+
+
+def _deliver(queue, message):
+    try:
+        queue.put_nowait(message)
+    except asyncio.QueueFull:
+        # The consumer cannot keep up; drop what it has not read and tell it
+        # to reload instead of sending a partial history.
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+
+class InProcessBroker:
+    """
+    Delivers events to subscribers in the publishing process only, which is
+    enough for a single ASGI worker. Publishing is thread-safe, so sync views
+    and signal handlers can publish to streams served by the event loop.
+    """
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(_deliver, queue, message)
+
+    @asynccontextmanager
+    async def subscribe(self, channel):
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(self.queue_size))
+        with self._lock:
+            self._subscribers[channel].add(subscriber)
+        try:
+            yield subscriber[1]
+        finally:
+            with self._lock:
+                self._subscribers[channel].discard(subscriber)
+                if not self._subscribers[channel]:
+                    del self._subscribers[channel]
+
+
+class RedisBroker:
+    """Redis pub/sub fan-out for deployments with several ASGI workers."""
+
+    def __init__(self, url='redis://localhost:6379/0', prefix='kanban:', queue_size=100):
+        self.url = url
+        self.prefix = prefix
+        self.queue_size = queue_size
+        self._client = self.connect()
+
+    def connect(self):
+        if redis is None:
+            raise ImproperlyConfigured('RedisBroker requires the redis package.')
+        return redis.Redis.from_url(self.url)
+
+    def connect_async(self):
+        if redis_asyncio is None:
+            raise ImproperlyConfigured('RedisBroker requires the redis package.')
+        return redis_asyncio.Redis.from_url(self.url)
+
+    def publish(self, channel, message):
+        data = json.dumps(message, cls=DjangoJSONEncoder)
+        try:
+            self._client.publish(self.prefix + channel, data)
+        except REDIS_CONNECTION_ERRORS:
+            # The pool drops a broken connection and opens a new one on the
+            # next command, e.g. after a Redis restart; one retry covers it.
+            self._client.publish(self.prefix + channel, data)
+
+    @asynccontextmanager
+    async def subscribe(self, channel):
+        client = self.connect_async()
+        pubsub = client.pubsub()
+        await pubsub.subscribe(self.prefix + channel)
+        queue = asyncio.Queue(self.queue_size)
+
+        async def read():
+            try:
+                async for item in pubsub.listen():
+                    if item['type'] == 'message':
+                        _deliver(queue, json.loads(item['data']))
+            except REDIS_CONNECTION_ERRORS:
+                # Events published while disconnected are lost; the client
+                # reloads the board and reconnects, which subscribes again.
+                logger.warning('Lost the Redis subscription to %s', channel)
+                _deliver(queue, None)
+
+        reader = asyncio.create_task(read())
+        try:
+            yield queue
+        finally:
+            reader.cancel()
+            try:
+                await pubsub.unsubscribe()
+            except REDIS_CONNECTION_ERRORS:
+                pass
+            await pubsub.close()
+            await client.close()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            backend = getattr(settings, 'BOARD_EVENTS_BROKER', 'apps.accounts.events.InProcessBroker')
+            _broker = import_string(backend)(**getattr(settings, 'BOARD_EVENTS_BROKER_OPTIONS', {}))
+        return _broker
+
+
+@receiver(setting_changed)
+def reset_broker(setting, **kwargs):
+    global _broker
+    if setting in ('BOARD_EVENTS_BROKER', 'BOARD_EVENTS_BROKER_OPTIONS'):
+        with _broker_lock:
+            _broker = None
+
+
+def project_channel(project_id):
+    return f'project:{project_id}'
+
+
+def publish_project_event(project_id, event, data, using='default'):
+    message = {'event': event, 'project_id': project_id, **data}
+
+    def publish():
+        try:
+            get_broker().publish(project_channel(project_id), message)
+        except Exception:
+            # Live updates are best effort; the write itself has committed.
+            logger.exception('Could not publish %s for project %s', event, project_id)
+
+    transaction.on_commit(publish, using=using)
+
+
+async def event_stream(channel, heartbeat=EVENT_HEARTBEAT, max_age=EVENT_STREAM_MAX_AGE):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_age
+    async with get_broker().subscribe(channel) as queue:
+        yield f'retry: {EVENT_RETRY_MS}\n\n'
+        while loop.time() < deadline:
+            try:
+                message = await asyncio.wait_for(queue.get(), min(heartbeat, deadline - loop.time()))
+            except asyncio.TimeoutError:
+                yield ': ping\n\n'
+                continue
+            if message is None:
+                yield 'event: resync\ndata: {}\n\n'
+                return
+            yield f'event: {message["event"]}\ndata: {json.dumps(message, cls=DjangoJSONEncoder)}\n\n'
@@ -0,0 +1,142 @@
+import csv
+import datetime
+import io
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Attachment, Comment, Project, Task
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FORMATS = ('jsonl', 'csv')
+
+# Exported key -> values() lookup. Users are exported by username so the
+# data can be loaded into another installation.
+PROJECT_FIELDS = {
+    'id': 'id',
+    'name': 'name',
+    'description': 'description',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+TASK_FIELDS = {
+    'id': 'id',
+    'project_id': 'project_id',
+    'title': 'title',
+    'description': 'description',
+    'status': 'status',
+    'priority': 'priority',
+    'position': 'position',
+    'due_date': 'due_date',
+    'assigned_to': 'assigned_to__username',
+    'created_by': 'created_by__username',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+COMMENT_FIELDS = {
+    'id': 'id',
+    'task_id': 'task_id',
+    'author': 'author__username',
+    'content': 'content',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+ATTACHMENT_FIELDS = {
+    'id': 'id',
+    'task_id': 'task_id',
+    'name': 'name',
+    'size': 'size',
+    'sha256': 'blob__sha256',
+    'uploaded_by': 'uploaded_by__username',
+    'created_at': 'created_at',
+}
+# In the order records appear in an export: parents before children.
+RECORDS = {
+    'project': (Project, PROJECT_FIELDS, 'pk'),
+    'task': (Task, TASK_FIELDS, 'project_id'),
+    'comment': (Comment, COMMENT_FIELDS, 'task__project_id'),
+    'attachment': (Attachment, ATTACHMENT_FIELDS, 'task__project_id'),
+}
+CSV_RECORDS = {'projects': 'project', 'tasks': 'task', 'comments': 'comment', 'attachments': 'attachment'}
+
+
+class ExportEncoder(DjangoJSONEncoder):
+    # DjangoJSONEncoder cuts times to milliseconds; keep them exact.
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def _rows(kind, project_id):
+    model, fields, lookup = RECORDS[kind]
+    queryset = model.objects.filter(**{lookup: project_id}).order_by('pk').values_list(*fields.values())
+    if kind == 'attachment':
+        # Older attachments have no name; fall back to the stored file name.
+        queryset = queryset.values_list(*fields.values(), 'file')
+    for values in queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        row = dict(zip(fields, values))
+        if kind == 'attachment':
+            row['name'] = row['name'] or values[-1].rsplit('/', 1)[-1]
+        yield row
+
+
+def export_records(project_ids):
+    """
+    Yield (kind, row) for the projects one at a time: the project, its
+    tasks, comments and attachment metadata. Rows are read with
+    iterator(), so memory use does not grow with the project.
+    """
+    for project_id in project_ids:
+        for kind in RECORDS:
+            for row in _rows(kind, project_id):
+                yield kind, row
+
+
+def _chunks(lines):
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) == EXPORT_CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def jsonl_lines(project_ids):
+    for kind, row in export_records(project_ids):
+        yield json.dumps({'type': kind, **row}, cls=ExportEncoder, ensure_ascii=False) + '\n'
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+def csv_lines(project_ids, kind):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def line(values):
+        writer.writerow(values)
+        value = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return value
+
+    yield line(RECORDS[kind][1])
+    for project_id in project_ids:
+        for row in _rows(kind, project_id):
+            yield line([_csv_value(value) for value in row.values()])
+
+
+def export_stream(project_ids, export_format='jsonl', records='tasks'):
+    """Return an iterator of text chunks. CSV holds one kind of record,
+    JSONL everything needed by the import_project_data command."""
+    if export_format == 'csv':
+        return _chunks(csv_lines(project_ids, CSV_RECORDS[records]))
+    return _chunks(jsonl_lines(project_ids))
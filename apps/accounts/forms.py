@@ -1,6 +1,10 @@
 from django import forms
-from django.contrib.auth.forms import UserCreationForm
+from django.contrib.auth.forms import PasswordResetForm, UserCreationForm
+from .membership import is_team_member
 from .models import User, Profile, Team, Project, Task, Comment, Attachment
+from .notifications import send_password_reset
+
+PASSWORD_RESET_SECRETS = {'email', 'user', 'uid', 'token'}
 
 class RegistrationForm(UserCreationForm):
     email = forms.EmailField(required=True, widget=forms.EmailInput(attrs={'class': 'form-control'}))
@@ -15,6 +19,19 @@ class RegistrationForm(UserCreationForm):
         self.fields['password1'].widget.attrs.update({'class': 'form-control'})
         self.fields['password2'].widget.attrs.update({'class': 'form-control'})
 
+class QueuedPasswordResetForm(PasswordResetForm):
+    def send_mail(self, subject_template_name, email_template_name, context, from_email, to_email,
+                  html_email_template_name=None):
+        # Only the user id goes into the job; the worker makes the token.
+        send_password_reset.enqueue({
+            'user_id': context['user'].pk,
+            'subject_template_name': subject_template_name,
+            'email_template_name': email_template_name,
+            'context': {key: value for key, value in context.items() if key not in PASSWORD_RESET_SECRETS},
+            'from_email': from_email,
+            'html_email_template_name': html_email_template_name,
+        })
+
 class ProfileForm(forms.ModelForm):
     username = forms.CharField(max_length=150, widget=forms.TextInput(attrs={'class': 'form-control'}))
     email = forms.EmailField(widget=forms.EmailInput(attrs={'class': 'form-control'}))
@@ -78,7 +95,7 @@ class TeamForm(forms.ModelForm):
                 self.add_error('add_member', "Użytkownik nie istnieje")
                 return cleaned_data
 
-        if self.instance.pk and user in self.instance.members.all():
+        if self.instance.pk and is_team_member(user, self.instance.pk):
             self.add_error('add_member', "Użytkownik już jest w zespole")
             return cleaned_data
 
@@ -0,0 +1,157 @@
+"""
+Fractional order keys (after David Greenspan's "Implementing Fractional
+Indexing"). A key is an integer part, whose first character encodes its length
+and sign, followed by an optional base62 fraction. Keys compare correctly as
+plain strings, and a key can always be generated between any two others, so
+moving an item rewrites that item only.
+
+Keys must be compared byte-wise: the database column needs a binary collation
+(the SQLite default).
+"""
+
+DIGITS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+ZERO = DIGITS[0]
+SMALLEST_INTEGER = 'A' + ZERO * 26
+
+
+def _midpoint(a, b):
+    # A fraction strictly between a and b (b=None means the upper bound is 1).
+    if b is not None:
+        n = 0
+        while (a[n] if n < len(a) else ZERO) == b[n]:
+            n += 1
+        if n > 0:
+            return b[:n] + _midpoint(a[n:], b[n:])
+
+    digit_a = DIGITS.index(a[0]) if a else 0
+    digit_b = DIGITS.index(b[0]) if b is not None else len(DIGITS)
+    if digit_b - digit_a > 1:
+        return DIGITS[(digit_a + digit_b + 1) // 2]
+    if b is not None and len(b) > 1:
+        return b[0]
+    return DIGITS[digit_a] + _midpoint(a[1:], None)
+
+
+def _integer_length(head):
+    if 'a' <= head <= 'z':
+        return ord(head) - ord('a') + 2
+    if 'A' <= head <= 'Z':
+        return ord('Z') - ord(head) + 2
+    raise ValueError(f'Invalid order key head: {head!r}')
+
+
+def _split(key):
+    length = _integer_length(key[0])
+    if length > len(key):
+        raise ValueError(f'Invalid order key: {key!r}')
+    return key[:length], key[length:]
+
+
+def validate_key(key):
+    if key == SMALLEST_INTEGER:
+        raise ValueError(f'Invalid order key: {key!r}')
+    _, fraction = _split(key)
+    if fraction.endswith(ZERO):
+        raise ValueError(f'Invalid order key: {key!r}')
+
+
+def _increment_integer(integer):
+    head, digits = integer[0], list(integer[1:])
+    for i in reversed(range(len(digits))):
+        value = DIGITS.index(digits[i]) + 1
+        if value < len(DIGITS):
+            digits[i] = DIGITS[value]
+            return head + ''.join(digits)
+        digits[i] = ZERO
+    if head == 'Z':
+        return 'a' + ZERO
+    if head == 'z':
+        return None
+    head = chr(ord(head) + 1)
+    if head > 'a':
+        digits.append(ZERO)
+    else:
+        digits.pop()
+    return head + ''.join(digits)
+
+
+def _decrement_integer(integer):
+    head, digits = integer[0], list(integer[1:])
+    for i in reversed(range(len(digits))):
+        value = DIGITS.index(digits[i]) - 1
+        if value >= 0:
+            digits[i] = DIGITS[value]
+            return head + ''.join(digits)
+        digits[i] = DIGITS[-1]
+    if head == 'a':
+        return 'Z' + DIGITS[-1]
+    if head == 'A':
+        return None
+    head = chr(ord(head) - 1)
+    if head < 'Z':
+        digits.append(DIGITS[-1])
+    else:
+        digits.pop()
+    return head + ''.join(digits)
+
+
+def key_between(a, b):
+    """
+    Return a key that sorts strictly between ``a`` and ``b``; either may be
+    ``None`` for an open end.
+    """
+    if a is not None:
+        validate_key(a)
+    if b is not None:
+        validate_key(b)
+    if a is not None and b is not None and a >= b:
+        raise ValueError(f'{a!r} is not less than {b!r}')
+
+    if a is None:
+        if b is None:
+            return 'a' + ZERO
+        integer, fraction = _split(b)
+        if integer == SMALLEST_INTEGER:
+            return integer + _midpoint('', fraction)
+        if integer < b:
+            return integer
+        decremented = _decrement_integer(integer)
+        if decremented is None:
+            raise ValueError('Cannot decrement any further')
+        return decremented
+
+    integer, fraction = _split(a)
+    if b is None:
+        incremented = _increment_integer(integer)
+        return integer + _midpoint(fraction, None) if incremented is None else incremented
+
+    integer_b, fraction_b = _split(b)
+    if integer == integer_b:
+        return integer + _midpoint(fraction, fraction_b)
+    incremented = _increment_integer(integer)
+    if incremented is None:
+        raise ValueError('Cannot increment any further')
+    if incremented < b:
+        return incremented
+    return integer + _midpoint(fraction, None)
+
+
+def keys_between(a, b, n):
+    """Return ``n`` ascending keys between ``a`` and ``b``."""
+    if n == 0:
+        return []
+    if n == 1:
+        return [key_between(a, b)]
+    if b is None:
+        keys = [key_between(a, b)]
+        for _ in range(n - 1):
+            keys.append(key_between(keys[-1], b))
+        return keys
+    if a is None:
+        keys = [key_between(a, b)]
+        for _ in range(n - 1):
+            keys.append(key_between(a, keys[-1]))
+        return keys[::-1]
+    middle = n // 2
+    key = key_between(a, b)
+    return [*keys_between(a, key, middle), key, *keys_between(key, b, n - middle - 1)]
@@ -0,0 +1,54 @@
+import hashlib
+import threading
+from collections import Counter
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+
+FRAGMENT_CACHE_TIMEOUT = getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', 24 * 60 * 60)
+
+# Totals for this process, by (fragment name, 'hits' | 'misses').
+_totals = Counter()
+_totals_lock = threading.Lock()
+# Per-request counts, set up by FragmentCacheMiddleware.
+request_stats = ContextVar('fragment_cache_request_stats', default=None)
+
+
+def fragment_key(name, vary_on):
+    # Keys embed the versions of what the fragment shows (updated_at and
+    # the like), so stale entries are never read again and simply expire.
+    digest = hashlib.md5(':'.join(str(value) for value in vary_on).encode()).hexdigest()
+    return f'fragment:{name}:{digest}'
+
+
+def _count(name, outcome):
+    with _totals_lock:
+        _totals[name, outcome] += 1
+    stats = request_stats.get()
+    if stats is not None:
+        stats[outcome] += 1
+
+
+def get_fragment(name, vary_on, render):
+    cache = caches[getattr(settings, 'FRAGMENT_CACHE_ALIAS', 'default')]
+    key = fragment_key(name, vary_on)
+    content = cache.get(key)
+    if content is not None:
+        _count(name, 'hits')
+        return content
+    _count(name, 'misses')
+    content = render()
+    cache.set(key, content, FRAGMENT_CACHE_TIMEOUT)
+    return content
+
+
+def fragment_cache_stats(reset=False):
+    """Return {name: {'hits': n, 'misses': n}} for this process."""
+    with _totals_lock:
+        stats = {}
+        for (name, outcome), count in _totals.items():
+            stats.setdefault(name, {'hits': 0, 'misses': 0})[outcome] = count
+        if reset:
+            _totals.clear()
+    return stats
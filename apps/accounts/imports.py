@@ -0,0 +1,258 @@
+import itertools
+import json
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .changes import attachment_data, change, comment_data, record_changes, task_data
+from .counters import refresh_task_counts
+from .dashboard import invalidate_team_dashboards
+from .models import Attachment, Blob, Comment, Project, Task, User
+from .versions import BOARD, PROJECT_LIST, bump_versions
+
+IMPORT_BATCH_SIZE = 1000
+CHILD_KINDS = ('task', 'comment', 'attachment')
+CHANGE_DATA = {'task': task_data, 'comment': comment_data, 'attachment': attachment_data}
+
+
+class ImportFailed(Exception):
+    pass
+
+
+@contextmanager
+def keep_timestamps(*models):
+    # bulk_create() would stamp auto_now(_add) fields with the current time.
+    # Management commands run alone in their process, so flipping the field
+    # flags for the duration is safe there.
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def read_records(lines):
+    """Yield (line number, record) from JSONL lines, skipping blank ones."""
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            raise ImportFailed(f'Line {number}: invalid JSON.')
+        if not isinstance(record, dict):
+            raise ImportFailed(f'Line {number}: expected an object.')
+        yield number, record
+
+
+def _project_key():
+    # groupby() key that starts a new group at every project record.
+    index = 0
+
+    def key(item):
+        nonlocal index
+        if item[1].get('type') == 'project':
+            index += 1
+        return index
+    return key
+
+
+class ProjectImporter:
+    """
+    Load an export made by export_records() into a team. Each project is
+    imported in its own transaction; its rows are inserted with bulk_create()
+    in batches while the file is read, so memory holds one batch plus an
+    old-to-new task id map for the current project.
+
+    Users are matched by username. Unknown assignees are left empty, and
+    unknown authors and creators become ``default_user``.
+    """
+
+    def __init__(self, team, default_user=None, batch_size=IMPORT_BATCH_SIZE, progress=None, using='default'):
+        self.team = team
+        self.default_user_id = (default_user or team.owner).pk
+        self.batch_size = batch_size
+        self.progress = progress
+        self.using = using
+        self.counts = Counter()
+        self.unknown_users = set()
+        self._user_ids = {}
+        self._blobs = {}
+
+    def run(self, lines):
+        records = read_records(lines)
+        with keep_timestamps(Task, Comment, Attachment):
+            for _, group in itertools.groupby(records, key=_project_key()):
+                number, record = next(group)
+                if record.get('type') != 'project':
+                    raise ImportFailed(f'Line {number}: {record.get("type")!r} record before any project.')
+                with transaction.atomic(using=self.using):
+                    self.import_project(record, group)
+        return self.counts
+
+    def import_project(self, record, children):
+        project = Project(
+            team=self.team, name=str(record.get('name', ''))[:200], description=record.get('description') or ''
+        )
+        project.save(using=self.using)
+        self.counts['projects'] += 1
+        task_ids = {}
+        pending = {kind: [] for kind in CHILD_KINDS}
+        for number, child in children:
+            kind = child.get('type')
+            if kind not in pending:
+                raise ImportFailed(f'Line {number}: unknown record type {kind!r}.')
+            pending[kind].append((number, child))
+            if len(pending[kind]) >= self.batch_size:
+                # Comments and attachments need the tasks before them.
+                for earlier in CHILD_KINDS[:CHILD_KINDS.index(kind) + 1]:
+                    self._flush(earlier, pending, project, task_ids)
+        for kind in CHILD_KINDS:
+            self._flush(kind, pending, project, task_ids)
+
+        refresh_task_counts([project.pk], using=self.using)
+        bump_versions(BOARD, [project.pk], using=self.using)
+        bump_versions(PROJECT_LIST, [self.team.pk], using=self.using)
+        invalidate_team_dashboards([self.team.pk], using=self.using)
+
+    def _flush(self, kind, pending, project, task_ids):
+        batch = pending[kind]
+        if not batch:
+            return
+        pending[kind] = []
+        self._resolve_users(batch)
+        if kind == 'attachment':
+            self._resolve_blobs(batch)
+        build = getattr(self, f'_build_{kind}')
+        rows = [(child, build(number, child, project, task_ids)) for number, child in batch]
+        rows = [(child, obj) for child, obj in rows if obj is not None]
+        model = type(rows[0][1]) if rows else None
+        if model is not None:
+            created = model.objects.using(self.using).bulk_create(
+                [obj for _, obj in rows], batch_size=self.batch_size
+            )
+            # bulk_create() sends no post_save, so the change feed entries
+            # the signals would have written are added here.
+            record_changes(
+                (
+                    change(
+                        kind, obj.pk, 'created', team_id=self.team.pk, project_id=project.pk,
+                        data=CHANGE_DATA[kind](obj),
+                    )
+                    for obj in created
+                ),
+                using=self.using,
+            )
+        if kind == 'task':
+            task_ids.update((child.get('id'), obj.pk) for child, obj in rows)
+        if kind == 'attachment':
+            self._acquire_blobs(obj.blob_id for _, obj in rows)
+        self.counts[f'{kind}s'] += len(rows)
+        if self.progress:
+            self.progress(self.counts)
+
+    def _resolve_users(self, batch):
+        fields = ('assigned_to', 'created_by', 'author', 'uploaded_by')
+        names = {child.get(field) for _, child in batch for field in fields} - {None, ''}
+        missing = names - self._user_ids.keys()
+        if missing:
+            found = dict(User.objects.using(self.using).filter(username__in=missing).values_list('username', 'pk'))
+            for name in missing:
+                self._user_ids[name] = found.get(name)
+            self.unknown_users.update(missing - found.keys())
+
+    def _resolve_blobs(self, batch):
+        hashes = {child.get('sha256') for _, child in batch} - {None, ''}
+        self._blobs = {
+            sha256: (pk, file, size)
+            for sha256, pk, file, size in Blob.objects.using(self.using).filter(sha256__in=hashes).values_list(
+                'sha256', 'pk', 'file', 'size'
+            )
+        }
+
+    def _user(self, name, default=None):
+        return self._user_ids.get(name) or default
+
+    def _timestamps(self, number, child, *fields):
+        now = timezone.now()
+        values = {}
+        for field in fields:
+            value = child.get(field)
+            parsed = parse_datetime(str(value)) if value else now
+            if parsed is None:
+                raise ImportFailed(f'Line {number}: invalid {field}.')
+            values[field] = parsed
+        return values
+
+    def _choice(self, number, child, field, choices, default):
+        value = child.get(field) or default
+        if value not in dict(choices):
+            raise ImportFailed(f'Line {number}: invalid {field} {value!r}.')
+        return value
+
+    def _build_task(self, number, child, project, task_ids):
+        due_date = child.get('due_date')
+        if due_date and parse_date(str(due_date)) is None:
+            raise ImportFailed(f'Line {number}: invalid due_date.')
+        return Task(
+            project=project,
+            title=str(child.get('title', ''))[:200],
+            description=child.get('description') or '',
+            status=self._choice(number, child, 'status', Task.STATUS_CHOICES, 'todo'),
+            priority=self._choice(number, child, 'priority', Task.PRIORITY_CHOICES, 'medium'),
+            position=child.get('position') or '',
+            due_date=due_date or None,
+            assigned_to_id=self._user(child.get('assigned_to')),
+            created_by_id=self._user(child.get('created_by'), self.default_user_id),
+            **self._timestamps(number, child, 'created_at', 'updated_at'),
+        )
+
+    def _task_id(self, number, child, task_ids):
+        task_id = task_ids.get(child.get('task_id'))
+        if task_id is None:
+            raise ImportFailed(f'Line {number}: task {child.get("task_id")!r} is not in this project.')
+        return task_id
+
+    def _build_comment(self, number, child, project, task_ids):
+        return Comment(
+            task_id=self._task_id(number, child, task_ids),
+            author_id=self._user(child.get('author'), self.default_user_id),
+            content=child.get('content') or '',
+            **self._timestamps(number, child, 'created_at', 'updated_at'),
+        )
+
+    def _build_attachment(self, number, child, project, task_ids):
+        task_id = self._task_id(number, child, task_ids)
+        # Exports carry metadata only; link content this installation already
+        # stores and skip the rest.
+        blob = self._blobs.get(child.get('sha256'))
+        if blob is None:
+            self.counts['attachments_skipped'] += 1
+            return None
+        return Attachment(
+            task_id=task_id,
+            blob_id=blob[0],
+            file=blob[1],
+            name=str(child.get('name') or '')[:255],
+            size=blob[2],
+            uploaded_by_id=self._user(child.get('uploaded_by'), self.default_user_id),
+            **self._timestamps(number, child, 'created_at'),
+        )
+
+    def _acquire_blobs(self, blob_ids):
+        by_count = {}
+        for blob_id, count in Counter(blob_ids).items():
+            by_count.setdefault(count, []).append(blob_id)
+        for count, ids in by_count.items():
+            Blob.objects.using(self.using).filter(pk__in=ids).update(ref_count=F('ref_count') + count)
@@ -0,0 +1,245 @@
+import functools
+import json
+import logging
+import os
+import random
+import secrets
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, transaction
+from django.db.models import Count, F, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import LessThan
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ATTEMPTS = 5
+JOB_POLL_INTERVAL = getattr(settings, 'JOB_POLL_INTERVAL', 1)
+# Retries wait RETRY_BACKOFF * 2 ** (attempt - 1) seconds, capped, with jitter.
+RETRY_BACKOFF = 10
+RETRY_BACKOFF_MAX = 60 * 60
+MAINTENANCE_INTERVAL = 60
+
+_registry = {}
+
+
+class UnknownJob(Exception):
+    pass
+
+
+class JobType:
+    def __init__(self, func, name, queue, max_attempts, concurrency):
+        functools.update_wrapper(self, func)
+        self.func = func
+        self.name = name
+        self.queue = queue
+        self.max_attempts = max_attempts
+        self.concurrency = concurrency
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def enqueue(self, kwargs=None, delay=None, using='default'):
+        """
+        Store a run of the job; it becomes visible to workers when the
+        current transaction commits, so it never sees uncommitted rows or
+        runs for a write that was rolled back.
+        """
+        # Round-trip through JSON so eager runs get what a worker would.
+        kwargs = json.loads(json.dumps(kwargs or {}, cls=DjangoJSONEncoder))
+        if settings.JOB_QUEUE_EAGER:
+            transaction.on_commit(lambda: self.func(**kwargs), using=using)
+            return None
+        return Job.objects.using(using).create(
+            name=self.name,
+            queue=self.queue,
+            kwargs=kwargs,
+            max_attempts=self.max_attempts,
+            run_at=timezone.now() + (delay or timedelta()),
+        )
+
+
+def job(func=None, *, name=None, queue='default', max_attempts=DEFAULT_MAX_ATTEMPTS, concurrency=None):
+    """
+    Make a function runnable by the worker::
+
+        @job(max_attempts=3, concurrency=2)
+        def send_report(team_id): ...
+
+        send_report.enqueue({'team_id': team.pk})
+
+    Arguments must be JSON-serializable, and since a job can run more than
+    once (retries, a worker killed mid-run) it should be safe to repeat.
+    ``concurrency`` caps how many runs of this job execute at once across
+    all workers.
+    """
+    def decorator(func):
+        job_type = JobType(func, name or f'{func.__module__}.{func.__qualname__}', queue, max_attempts, concurrency)
+        _registry[job_type.name] = job_type
+        return job_type
+    return decorator(func) if func else decorator
+
+
+def get_job_type(name):
+    job_type = _registry.get(name)
+    if job_type is None:
+        # Default names are import paths; load the module that defines it.
+        try:
+            job_type = import_string(name)
+        except ImportError:
+            job_type = None
+        if not isinstance(job_type, JobType):
+            raise UnknownJob(name)
+    return job_type
+
+
+def retry_delay(attempts):
+    delay = min(RETRY_BACKOFF * 2 ** (attempts - 1), RETRY_BACKOFF_MAX)
+    # Jitter spreads out retries of jobs that failed together.
+    return timedelta(seconds=delay * random.uniform(0.5, 1))
+
+
+def claim_jobs(worker_id, limit, queues=('default',), using='default'):
+    """Mark up to ``limit`` due jobs as running for this worker and return them."""
+    jobs = Job.objects.using(using)
+    now = timezone.now()
+    token = f'{worker_id}:{secrets.token_hex(4)}'
+    candidates = jobs.filter(status='queued', queue__in=queues, run_at__lte=now).order_by(
+        'run_at', 'id'
+    ).values_list('id', 'name')[:limit * 4]
+
+    claimed = []
+    for pk, name in candidates:
+        if len(claimed) == limit:
+            break
+        try:
+            job_type = get_job_type(name)
+        except UnknownJob:
+            jobs.filter(pk=pk, status='queued').update(
+                status='failed', last_error=f'Unknown job {name}', finished_at=now
+            )
+            continue
+        # The update only applies while the row is still queued, so two
+        # workers never claim the same job; no row locks are needed.
+        claim = jobs.filter(pk=pk, status='queued')
+        if job_type.concurrency:
+            running = jobs.filter(name=name, status='running').values('name').annotate(
+                count=Count('pk')
+            ).values('count')
+            claim = claim.filter(LessThan(Coalesce(Subquery(running), 0), job_type.concurrency))
+        if claim.update(status='running', locked_by=token, locked_at=now, attempts=F('attempts') + 1):
+            claimed.append(pk)
+    return list(jobs.filter(pk__in=claimed).order_by('run_at', 'id'))
+
+
+def run_job(job, using='default'):
+    """Run a claimed job and record the outcome; return True on success."""
+    jobs = Job.objects.using(using).filter(pk=job.pk, status='running', locked_by=job.locked_by)
+    started = time.monotonic()
+    try:
+        get_job_type(job.name).func(**job.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        now = timezone.now()
+        if job.attempts < job.max_attempts:
+            logger.warning('Job %s (%s) failed, attempt %s of %s', job.pk, job.name, job.attempts, job.max_attempts)
+            jobs.update(
+                status='queued', run_at=now + retry_delay(job.attempts), last_error=error, locked_by='', locked_at=None
+            )
+        else:
+            logger.error('Job %s (%s) failed after %s attempts:\n%s', job.pk, job.name, job.attempts, error)
+            jobs.update(status='failed', last_error=error, locked_by='', locked_at=None, finished_at=now)
+        return False
+    logger.info('Job %s (%s) done in %.2fs', job.pk, job.name, time.monotonic() - started)
+    jobs.update(status='done', locked_by='', locked_at=None, finished_at=timezone.now())
+    return True
+
+
+def requeue_stale_jobs(timeout=None, using='default'):
+    """
+    Give jobs of workers that died mid-run back to the queue. JOB_TIMEOUT
+    must be longer than any job runs, or a slow job is started twice.
+    """
+    now = timezone.now()
+    stale = Job.objects.using(using).filter(
+        status='running', locked_at__lt=now - (timeout or settings.JOB_TIMEOUT)
+    )
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status='failed', last_error='Worker stopped while running the job.', locked_by='', locked_at=None,
+        finished_at=now,
+    )
+    return stale.update(status='queued', locked_by='', locked_at=None) + failed
+
+
+def purge_jobs(max_age=None, using='default'):
+    """Delete finished and failed jobs older than JOB_RETENTION."""
+    before = timezone.now() - (max_age or settings.JOB_RETENTION)
+    return Job.objects.using(using).filter(status__in=('done', 'failed'), finished_at__lt=before).delete()[0]
+
+
+class Worker:
+    def __init__(self, queues=('default',), concurrency=None, poll_interval=JOB_POLL_INTERVAL, using='default'):
+        self.id = f'{socket.gethostname()}:{os.getpid()}'
+        self.queues = tuple(queues)
+        self.concurrency = concurrency or settings.JOB_WORKER_CONCURRENCY
+        self.poll_interval = poll_interval
+        self.using = using
+        self.stopping = threading.Event()
+        self._maintained_at = None
+
+    def stop(self):
+        """Stop claiming jobs; the ones already running are finished."""
+        self.stopping.set()
+
+    def maintain(self):
+        if self._maintained_at is None or time.monotonic() - self._maintained_at > MAINTENANCE_INTERVAL:
+            requeue_stale_jobs(using=self.using)
+            purge_jobs(using=self.using)
+            self._maintained_at = time.monotonic()
+
+    def work_off(self):
+        """Run due jobs one by one in this thread until none are left."""
+        results = {'done': 0, 'failed': 0}
+        while not self.stopping.is_set():
+            jobs = claim_jobs(self.id, 1, self.queues, self.using)
+            if not jobs:
+                break
+            results['done' if run_job(jobs[0], self.using) else 'failed'] += 1
+        return results
+
+    def _execute(self, job):
+        try:
+            return run_job(job, self.using)
+        finally:
+            # Pool threads keep their own connections; do not leak them.
+            connections.close_all()
+
+    def run(self, burst=False):
+        """Process jobs in a thread pool until stopped, or until the queue
+        is empty with ``burst``."""
+        running = set()
+        with ThreadPoolExecutor(self.concurrency, thread_name_prefix='jobs') as executor:
+            while not self.stopping.is_set():
+                self.maintain()
+                free = self.concurrency - len(running)
+                if free:
+                    for job in claim_jobs(self.id, free, self.queues, self.using):
+                        running.add(executor.submit(self._execute, job))
+                if running:
+                    # Wake up when a slot frees up or new jobs may be due.
+                    _, running = wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                elif burst:
+                    break
+                else:
+                    self.stopping.wait(self.poll_interval)
@@ -0,0 +1,28 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from apps.accounts.blobs import cleanup_uploads
+
+
+class Command(BaseCommand):
+    help = 'Delete abandoned chunked uploads and attachment files no longer referenced.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-age', type=int, default=None,
+            help='Hours of inactivity after which an upload is abandoned (default: UPLOAD_SESSION_MAX_AGE).',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only list what would be deleted.',
+        )
+        parser.add_argument('--database', help='Clean only this database (default: every shard).')
+
+    def handle(self, *args, **options):
+        max_age = timedelta(hours=options['max_age']) if options['max_age'] is not None else None
+        sessions, files = cleanup_uploads(max_age, dry_run=options['dry_run'], using=options['database'])
+        for name in files:
+            self.stdout.write(name)
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {sessions} upload(s) and {len(files)} file(s).'))
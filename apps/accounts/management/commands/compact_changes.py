@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from apps.accounts.changes import compact_changes
+
+
+class Command(BaseCommand):
+    help = 'Delete old entries from the change feed used by sync clients.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-age', type=int, default=None,
+            help='Days to keep entries for (default: CHANGE_LOG_RETENTION).',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only count what would be deleted.',
+        )
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        max_age = timedelta(days=options['max_age']) if options['max_age'] is not None else None
+        count = compact_changes(max_age, dry_run=options['dry_run'], using=options['database'])
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {count} change(s).'))
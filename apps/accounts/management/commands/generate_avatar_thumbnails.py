@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from apps.accounts.models import Profile
+from apps.accounts.thumbnails import generate_avatar_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Render avatar thumbnails for profiles that do not have them yet.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Also re-render avatars that already have thumbnails.',
+        )
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        profiles = Profile.objects.using(options['database']).exclude(avatar='').exclude(avatar__isnull=True)
+        if not options['all']:
+            profiles = profiles.filter(avatar_thumbnails='')
+        generated = failed = 0
+        for profile_id in profiles.values_list('pk', flat=True).iterator():
+            if generate_avatar_thumbnails(profile_id, using=options['database']):
+                generated += 1
+            else:
+                failed += 1
+        self.stdout.write(self.style.SUCCESS(f'Generated thumbnails for {generated} avatar(s), {failed} failed.'))
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.accounts.datagen import DEFAULT_PASSWORD, DatasetExists, generate_dataset
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with a synthetic data set of the given shape, for development and benchmarks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--teams', type=int, default=10)
+        parser.add_argument('--members', type=int, default=8, help='Members per team.')
+        parser.add_argument('--projects', type=int, default=5, help='Projects per team.')
+        parser.add_argument('--tasks', type=int, default=200, help='Average tasks per project.')
+        parser.add_argument('--comments', type=int, default=3, help='Average comments per task.')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--prefix', default='user', help='Prefix of the generated usernames.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            counts = generate_dataset(
+                options['teams'],
+                options['members'],
+                options['projects'],
+                options['tasks'],
+                options['comments'],
+                seed=options['seed'],
+                prefix=options['prefix'],
+                batch_size=options['batch_size'],
+                progress=self.report if options['verbosity'] > 1 else None,
+                using=options['database'],
+            )
+        except DatasetExists as error:
+            raise CommandError(f'{error} Choose another --prefix.')
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {counts["users"]} user(s), {counts["teams"]} team(s), {counts["projects"]} project(s), '
+            f'{counts["tasks"]} task(s) and {counts["comments"]} comment(s) '
+            f'in {time.perf_counter() - started:.1f}s. Log in as {options["prefix"]}0 / {DEFAULT_PASSWORD}.'
+        ))
+
+    def report(self, counts):
+        self.stdout.write(f'{counts["tasks"]} task(s), {counts["comments"]} comment(s)')
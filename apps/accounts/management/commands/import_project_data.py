@@ -0,0 +1,71 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.accounts.imports import IMPORT_BATCH_SIZE, ImportFailed, ProjectImporter
+from apps.accounts.models import Team, User
+
+
+class Command(BaseCommand):
+    help = 'Import projects with their tasks, comments and attachments from a JSONL export into a team.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='JSONL file from a project or team export, or - for stdin.')
+        parser.add_argument('--team', type=int, required=True, help='Id of the team to import into.')
+        parser.add_argument(
+            '--default-user',
+            help='Username to use for authors and creators that do not exist here (default: the team owner).',
+        )
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument('--database', help='Default: the database of the team, its shard with sharding.')
+
+    def handle(self, *args, **options):
+        teams = Team.objects.select_related('owner')
+        if options['database']:
+            teams = teams.using(options['database'])
+        try:
+            team = teams.get(pk=options['team'])
+        except Team.DoesNotExist:
+            raise CommandError(f'Team {options["team"]} does not exist.')
+        using = team._state.db
+        default_user = None
+        if options['default_user']:
+            try:
+                default_user = User.objects.using(using).get(username=options['default_user'])
+            except User.DoesNotExist:
+                raise CommandError(f'User {options["default_user"]} does not exist.')
+
+        importer = ProjectImporter(
+            team,
+            default_user=default_user,
+            batch_size=options['batch_size'],
+            progress=self.report if options['verbosity'] >= 1 else None,
+            using=using,
+        )
+        file = sys.stdin if options['path'] == '-' else open(options['path'], encoding='utf-8')
+        try:
+            counts = importer.run(file)
+        except ImportFailed as error:
+            raise CommandError(f'{error} Projects before it were imported.')
+        finally:
+            if file is not sys.stdin:
+                file.close()
+
+        if importer.unknown_users:
+            self.stdout.write(self.style.WARNING(
+                f'Unknown users (left unassigned or replaced): {", ".join(sorted(importer.unknown_users))}'
+            ))
+        if counts['attachments_skipped']:
+            self.stdout.write(self.style.WARNING(
+                f'Skipped {counts["attachments_skipped"]} attachment(s) whose content is not stored here.'
+            ))
+        self.stdout.write(self.style.SUCCESS(self.summary(counts)))
+
+    def summary(self, counts):
+        return (
+            f'Imported {counts["projects"]} project(s), {counts["tasks"]} task(s), '
+            f'{counts["comments"]} comment(s) and {counts["attachments"]} attachment(s).'
+        )
+
+    def report(self, counts):
+        self.stdout.write(self.summary(counts))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.accounts.sharding import ShardingError, move_team
+
+
+class Command(BaseCommand):
+    help = (
+        'Move a team with its projects, tasks, comments, attachments and uploads to another shard. '
+        'Run it while nobody works in the team: writes during the move can be lost.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('team', type=int, nargs='+', help='Ids of the teams to move.')
+        parser.add_argument('--to', required=True, help='The shard to move to, e.g. shard1.')
+        parser.add_argument(
+            '--from', dest='source',
+            help="Database the teams are in now (default: their shard); 'default' moves in teams from before sharding.",
+        )
+
+    def handle(self, *args, **options):
+        for team_id in options['team']:
+            try:
+                counts = move_team(team_id, options['to'], source=options['source'])
+            except ShardingError as error:
+                raise CommandError(error)
+            moved = ', '.join(f'{count} {name}' for name, count in counts.items())
+            self.stdout.write(self.style.SUCCESS(f'Moved team {team_id} to {options["to"]}: {moved}.'))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from apps.accounts.positions import POSITION_REBALANCE_LENGTH, columns_to_rebalance, rebalance_positions
+
+
+class Command(BaseCommand):
+    help = 'Renumber kanban columns whose card order keys grew too long or collide.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-length', type=int, default=POSITION_REBALANCE_LENGTH)
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only list the columns that need renumbering.',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        if options['check']:
+            columns = columns_to_rebalance(options['max_length'], using=options['database'])
+        else:
+            columns = rebalance_positions(
+                options['max_length'], batch_size=options['batch_size'], using=options['database']
+            )
+        for project_id, status in columns:
+            self.stdout.write(f'project {project_id}: {status}')
+        if options['check']:
+            self.stdout.write(f'{len(columns)} column(s) need renumbering.')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Renumbered {len(columns)} column(s).'))
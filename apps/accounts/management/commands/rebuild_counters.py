@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.accounts.counters import find_drift, rebuild_counters
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the stored member, project and task counters on teams and projects.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only report counters that do not match the data and exit with an error if any do.',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        drift = find_drift(using=options['database'])
+        for model, pk, field, stored, expected in drift:
+            self.stdout.write(f'{model} {pk}: {field} is {stored}, expected {expected}')
+
+        if options['check']:
+            if drift:
+                raise CommandError(f'{len(drift)} counter(s) out of date.')
+            self.stdout.write(self.style.SUCCESS('All counters are up to date.'))
+            return
+
+        updated = rebuild_counters(batch_size=options['batch_size'], using=options['database'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt counters on {updated} row(s), fixed {len(drift)} counter(s).'
+        ))
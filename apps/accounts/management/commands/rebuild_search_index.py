@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.accounts.search import fts_available, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the FTS5 full-text index over task titles, descriptions and comments.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--optimize', action='store_true',
+            help='Merge the index b-trees after rebuilding; slower, but makes queries faster.',
+        )
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        if not fts_available(options['database']):
+            raise CommandError('The full-text index needs SQLite with FTS5; run migrate first.')
+        rebuild_search_index(using=options['database'], optimize=options['optimize'])
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt.'))
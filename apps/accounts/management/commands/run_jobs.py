@@ -0,0 +1,39 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from apps.accounts.jobs import Worker
+
+
+class Command(BaseCommand):
+    help = 'Run background jobs from the database queue.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--queue', action='append', dest='queues',
+            help='Queue to take jobs from; repeat for several (default: default).',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=None,
+            help='Jobs run at once in this worker\'s thread pool (default: JOB_WORKER_CONCURRENCY).',
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Exit once no jobs are due instead of waiting for more.',
+        )
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        worker = Worker(
+            queues=options['queues'] or ['default'],
+            concurrency=options['concurrency'],
+            using=options['database'],
+        )
+        # Finish the jobs in progress on Ctrl+C or SIGTERM from a process manager.
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: worker.stop())
+        self.stdout.write(
+            f'Worker {worker.id} processing {", ".join(worker.queues)} with {worker.concurrency} thread(s).'
+        )
+        worker.run(burst=options['burst'])
+        self.stdout.write(self.style.SUCCESS('Worker stopped.'))
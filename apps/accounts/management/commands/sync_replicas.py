@@ -0,0 +1,37 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from apps.accounts.sqlite import copy_database
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the primary SQLite database into the replica files, as a local stand-in for replication. '
+        'With --interval it repeats, so the replicas lag behind like real ones.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, help='Copy again every this many seconds until stopped.')
+        parser.add_argument('--database', default='default', help='The primary.')
+
+    def handle(self, *args, **options):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas:
+            raise CommandError('No replicas configured; set DATABASE_REPLICAS.')
+        primary = connections[options['database']]
+        if any(connections[alias].vendor != 'sqlite' for alias in [options['database'], *replicas]):
+            raise CommandError('Only SQLite databases can be copied; use the replication of your database.')
+        while True:
+            started = time.perf_counter()
+            for alias in replicas:
+                copy_database(primary, connections[alias])
+            if options['verbosity'] > 0:
+                self.stdout.write(
+                    f'Copied {options["database"]} to {", ".join(replicas)} in {time.perf_counter() - started:.2f}s'
+                )
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F
+
+from .models import Team, User
+from .routers import primary_reads
+from .sharding import data_databases, databases_for_teams
+
+MEMBERSHIP_CACHE_TIMEOUT = getattr(settings, 'MEMBERSHIP_CACHE_TIMEOUT', 60 * 60)
+
+
+def _teams_key(user):
+    # date_joined tells apart users that got the same id, like after a
+    # rolled back insert on SQLite.
+    return f'membership:teams:{user.pk}:{user.date_joined.timestamp()}:{user.membership_version}'
+
+
+def get_team_ids(user):
+    if not user.is_authenticated:
+        return frozenset()
+
+    # The version comes with the user row that authentication loads anyway,
+    # so every process misses the old entry after a change.
+    key = _teams_key(user)
+    team_ids = cache.get(key)
+    if team_ids is None:
+        with primary_reads():
+            team_ids = frozenset(
+                team_id
+                for using in data_databases()
+                for team_id in Team.members.through.objects.using(using).filter(user_id=user.pk).values_list(
+                    'team_id', flat=True
+                )
+            )
+        cache.set(key, team_ids, MEMBERSHIP_CACHE_TIMEOUT)
+    return team_ids
+
+
+def is_team_member(user, team_id):
+    return team_id in get_team_ids(user)
+
+
+def shares_team(user, user_id):
+    team_ids = get_team_ids(user)
+    return any(
+        Team.members.through.objects.using(using).filter(user_id=user_id, team_id__in=ids).exists()
+        for using, ids in databases_for_teams(team_ids).items() if ids
+    )
+
+
+def invalidate_user_teams(user_ids, using=DEFAULT_DB_ALIAS):
+    """Bump the membership version of users whose memberships in ``using`` changed."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+
+    def bump():
+        User.objects.filter(pk__in=user_ids).update(membership_version=F('membership_version') + 1)
+
+    if using == DEFAULT_DB_ALIAS:
+        # Same transaction as the change: the new version and the new rows
+        # become visible together.
+        bump()
+    else:
+        # Memberships on a shard: a request that read the new version before
+        # they commit would cache the old rows under it.
+        transaction.on_commit(bump, using=using)
@@ -0,0 +1,144 @@
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from .fragments import request_stats
+from .routers import PIN_COOKIE, PIN_HEADER, is_pin_valid, pin_token, replica_reads
+from .sharding import directory_snapshot
+
+logger = logging.getLogger('apps.accounts.queries')
+
+
+def query_budget(budget, per_shard=0):
+    def decorator(view_func):
+        view_func.query_budget = budget
+        view_func.query_budget_per_shard = per_shard
+        return view_func
+    return decorator
+
+
+def get_query_budget(view_func):
+    """
+    The budget of a view, for one database. With DATABASE_SHARDS, a request
+    may also read the directory version and the shards of uncached teams,
+    and fan-out repeats the view's per_shard queries on every other shard.
+    """
+    source = view_func
+    if getattr(view_func, 'query_budget', None) is None:
+        source = getattr(view_func, 'view_class', None) or getattr(view_func, 'cls', None)
+    budget = getattr(source, 'query_budget', None)
+    shards = len(settings.DATABASE_SHARDS)
+    if budget is None or not shards:
+        return budget
+    return budget + 2 + getattr(source, 'query_budget_per_shard', 0) * (shards - 1)
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+class QueryCountMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        request.query_budget = None
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(counter))
+            response = self.get_response(request)
+
+        budget = request.query_budget
+        response['X-Query-Count'] = str(counter.count)
+        response['X-Query-Time-Ms'] = f'{counter.duration * 1000:.2f}'
+        if budget is not None:
+            response['X-Query-Budget'] = str(budget)
+
+        over_budget = budget is not None and counter.count > budget
+        logger.log(
+            logging.WARNING if over_budget else logging.INFO,
+            'method=%s path=%s status=%s queries=%d query_time_ms=%.2f budget=%s',
+            request.method, request.path, response.status_code,
+            counter.count, counter.duration * 1000, budget,
+            extra={
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'queries': counter.count,
+                'query_time_ms': counter.duration * 1000,
+                'query_budget': budget,
+            },
+        )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = get_query_budget(view_func)
+
+
+class FragmentCacheMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = Counter()
+        token = request_stats.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_stats.reset(token)
+        if stats:
+            response['X-Fragment-Cache'] = f'hits={stats["hits"]} misses={stats["misses"]}'
+        return response
+
+
+class ShardDirectoryMiddleware:
+    """Read the version of the team directory at most once per request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_SHARDS:
+            return self.get_response(request)
+        with directory_snapshot():
+            return self.get_response(request)
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Read from a replica unless the client wrote in the last
+    REPLICA_PIN_SECONDS: a cookie pins the browser that wrote, and API
+    clients echo the signed PIN_HEADER of the response back.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+        pinned = PIN_COOKIE in request.COOKIES or is_pin_valid(request.headers.get(PIN_HEADER))
+        with replica_reads(pinned=pinned) as routing:
+            response = self.get_response(request)
+        if routing.wrote:
+            response[PIN_HEADER] = pin_token()
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax',
+                secure=request.is_secure(),
+            )
+        return response
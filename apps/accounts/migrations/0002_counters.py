@@ -0,0 +1,64 @@
+# Generated by Django 4.2 on 2026-10-16 23:57
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def _count(queryset, group_by):
+    counts = queryset.order_by().values(group_by).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+def populate_counters(apps, schema_editor):
+    Team = apps.get_model('accounts', 'Team')
+    Project = apps.get_model('accounts', 'Project')
+    Task = apps.get_model('accounts', 'Task')
+    db = schema_editor.connection.alias
+
+    Team.objects.using(db).update(
+        member_count=_count(Team.members.through.objects.filter(team_id=OuterRef('pk')), 'team_id'),
+        project_count=_count(Project.objects.filter(team_id=OuterRef('pk')), 'team_id'),
+    )
+    Project.objects.using(db).update(**{
+        f'{status}_count': _count(
+            Task.objects.filter(project_id=OuterRef('pk'), status=status), 'project_id'
+        )
+        for status in ('todo', 'in_progress', 'done')
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='done_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='in_progress_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='todo_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='team',
+            name='member_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='team',
+            name='project_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
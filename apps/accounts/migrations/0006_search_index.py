@@ -0,0 +1,54 @@
+from django.db import migrations
+
+# External-content FTS5 tables: the text lives only in accounts_task and
+# accounts_comment. The triggers that keep the index in sync with them are
+# installed after every migrate run by search.install_search_triggers(), the
+# one place they are defined.
+FTS_TABLES = {
+    'accounts_task_fts': ('accounts_task', ['title', 'description']),
+    'accounts_comment_fts': ('accounts_comment', ['content']),
+}
+
+
+def _fts5_available(connection):
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return any(option == 'ENABLE_FTS5' for option, in cursor.fetchall())
+
+
+def _create_statements(fts_table, table, columns):
+    column_list = ', '.join(columns)
+    return [
+        f"CREATE VIRTUAL TABLE {fts_table} USING fts5({column_list}, content='{table}', "
+        f"content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')",
+    ]
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite' or not _fts5_available(connection):
+        return
+    for fts_table, (table, columns) in FTS_TABLES.items():
+        for statement in _create_statements(fts_table, table, columns):
+            schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for fts_table in FTS_TABLES:
+        for suffix in ('ai', 'ad', 'au'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {fts_table}_{suffix}')
+        schema_editor.execute(f'DROP TABLE IF EXISTS {fts_table}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_conditional_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 4.2 on 2026-10-17 00:27
+
+from itertools import groupby
+
+from django.db import migrations, models
+
+DIGITS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+
+
+def _increment(key):
+    head, digits = key[0], list(key[1:])
+    for i in reversed(range(len(digits))):
+        value = DIGITS.index(digits[i]) + 1
+        if value < len(DIGITS):
+            digits[i] = DIGITS[value]
+            return head + ''.join(digits)
+        digits[i] = DIGITS[0]
+    return chr(ord(head) + 1) + ''.join(digits) + DIGITS[0]
+
+
+def _column_keys(n):
+    # Frozen copy of fractional.keys_between(None, None, n) as of this
+    # migration: consecutive integer keys from 'a0' up.
+    keys, key = [], 'a0'
+    for _ in range(n):
+        keys.append(key)
+        key = _increment(key)
+    return keys
+
+
+def populate_positions(apps, schema_editor):
+    # Keep the current board order: newest first within each column.
+    Task = apps.get_model('accounts', 'Task')
+    db = schema_editor.connection.alias
+    tasks = Task.objects.using(db).order_by('project_id', 'status', '-created_at', '-id').only(
+        'id', 'project_id', 'status'
+    )
+    batch = []
+    for _, column in groupby(tasks.iterator(chunk_size=2000), key=lambda task: (task.project_id, task.status)):
+        column = list(column)
+        for task, position in zip(column, _column_keys(len(column))):
+            task.position = position
+        batch.extend(column)
+        if len(batch) >= 2000:
+            Task.objects.using(db).bulk_update(batch, ['position'])
+            batch = []
+    Task.objects.using(db).bulk_update(batch, ['position'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_search_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='task',
+            name='task_project_status_idx',
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='position',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(populate_positions, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['project', 'status', 'position', 'id'], name='task_project_position_idx'),
+        ),
+    ]
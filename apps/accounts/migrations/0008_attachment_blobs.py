@@ -0,0 +1,97 @@
+# Generated by Django 4.2 on 2026-10-17 00:35
+
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+def link_blobs(apps, schema_editor):
+    # Hash the files already on disk and point duplicates at the first copy.
+    # The now unreferenced copies are left for the cleanup_uploads command,
+    # so a failed migration never loses a file.
+    Attachment = apps.get_model('accounts', 'Attachment')
+    Blob = apps.get_model('accounts', 'Blob')
+    db = schema_editor.connection.alias
+    blobs = {}
+    for attachment in Attachment.objects.using(db).order_by('id').iterator(chunk_size=500):
+        name = attachment.file.name
+        if not name or not default_storage.exists(name):
+            continue
+        digest = hashlib.sha256()
+        with default_storage.open(name, 'rb') as file:
+            for chunk in file.chunks(64 * 1024):
+                digest.update(chunk)
+        sha256 = digest.hexdigest()
+        blob = blobs.get(sha256)
+        if blob is None:
+            blob = blobs[sha256] = Blob.objects.using(db).create(
+                sha256=sha256, file=name, size=default_storage.size(name)
+            )
+        blob.ref_count += 1
+        attachment.blob = blob
+        attachment.file = blob.file.name
+        attachment.size = blob.size
+        attachment.name = os.path.basename(name)
+        attachment.save(update_fields=['blob', 'file', 'size', 'name'])
+    Blob.objects.using(db).bulk_update(blobs.values(), ['ref_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_task_position'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('file', models.FileField(max_length=255, upload_to='')),
+                ('size', models.BigIntegerField()),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='attachment',
+            name='name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='attachment',
+            name='size',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='attachment',
+            name='file',
+            field=models.FileField(max_length=255, upload_to='attachments/'),
+        ),
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255)),
+                ('size', models.BigIntegerField()),
+                ('sha256', models.CharField(blank=True, max_length=64)),
+                ('offset', models.BigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to='accounts.task')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='attachment',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='attachments', to='accounts.blob'),
+        ),
+        migrations.RunPython(link_blobs, migrations.RunPython.noop),
+    ]
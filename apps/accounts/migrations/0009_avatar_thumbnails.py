@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-17 00:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_attachment_blobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='avatar_thumbnails',
+            field=models.CharField(blank=True, editable=False, max_length=12),
+        ),
+    ]
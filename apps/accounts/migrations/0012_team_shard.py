@@ -0,0 +1,20 @@
+# Generated by Django 4.2 on 2026-10-17 01:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_job_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TeamShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.CharField(blank=True, max_length=100)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-17 01:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0013_user_membership_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadsession',
+            name='writer',
+            field=models.CharField(blank=True, editable=False, max_length=32),
+        ),
+    ]
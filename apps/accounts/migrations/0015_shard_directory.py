@@ -0,0 +1,37 @@
+# Generated by Django 4.2 on 2026-10-17 02:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def record_shards(apps, schema_editor):
+    # Teams used to be on shard{id % N} unless moved; write that down, so
+    # that adding a shard does not move them.
+    shards = settings.DATABASE_SHARDS
+    if not shards:
+        return
+    TeamShard = apps.get_model('accounts', 'TeamShard')
+    entries = TeamShard.objects.using(schema_editor.connection.alias).filter(shard='')
+    pks = list(entries.values_list('pk', flat=True))
+    for index, shard in enumerate(shards):
+        placed = [pk for pk in pks if pk % len(shards) == index]
+        for start in range(0, len(placed), 500):
+            entries.filter(pk__in=placed[start:start + 500]).update(shard=shard)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0014_upload_session_writer'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShardDirectory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(record_shards, migrations.RunPython.noop, hints={'model_name': 'teamshard'}),
+    ]
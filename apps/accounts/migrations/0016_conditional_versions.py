@@ -0,0 +1,29 @@
+# Generated by Django 4.2 on 2026-10-17 02:25
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0015_shard_directory'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='board_changed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='team',
+            name='members_changed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='team',
+            name='projects_changed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-17 02:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0016_conditional_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='dashboard_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
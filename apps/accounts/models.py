@@ -1,50 +1,100 @@
-from django.db import models
+import os
+import uuid
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, router
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 
+from .fractional import key_between
+from .sharding import ShardedManager
+
 class User(AbstractUser):
     email = models.EmailField(unique=True)
-    
+    # Part of the cache key of the user's team ids, see membership.py.
+    membership_version = models.PositiveIntegerField(default=0, editable=False)
+    # Part of the cache key of the dashboard summary, see dashboard.py.
+    dashboard_version = models.PositiveIntegerField(default=0, editable=False)
+
     def __str__(self):
         return self.username
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            # The versions are bumped with update(); a copy loaded before
+            # that must not set them back.
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in ('membership_version', 'dashboard_version')
+            ]
+        super().save(*args, **kwargs)
+
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     bio = models.TextField(max_length=500, blank=True, verbose_name="O mnie")
     avatar = models.ImageField(upload_to='avatars/', blank=True, null=True)
+    # Key of the generated thumbnail set, see thumbnails.py; empty until ready.
+    avatar_thumbnails = models.CharField(max_length=12, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return f"{self.user.username}'s profile"
+    
+    @property
+    def version(self):
+        # The thumbnail key is in image URLs, so keep it in the version.
+        return f'{self.updated_at.timestamp()}:{self.avatar_thumbnails}'
 
 class Team(models.Model):
     name = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='owned_teams')
     members = models.ManyToManyField(User, related_name='teams', blank=True)
+    member_count = models.PositiveIntegerField(default=0, editable=False)
+    project_count = models.PositiveIntegerField(default=0, editable=False)
+    # Versions for the conditional responses, see versions.py.
+    members_changed_at = models.DateTimeField(default=timezone.now, editable=False)
+    projects_changed_at = models.DateTimeField(default=timezone.now, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ShardedManager()
+    
     def __str__(self):
         return self.name
     
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
-        if self.owner and self.owner not in self.members.all():
+        if self.owner_id and not self.members.filter(pk=self.owner_id).exists():
             self.members.add(self.owner)
 
 class Project(models.Model):
     name = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     team = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='projects')
+    todo_count = models.PositiveIntegerField(default=0, editable=False)
+    in_progress_count = models.PositiveIntegerField(default=0, editable=False)
+    done_count = models.PositiveIntegerField(default=0, editable=False)
+    board_changed_at = models.DateTimeField(default=timezone.now, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ShardedManager()
+    
     def __str__(self):
         return f"{self.name} ({self.team.name})"
     
+    @property
+    def task_count(self):
+        return self.todo_count + self.in_progress_count + self.done_count
+    
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['team', '-created_at', '-id'], name='project_team_created_idx'),
+        ]
 
 class Task(models.Model):
     PRIORITY_CHOICES = [
@@ -66,15 +116,52 @@ class Task(models.Model):
     priority = models.CharField(max_length=10, choices=PRIORITY_CHOICES, default='medium')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='todo')
     due_date = models.DateField(null=True, blank=True)
+    # Fractional order key within the (project, status) column, see fractional.py.
+    position = models.CharField(max_length=255, default='', editable=False)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_tasks')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ShardedManager()
+    
     def __str__(self):
         return self.title
     
+    def save(self, *args, **kwargs):
+        # Column and key as loaded or last saved, see signals.task_loaded.
+        placed = getattr(self, '_placed_in', None)
+        changed_column = (
+            placed is not None and None not in placed
+            and placed[:2] != (self.project_id, self.status) and placed[2] == self.position
+        )
+        if not self.position or changed_column:
+            # New cards, and cards sent to another column without a place in
+            # it (the edit form), go to the top of their column.
+            using = kwargs.get('using') or router.db_for_write(Task, instance=self)
+            first = Task.objects.using(using).filter(
+                project_id=self.project_id, status=self.status
+            ).exclude(position='').order_by('position').values_list('position', flat=True).first()
+            self.position = key_between(None, first)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'position' not in update_fields:
+                kwargs['update_fields'] = [*update_fields, 'position']
+        super().save(*args, **kwargs)
+    
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['assigned_to', '-created_at', '-id'], name='task_assignee_created_idx'),
+            models.Index(
+                fields=['assigned_to', 'status', '-created_at', '-id'], name='task_assignee_status_idx'
+            ),
+            models.Index(
+                fields=['assigned_to', 'due_date', 'status'],
+                condition=models.Q(assigned_to__isnull=False),
+                name='task_assignee_due_idx',
+            ),
+            models.Index(fields=['project', 'status', 'position', 'id'], name='task_project_position_idx'),
+            models.Index(fields=['project', 'updated_at'], name='task_project_updated_idx'),
+        ]
 
 class Comment(models.Model):
     task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='comments')
@@ -83,20 +170,153 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ShardedManager()
+    
     def __str__(self):
         return f"Comment by {self.author.username} on {self.task.title}"
     
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['task', 'created_at'], name='comment_task_created_idx'),
+            models.Index(fields=['task', 'updated_at'], name='comment_task_updated_idx'),
+        ]
+
+class Blob(models.Model):
+    # Attachment content stored once per SHA-256, see blobs.py.
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(max_length=255)
+    size = models.BigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return self.sha256
 
 class Attachment(models.Model):
     task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='attachments')
-    file = models.FileField(upload_to='attachments/')
+    file = models.FileField(upload_to='attachments/', max_length=255)
+    blob = models.ForeignKey(Blob, on_delete=models.PROTECT, null=True, blank=True, related_name='attachments')
+    name = models.CharField(max_length=255, blank=True)
+    size = models.BigIntegerField(default=0)
     uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    objects = ShardedManager()
+    
     def __str__(self):
         return f"Attachment for {self.task.title}"
     
+    @property
+    def display_name(self):
+        return self.name or self.file.name.rsplit('/', 1)[-1]
+    
+    class Meta:
+        ordering = ['-created_at']
+
+class UploadSession(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='upload_sessions')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64, blank=True)
+    offset = models.BigIntegerField(default=0)
+    # Token of the request writing at offset, see blobs.append_chunk().
+    writer = models.CharField(max_length=32, blank=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    objects = ShardedManager()
+    
+    def __str__(self):
+        return f"Upload of {self.filename}"
+    
+    @property
+    def part_path(self):
+        return os.path.join(settings.UPLOAD_SESSION_DIR, f'{self.pk}.part')
+
+class TeamShard(models.Model):
+    # Team directory for DATABASE_SHARDS, see sharding.py. It hands out team
+    # ids and records the shard of every team.
+    shard = models.CharField(max_length=100, blank=True)
+    
+    def __str__(self):
+        return f"Team {self.pk} ({self.shard})"
+
+class ShardDirectory(models.Model):
+    # One row; every team move bumps the version, which is part of the keys
+    # of cached team shards, see sharding.team_shards().
+    version = models.PositiveIntegerField(default=0)
+    
+    def __str__(self):
+        return f"Team directory version {self.version}"
+
+class Change(models.Model):
+    # Append-only sync log, see changes.py. The id is the client cursor, and
+    # team/project/user are plain integers so entries outlive what they describe.
+    KIND_CHOICES = [
+        ('project', 'Project'),
+        ('task', 'Task'),
+        ('comment', 'Comment'),
+        ('attachment', 'Attachment'),
+        ('membership', 'Team membership'),
+    ]
+    ACTION_CHOICES = [
+        ('created', 'Created'),
+        ('updated', 'Updated'),
+        ('deleted', 'Deleted'),
+    ]
+    
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    team_id = models.BigIntegerField(null=True)
+    project_id = models.BigIntegerField(null=True)
+    user_id = models.BigIntegerField(null=True)
+    data = models.JSONField(encoder=DjangoJSONEncoder, default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.kind} {self.object_id} {self.action}"
+    
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['team_id', 'id'], name='change_team_idx'),
+            models.Index(fields=['user_id', 'id'], name='change_user_idx'),
+        ]
+
+class Job(models.Model):
+    # Background work for the run_jobs worker, see jobs.py.
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    name = models.CharField(max_length=200)
+    queue = models.CharField(max_length=50, default='default')
+    kwargs = models.JSONField(encoder=DjangoJSONEncoder, default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=1)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"{self.name} ({self.status})"
+    
     class Meta:
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['run_at', 'id']
+        indexes = [
+            models.Index(
+                fields=['queue', 'run_at', 'id'], condition=models.Q(status='queued'), name='job_queued_idx'
+            ),
+            models.Index(fields=['name'], condition=models.Q(status='running'), name='job_running_idx'),
+        ]
@@ -0,0 +1,37 @@
+from django.contrib.auth.tokens import default_token_generator
+from django.core.mail import EmailMultiAlternatives
+from django.template import loader
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from .jobs import job
+from .models import User
+
+
+@job(max_attempts=5)
+def send_email(subject, body, to, from_email=None, html=None):
+    message = EmailMultiAlternatives(subject, body, from_email, to)
+    if html:
+        message.attach_alternative(html, 'text/html')
+    message.send()
+
+
+@job(max_attempts=5)
+def send_password_reset(user_id, subject_template_name, email_template_name, context, from_email=None,
+                        html_email_template_name=None):
+    # The token is made here so the stored job never holds a working link.
+    user = User.objects.filter(pk=user_id, is_active=True).first()
+    if user is None:
+        return
+    context = {
+        **context,
+        'email': user.email,
+        'user': user,
+        'uid': urlsafe_base64_encode(force_bytes(user.pk)),
+        'token': default_token_generator.make_token(user),
+    }
+    subject = ''.join(loader.render_to_string(subject_template_name, context).splitlines())
+    html = None
+    if html_email_template_name is not None:
+        html = loader.render_to_string(html_email_template_name, context)
+    send_email(subject, loader.render_to_string(email_template_name, context), [user.email], from_email, html)
@@ -0,0 +1,146 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Case, IntegerField, Q, Value, When
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .models import Task
+
+
+class KeysetPagination(BasePagination):
+    ordering = ('-created_at', '-id')
+    # Expressions the ordering can name besides model fields.
+    annotations = {}
+    page_size = 50
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Nieprawidłowy kursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.model = queryset.model
+        self.page_size = self.get_page_size(request)
+
+        queryset = queryset.annotate(**self.annotations).order_by(*self.ordering)
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.get_position_filter(position))
+
+        page = list(queryset[:self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        page = page[:self.page_size]
+        self.next_position = self.get_position(page[-1]) if self.has_next else None
+        return page
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def _fields(self):
+        for name in self.ordering:
+            descending = name.startswith('-')
+            name = name.lstrip('-')
+            if name in self.annotations:
+                yield name, self.annotations[name].output_field, descending
+            else:
+                yield name, self.model._meta.get_field(name), descending
+
+    def get_position(self, row):
+        position = []
+        for name, field, _ in self._fields():
+            if isinstance(row, dict):
+                value = row[name]
+            else:
+                value = getattr(row, name if name in self.annotations else field.attname)
+            position.append(value)
+        return position
+
+    def get_position_filter(self, position):
+        # Rows strictly after the cursor in (field1, field2, ...) order.
+        condition = Q()
+        equal = {}
+        for (name, _, descending), value in zip(self._fields(), position):
+            lookup = 'lt' if descending else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def encode_cursor(self, position):
+        values = [
+            value.isoformat() if hasattr(value, 'isoformat') else value
+            for value in position
+        ]
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            fields = list(self._fields())
+            if not isinstance(values, list) or len(values) != len(fields):
+                raise ValueError
+            return [field.to_python(value) for (_, field, _), value in zip(fields, values)]
+        except (TypeError, ValueError, binascii.Error, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Kursor następnej strony zwrócony w polu "next"',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': f'Liczba wyników na stronie (maks. {self.max_page_size})',
+                'schema': {'type': 'integer'},
+            },
+        ]
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class ColumnPagination(KeysetPagination):
+    # Board order: columns as in STATUS_CHOICES, cards in their stored order.
+    ordering = ('column', 'position', 'id')
+    annotations = {
+        'column': Case(
+            *[When(status=status, then=Value(index)) for index, (status, _) in enumerate(Task.STATUS_CHOICES)],
+            default=Value(len(Task.STATUS_CHOICES)),
+            output_field=IntegerField(),
+        ),
+    }
+    page_size = 100
+    max_page_size = 1000
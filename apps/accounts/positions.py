@@ -0,0 +1,78 @@
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import Count, Q
+from django.db.models.functions import Length
+from rest_framework.exceptions import ValidationError
+
+from .fractional import key_between, keys_between
+from .models import Task
+
+# Repeated inserts into the same gap add roughly one character per six moves;
+# columns with keys longer than this are renumbered by rebalance_positions().
+POSITION_REBALANCE_LENGTH = getattr(settings, 'TASK_POSITION_REBALANCE_LENGTH', 32)
+
+
+def move_task(task, status=None, after=None, before=None, using=None):
+    """
+    Put ``task`` directly below the task with id ``after`` and above the one
+    with id ``before`` in the ``status`` column. Only the moved row is written.
+    """
+    using = using or router.db_for_write(Task, instance=task)
+    status = status or task.status
+    neighbour_ids = [pk for pk in (after, before) if pk is not None]
+    neighbours = {
+        row['pk']: row for row in Task.objects.using(using).filter(pk__in=neighbour_ids).values(
+            'pk', 'project_id', 'status', 'position'
+        )
+    }
+    for name, pk in (('after', after), ('before', before)):
+        row = neighbours.get(pk)
+        if pk is not None and (
+            row is None or pk == task.pk or row['project_id'] != task.project_id or row['status'] != status
+        ):
+            raise ValidationError({name: 'Zadanie nie należy do tej kolumny.'})
+
+    lower = (neighbours[after]['position'] or None) if after is not None else None
+    upper = (neighbours[before]['position'] or None) if before is not None else None
+    column = Task.objects.using(using).filter(
+        project_id=task.project_id, status=status
+    ).exclude(pk=task.pk).exclude(position='').values_list('position', flat=True)
+    if lower is not None and (upper is None or lower >= upper):
+        # Only the card above is known, or the client's view is stale.
+        upper = column.filter(position__gt=lower).order_by('position').first()
+    elif upper is not None and lower is None and after is None:
+        lower = column.filter(position__lt=upper).order_by('-position').first()
+    elif lower is None and upper is None:
+        upper = column.order_by('position').first()
+
+    task.status = status
+    task.position = key_between(lower, upper)
+    task.save(using=using, update_fields=['status', 'position', 'updated_at'])
+    return task
+
+
+def columns_to_rebalance(max_length=POSITION_REBALANCE_LENGTH, using='default'):
+    tasks = Task.objects.using(using).order_by()
+    long_keys = tasks.annotate(length=Length('position')).filter(
+        Q(length__gt=max_length) | Q(position='')
+    ).values_list('project_id', 'status').distinct()
+    duplicates = tasks.values('project_id', 'status', 'position').annotate(
+        total=Count('pk')
+    ).filter(total__gt=1).values_list('project_id', 'status').distinct()
+    return sorted(set(long_keys) | set(duplicates))
+
+
+def rebalance_positions(max_length=POSITION_REBALANCE_LENGTH, batch_size=1000, using='default'):
+    columns = columns_to_rebalance(max_length, using=using)
+    for project_id, status in columns:
+        # Renumbering keeps the order, so the board does not visibly change.
+        with transaction.atomic(using=using):
+            tasks = list(
+                Task.objects.using(using).filter(project_id=project_id, status=status).order_by(
+                    'position', 'id'
+                ).select_for_update().only('pk', 'position')
+            )
+            for task, position in zip(tasks, keys_between(None, None, len(tasks))):
+                task.position = position
+            Task.objects.using(using).bulk_update(tasks, ['position'], batch_size=batch_size)
+    return columns
@@ -0,0 +1,53 @@
+import math
+from itertools import chain, compress
+from operator import not_
+
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+SCALAR_TYPES = {str, int, bool, type(None)}
+
+
+def _has_non_finite(data):
+    # orjson writes NaN and infinities as null. The check goes one nesting
+    # level at a time with map() and compress(), so no Python code runs per
+    # value; that would cost more than orjson saves.
+    items = [data]
+    while items:
+        items = list(compress(items, map(not_, map(SCALAR_TYPES.__contains__, map(type, items)))))
+        if not all(map(math.isfinite, compress(items, map(float.__instancecheck__, items)))):
+            return True
+        items = list(chain(
+            chain.from_iterable(map(dict.values, compress(items, map(dict.__instancecheck__, items)))),
+            chain.from_iterable(compress(items, map(list.__instancecheck__, items))),
+            chain.from_iterable(compress(items, map(tuple.__instancecheck__, items))),
+        ))
+    return False
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Renders with orjson into the same JSON document as JSONRenderer. Dates
+    and times (UTC as 'Z'), lazy translations, Decimals and anything else
+    orjson has no native form for go through JSONRenderer's encoder; what
+    that encoder rejects, NaN and infinities (orjson would write null) and
+    indented output go through the regular renderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if b'null' in ret and _has_non_finite(data):
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
@@ -0,0 +1,98 @@
+import contextvars
+import random
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core import signing
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'primary_pin'
+PIN_HEADER = 'X-Primary-Pin'
+
+# Set by ReplicaRoutingMiddleware for the duration of a request. Outside
+# requests (commands, job workers) it is None and everything uses the primary.
+_routing = contextvars.ContextVar('replica_routing', default=None)
+
+
+class ReadRouting:
+    def __init__(self, replica, pinned=False):
+        self.replica = replica
+        self.pinned = pinned
+        self.wrote = False
+
+
+def _pin_signer():
+    return signing.TimestampSigner(salt='apps.accounts.routers.pin')
+
+
+def pin_token():
+    # What the cookie is for browsers: API clients send it back in PIN_HEADER.
+    return _pin_signer().sign('primary')
+
+
+def is_pin_valid(token):
+    if not token:
+        return False
+    try:
+        _pin_signer().unsign(token, max_age=settings.REPLICA_PIN_SECONDS)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+@contextmanager
+def replica_reads(pinned=False):
+    """Let reads in the block go to one replica, picked for the whole block
+    so that a page is not assembled from replicas with different lag."""
+    routing = ReadRouting(random.choice(settings.DATABASE_REPLICAS), pinned)
+    token = _routing.set(routing)
+    try:
+        yield routing
+    finally:
+        _routing.reset(token)
+
+
+@contextmanager
+def primary_reads():
+    # For results that outlive the request, like cache entries: a replica
+    # may not have the write that invalidated them yet.
+    token = _routing.set(None)
+    try:
+        yield
+    finally:
+        _routing.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """
+    Writes go to the primary ('default'). Reads in requests go to a replica
+    from settings.DATABASE_REPLICAS, unless the request already wrote, runs
+    in a transaction, or its client wrote in the last REPLICA_PIN_SECONDS.
+    """
+
+    def db_for_read(self, model, **hints):
+        routing = _routing.get()
+        if routing is None or routing.pinned:
+            return DEFAULT_DB_ALIAS
+        # Reads inside a transaction must see its own writes.
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return routing.replica
+
+    def db_for_write(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None:
+            routing.pinned = routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Replicas get the schema with the data.
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
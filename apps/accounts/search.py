@@ -0,0 +1,279 @@
+import re
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from django.utils.text import Truncator
+
+from .membership import get_team_ids
+from .models import Task, Comment
+from .sharding import databases_for_teams
+
+SEARCH_KINDS = ('task', 'comment')
+MAX_TERMS = 8
+# Ranking every match of a common word means scoring hundreds of thousands of
+# rows. Instead the newest visible matches are streamed in rowid order and only
+# those are ranked, which keeps the cost bounded however large the index gets;
+# older matches beyond them are not found.
+SEARCH_CANDIDATES = getattr(settings, 'SEARCH_CANDIDATES', 500)
+FTS_TABLES = {
+    'task': 'accounts_task_fts',
+    'comment': 'accounts_comment_fts',
+}
+INDEXED_COLUMNS = {
+    'accounts_task_fts': ('accounts_task', ['title', 'description']),
+    'accounts_comment_fts': ('accounts_comment', ['content']),
+}
+# Control characters never appear in stored text, so they can mark matches in
+# snippets before the text is escaped.
+_MATCH_START = '\x02'
+_MATCH_END = '\x03'
+
+_fts_available = {}
+
+
+def search_terms(query):
+    return re.findall(r'\w+', query or '')[:MAX_TERMS]
+
+
+def _match_expression(terms):
+    # Every term is quoted so user input can never be read as FTS5 syntax;
+    # the last one is a prefix so results show up while typing.
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def _highlight(snippet):
+    return mark_safe(
+        escape(snippet).replace(_MATCH_START, '<mark>').replace(_MATCH_END, '</mark>')
+    )
+
+
+def _has_fts_tables(connection):
+    return (
+        connection.vendor == 'sqlite'
+        and set(FTS_TABLES.values()) <= set(connection.introspection.table_names())
+    )
+
+
+def fts_available(using='default'):
+    connection = connections[using]
+    key = (using, connection.settings_dict['NAME'])
+    if key not in _fts_available:
+        _fts_available[key] = _has_fts_tables(connection)
+    return _fts_available[key]
+
+
+def _trigger_statements(fts_table, table, columns):
+    column_list = ', '.join(columns)
+    new_values = ', '.join(f'new.{column}' for column in columns)
+    old_values = ', '.join(f'old.{column}' for column in columns)
+    changed = ' OR '.join(f'old.{column} IS NOT new.{column}' for column in columns)
+    insert = f'INSERT INTO {fts_table}(rowid, {column_list}) VALUES (new.id, {new_values});'
+    delete = (
+        f"INSERT INTO {fts_table}({fts_table}, rowid, {column_list}) "
+        f"VALUES ('delete', old.id, {old_values});"
+    )
+    return [
+        f'CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {table} BEGIN {insert} END',
+        f'CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {table} BEGIN {delete} END',
+        f'CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE ON {table} '
+        f'WHEN {changed} BEGIN {delete} {insert} END',
+    ]
+
+
+def install_search_triggers(using='default'):
+    # SQLite drops a table's triggers when a migration rebuilds the table
+    # (most AddField/AlterField operations do), so they are recreated after
+    # every migrate run. Rebuilt tables keep their ids, so the index is intact.
+    connection = connections[using]
+    if not _has_fts_tables(connection):
+        return False
+    with connection.cursor() as cursor:
+        for fts_table, (table, columns) in INDEXED_COLUMNS.items():
+            for statement in _trigger_statements(fts_table, table, columns):
+                cursor.execute(statement)
+    return True
+
+
+def _search_tasks_fts(cursor, match, team_ids, limit):
+    placeholders = ', '.join(['%s'] * len(team_ids))
+    cursor.execute(
+        f"""
+        SELECT * FROM (
+            SELECT t.id, t.title, p.id, p.name, bm25(accounts_task_fts, 10.0, 1.0) AS rank
+            FROM accounts_task_fts
+            JOIN accounts_task t ON t.id = accounts_task_fts.rowid
+            JOIN accounts_project p ON p.id = t.project_id
+            WHERE accounts_task_fts MATCH %s AND p.team_id IN ({placeholders})
+            ORDER BY accounts_task_fts.rowid DESC
+            LIMIT %s
+        )
+        ORDER BY rank
+        LIMIT %s
+        """,
+        [match, *team_ids, SEARCH_CANDIDATES, limit],
+    )
+    return [
+        {
+            'type': 'task',
+            'id': task_id,
+            'task_id': task_id,
+            'task_title': title,
+            'project_id': project_id,
+            'project_name': project_name,
+            'rank': rank,
+        }
+        for task_id, title, project_id, project_name, rank in cursor.fetchall()
+    ]
+
+
+def _search_comments_fts(cursor, match, team_ids, limit):
+    placeholders = ', '.join(['%s'] * len(team_ids))
+    cursor.execute(
+        f"""
+        SELECT * FROM (
+            SELECT c.id, t.id, t.title, p.id, p.name, bm25(accounts_comment_fts) AS rank
+            FROM accounts_comment_fts
+            JOIN accounts_comment c ON c.id = accounts_comment_fts.rowid
+            JOIN accounts_task t ON t.id = c.task_id
+            JOIN accounts_project p ON p.id = t.project_id
+            WHERE accounts_comment_fts MATCH %s AND p.team_id IN ({placeholders})
+            ORDER BY accounts_comment_fts.rowid DESC
+            LIMIT %s
+        )
+        ORDER BY rank
+        LIMIT %s
+        """,
+        [match, *team_ids, SEARCH_CANDIDATES, limit],
+    )
+    return [
+        {
+            'type': 'comment',
+            'id': comment_id,
+            'task_id': task_id,
+            'task_title': title,
+            'project_id': project_id,
+            'project_name': project_name,
+            'rank': rank,
+        }
+        for comment_id, task_id, title, project_id, project_name, rank in cursor.fetchall()
+    ]
+
+
+def _add_snippets(cursor, match, results):
+    # snippet() reads the whole document, so it only runs for the page. A
+    # rowid constraint would make FTS5 load the full doclist of a prefix
+    # term; "+rowid" keeps the match streaming newest first, and the page is
+    # among the newest candidates.
+    for kind, fts_table in FTS_TABLES.items():
+        page = [result for result in results if result['type'] == kind]
+        if not page:
+            continue
+        placeholders = ', '.join(['%s'] * len(page))
+        cursor.execute(
+            f"""
+            SELECT rowid, snippet({fts_table}, -1, %s, %s, '…', 16)
+            FROM {fts_table}
+            WHERE {fts_table} MATCH %s AND +rowid IN ({placeholders})
+            ORDER BY rowid DESC
+            LIMIT %s
+            """,
+            [_MATCH_START, _MATCH_END, match, *(result['id'] for result in page), len(page)],
+        )
+        snippets = dict(cursor.fetchall())
+        for result in page:
+            result['snippet'] = _highlight(snippets.get(result['id'], ''))
+
+
+def _search_fts(terms, team_ids, kinds, limit, using):
+    match = _match_expression(terms)
+    searches = {'task': _search_tasks_fts, 'comment': _search_comments_fts}
+    results = []
+    with connections[using].cursor() as cursor:
+        for kind in kinds:
+            results.extend(searches[kind](cursor, match, team_ids, limit))
+        # bm25 scores are negative, better matches are lower.
+        results.sort(key=lambda result: result['rank'])
+        results = results[:limit]
+        _add_snippets(cursor, match, results)
+    return results
+
+
+def _search_like(terms, team_ids, kinds, limit, using):
+    # Fallback for databases without the FTS5 tables: unranked LIKE scans,
+    # newest first.
+    results = []
+    if 'task' in kinds:
+        condition = Q()
+        for term in terms:
+            condition &= Q(title__icontains=term) | Q(description__icontains=term)
+        tasks = Task.objects.using(using).filter(
+            condition, project__team_id__in=team_ids
+        ).values('id', 'title', 'description', 'project_id', 'project__name')[:limit]
+        results.extend(
+            {
+                'type': 'task',
+                'id': task['id'],
+                'task_id': task['id'],
+                'task_title': task['title'],
+                'project_id': task['project_id'],
+                'project_name': task['project__name'],
+                'snippet': escape(Truncator(task['description'] or task['title']).words(16)),
+                'rank': None,
+            }
+            for task in tasks
+        )
+    if 'comment' in kinds:
+        condition = Q()
+        for term in terms:
+            condition &= Q(content__icontains=term)
+        comments = Comment.objects.using(using).filter(
+            condition, task__project__team_id__in=team_ids
+        ).order_by('-created_at').values(
+            'id', 'content', 'task_id', 'task__title', 'task__project_id', 'task__project__name'
+        )[:limit]
+        results.extend(
+            {
+                'type': 'comment',
+                'id': comment['id'],
+                'task_id': comment['task_id'],
+                'task_title': comment['task__title'],
+                'project_id': comment['task__project_id'],
+                'project_name': comment['task__project__name'],
+                'snippet': escape(Truncator(comment['content']).words(16)),
+                'rank': None,
+            }
+            for comment in comments
+        )
+    return results[:limit]
+
+
+def search(user, query, kinds=SEARCH_KINDS, limit=20, using='default'):
+    terms = search_terms(query)
+    team_ids = sorted(get_team_ids(user))
+    if not terms or not team_ids:
+        return []
+    databases = databases_for_teams(team_ids) if settings.DATABASE_SHARDS else {using: team_ids}
+    results = []
+    for alias, ids in databases.items():
+        if fts_available(alias):
+            results += _search_fts(terms, ids, kinds, limit, alias)
+        else:
+            results += _search_like(terms, ids, kinds, limit, alias)
+    if len(databases) > 1:
+        # bm25 scores from different shards are close enough to compare.
+        results.sort(key=lambda result: (result['rank'] is None, result['rank'] or 0))
+    return results[:limit]
+
+
+def rebuild_search_index(using='default', optimize=False):
+    install_search_triggers(using)
+    with connections[using].cursor() as cursor:
+        for fts_table in FTS_TABLES.values():
+            cursor.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+            if optimize:
+                cursor.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('optimize')")
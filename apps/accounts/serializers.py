@@ -1,5 +1,7 @@
+from django.db.models import F
+from django.urls import reverse
 from rest_framework import serializers
-from .models import Project, Task
+from .models import Attachment, Change, Project, Task, UploadSession
 
 class ProjectSerializer(serializers.ModelSerializer):
     team_id = serializers.IntegerField(source='team.id', read_only=True)
@@ -19,7 +21,156 @@ class TaskSerializer(serializers.ModelSerializer):
     class Meta:
         model = Task
         fields = [
-            'id', 'title', 'description', 'priority', 'status', 'due_date',
+            'id', 'title', 'description', 'priority', 'status', 'position', 'due_date',
             'project_id', 'project_name', 'assigned_to_id', 'assigned_to_username',
             'created_at', 'updated_at'
-        ]
\ No newline at end of file
+        ]
+
+class TaskBulkChangeSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    status = serializers.ChoiceField(choices=Task.STATUS_CHOICES, required=False)
+    priority = serializers.ChoiceField(choices=Task.PRIORITY_CHOICES, required=False)
+    assigned_to = serializers.IntegerField(required=False, allow_null=True)
+    due_date = serializers.DateField(required=False, allow_null=True)
+    
+    def validate(self, attrs):
+        if len(attrs) == 1:
+            raise serializers.ValidationError('Podaj przynajmniej jedno pole do zmiany.')
+        return attrs
+
+class TaskMoveSerializer(serializers.Serializer):
+    status = serializers.ChoiceField(choices=Task.STATUS_CHOICES, required=False)
+    after = serializers.IntegerField(required=False, allow_null=True, help_text='Id of the card directly above')
+    before = serializers.IntegerField(required=False, allow_null=True, help_text='Id of the card directly below')
+
+class TaskBulkUpdateSerializer(serializers.Serializer):
+    tasks = TaskBulkChangeSerializer(many=True, allow_empty=False, max_length=1000)
+    
+    def validate_tasks(self, value):
+        ids = [change['id'] for change in value]
+        if len(set(ids)) != len(ids):
+            raise serializers.ValidationError('Każde zadanie może wystąpić tylko raz.')
+        return value
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    task_id = serializers.IntegerField(read_only=True)
+    size = serializers.IntegerField(min_value=0)
+    sha256 = serializers.RegexField(
+        r'^[0-9a-f]{64}$', required=False, allow_blank=True,
+        help_text='Hex SHA-256 of the whole file; content the server already has is attached without uploading'
+    )
+    
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'task_id', 'filename', 'size', 'sha256', 'offset', 'created_at']
+        read_only_fields = ['offset', 'created_at']
+
+class AttachmentSerializer(serializers.ModelSerializer):
+    task_id = serializers.IntegerField(read_only=True)
+    uploaded_by_id = serializers.IntegerField(read_only=True)
+    sha256 = serializers.CharField(source='blob.sha256', read_only=True)
+    url = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = Attachment
+        fields = ['id', 'task_id', 'name', 'size', 'sha256', 'url', 'uploaded_by_id', 'created_at']
+    
+    def get_url(self, obj) -> str:
+        return reverse('attachment_download', args=[obj.pk])
+
+class ChangeSerializer(serializers.ModelSerializer):
+    cursor = serializers.IntegerField(source='id', read_only=True)
+    data = serializers.JSONField(
+        read_only=True, help_text='Current fields of the object; only its id (and parent ids) for deletions'
+    )
+    
+    class Meta:
+        model = Change
+        fields = ['cursor', 'kind', 'action', 'object_id', 'team_id', 'project_id', 'user_id', 'data', 'created_at']
+
+class ValuesField:
+    def __init__(self, source, field=None, requires=None):
+        self.source = source
+        self.to_representation = field.to_representation if field is not None else None
+        self.requires = requires
+
+
+class ValuesReadSerializer:
+    """
+    Read-only serializer for ``QuerySet.values()`` rows. Produces the same
+    output as the matching ModelSerializer without building model instances.
+    A field with ``requires`` is left out when that key is null, the way a
+    ModelSerializer skips sources that go through an empty relation.
+    """
+    fields = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.lookups = []
+        cls.expressions = {}
+        cls.accessors = []
+        for name, spec in cls.fields.items():
+            if isinstance(spec.source, str):
+                cls.lookups.append(spec.source)
+                key = spec.source
+            else:
+                cls.expressions[name] = spec.source
+                key = name
+            cls.accessors.append((name, key, spec.to_representation, spec.requires))
+        cls.lookups.extend(
+            spec.requires for spec in cls.fields.values()
+            if spec.requires and spec.requires not in cls.lookups
+        )
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    @classmethod
+    def values(cls, queryset, *extra):
+        return queryset.values(*cls.lookups, *extra, **cls.expressions)
+
+    @classmethod
+    def to_representation(cls, row):
+        data = {}
+        for name, key, to_representation, requires in cls.accessors:
+            if requires is not None and row[requires] is None:
+                continue
+            value = row[key]
+            if to_representation is not None and value is not None:
+                value = to_representation(value)
+            data[name] = value
+        return data
+
+    @property
+    def data(self):
+        to_representation = self.to_representation
+        return [to_representation(row) for row in self.rows]
+
+
+class ProjectReadSerializer(ValuesReadSerializer):
+    fields = {
+        'id': ValuesField('id'),
+        'name': ValuesField('name'),
+        'description': ValuesField('description'),
+        'team_id': ValuesField('team_id'),
+        'team_name': ValuesField('team__name'),
+        'task_count': ValuesField(F('todo_count') + F('in_progress_count') + F('done_count')),
+    }
+
+
+class TaskReadSerializer(ValuesReadSerializer):
+    fields = {
+        'id': ValuesField('id'),
+        'title': ValuesField('title'),
+        'description': ValuesField('description'),
+        'priority': ValuesField('priority'),
+        'status': ValuesField('status'),
+        'position': ValuesField('position'),
+        'due_date': ValuesField('due_date', serializers.DateField()),
+        'project_id': ValuesField('project_id'),
+        'project_name': ValuesField('project__name'),
+        'assigned_to_id': ValuesField('assigned_to_id', requires='assigned_to_id'),
+        'assigned_to_username': ValuesField('assigned_to__username', requires='assigned_to_id'),
+        'created_at': ValuesField('created_at', serializers.DateTimeField()),
+        'updated_at': ValuesField('updated_at', serializers.DateTimeField()),
+    }
@@ -0,0 +1,728 @@
+import contextvars
+import heapq
+import itertools
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, NotSupportedError, connections, models, router, transaction
+from django.db.models import Count, F, Max
+from django.db.models.constants import LOOKUP_SEP
+from django.db.models.expressions import Col
+from django.db.models.query import ModelIterable, FlatValuesListIterable
+from django.db.models.sql.where import AND, WhereNode
+
+TEAM_MODEL = 'accounts.team'
+# The foreign key each sharded model follows towards its team.
+PARENT_FIELDS = {
+    'accounts.team_members': 'team',
+    'accounts.project': 'team',
+    'accounts.task': 'project',
+    'accounts.comment': 'task',
+    'accounts.attachment': 'task',
+    'accounts.uploadsession': 'task',
+}
+# Blobs are per shard too, but always used with an explicit database.
+SHARDED_MODELS = {TEAM_MODEL, 'accounts.blob', *PARENT_FIELDS}
+# Copied to every shard, so that joins and foreign keys work there.
+MIRRORED_MODELS = {'accounts.user', 'accounts.profile'}
+# Shard n allocates ids from (n + 1) * SHARD_ID_STRIDE up, so rows keep
+# unique ids across shards and ids from before sharding stay below them.
+SHARD_ID_STRIDE = 10 ** 12
+RANGED_MODELS = ('accounts.project', 'accounts.task', 'accounts.comment', 'accounts.attachment')
+SHARD_CACHE_TIMEOUT = getattr(settings, 'SHARD_CACHE_TIMEOUT', 24 * 60 * 60)
+MIRROR_BATCH_SIZE = 1000
+MOVE_BATCH_SIZE = 500
+# Set by ShardDirectoryMiddleware, so that a request reads the directory
+# version once.
+_directory = contextvars.ContextVar('shard_directory', default=None)
+
+
+class ShardingError(Exception):
+    pass
+
+
+def data_databases():
+    """Databases that hold teams and their projects, tasks and files."""
+    return list(settings.DATABASE_SHARDS) or [DEFAULT_DB_ALIAS]
+
+
+def is_sharded(model):
+    return bool(settings.DATABASE_SHARDS) and model._meta.label_lower in SHARDED_MODELS
+
+
+def _is_mirrored(model):
+    return model._meta.label_lower in MIRRORED_MODELS
+
+
+def _shard_key(team_id, version):
+    return f'shard:team:{version}:{team_id}'
+
+
+def default_shard(team_id):
+    """The shard a new team is created in."""
+    shards = settings.DATABASE_SHARDS
+    return shards[team_id % len(shards)]
+
+
+@contextmanager
+def directory_snapshot():
+    token = _directory.set({})
+    try:
+        yield
+    finally:
+        _directory.reset(token)
+
+
+def directory_version():
+    from .models import ShardDirectory
+
+    snapshot = _directory.get()
+    if snapshot is not None and 'version' in snapshot:
+        return snapshot['version']
+    version = ShardDirectory.objects.using(DEFAULT_DB_ALIAS).values_list('version', flat=True).first() or 0
+    if snapshot is not None:
+        snapshot['version'] = version
+    return version
+
+
+def _bump_directory_version():
+    from .models import ShardDirectory
+
+    directory = ShardDirectory.objects.using(DEFAULT_DB_ALIAS)
+    if not directory.update(version=F('version') + 1):
+        directory.create(version=1)
+
+
+def team_shards(team_ids):
+    """
+    Map team ids to their shards, as recorded in the directory. Cache keys
+    include the directory version, so after a move every process misses
+    the old placement.
+    """
+    from .models import TeamShard
+
+    version = directory_version()
+    keys = {_shard_key(team_id, version): team_id for team_id in team_ids}
+    placement = {keys[key]: shard for key, shard in cache.get_many(keys).items()}
+    missing = set(keys.values()) - placement.keys()
+    if missing:
+        found = dict(
+            TeamShard.objects.using(DEFAULT_DB_ALIAS).filter(pk__in=missing).exclude(shard='').values_list(
+                'pk', 'shard'
+            )
+        )
+        cache.set_many(
+            {_shard_key(team_id, version): shard for team_id, shard in found.items()}, SHARD_CACHE_TIMEOUT
+        )
+        placement.update(found)
+        # Ids that are not teams (yet): nothing to find on any shard.
+        placement.update({team_id: default_shard(team_id) for team_id in missing - found.keys()})
+    return placement
+
+
+def shard_for_team(team_id):
+    return team_shards([team_id])[team_id]
+
+
+def databases_for_teams(team_ids):
+    """Group team ids by the database that holds them, in shard order."""
+    team_ids = sorted(team_ids)
+    if not settings.DATABASE_SHARDS:
+        return {DEFAULT_DB_ALIAS: team_ids}
+    groups = defaultdict(list)
+    for team_id, shard in team_shards(team_ids).items():
+        groups[shard].append(team_id)
+    return {shard: sorted(groups[shard]) for shard in settings.DATABASE_SHARDS if shard in groups}
+
+
+def allocate_team_id():
+    from .models import TeamShard
+
+    # The directory lives in the default database, so its sequence hands
+    # out team ids that are unique across shards. The shard is recorded
+    # right away: with another shard added, the id would pick a new one.
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        entry = TeamShard.objects.using(DEFAULT_DB_ALIAS).create()
+        TeamShard.objects.using(DEFAULT_DB_ALIAS).filter(pk=entry.pk).update(shard=default_shard(entry.pk))
+    return entry.pk
+
+
+def _home_shards(pk):
+    # The shard whose id range the pk is in, first; rows of moved teams are
+    # found on the next tries.
+    shards = list(settings.DATABASE_SHARDS)
+    try:
+        index = int(pk) // SHARD_ID_STRIDE - 1
+    except (TypeError, ValueError):
+        return shards
+    if 0 <= index < len(shards):
+        shards.insert(0, shards.pop(index))
+    return shards
+
+
+def locate(model, pk):
+    for alias in _home_shards(pk):
+        if model._base_manager.using(alias).filter(pk=pk).exists():
+            return alias
+    return None
+
+
+def shard_for_instance(instance):
+    """The shard an object of a sharded model belongs in, following its parents to the team."""
+    shards = settings.DATABASE_SHARDS
+    if instance._state.db in shards and not instance._state.adding:
+        return instance._state.db
+    label = instance._meta.label_lower
+    if label == TEAM_MODEL:
+        if instance.pk is None:
+            instance.pk = allocate_team_id()
+        return shard_for_team(instance.pk)
+    if label not in PARENT_FIELDS:
+        return instance._state.db if instance._state.db in shards else None
+    field = instance._meta.get_field(PARENT_FIELDS[label])
+    if field.is_cached(instance):
+        parent = field.get_cached_value(instance)
+        return shard_for_instance(parent) if parent is not None else None
+    parent_id = getattr(instance, field.attname)
+    if parent_id is None:
+        return None
+    if field.related_model._meta.label_lower == TEAM_MODEL:
+        return shard_for_team(parent_id)
+    return locate(field.related_model, parent_id)
+
+
+def _is_team_column(field):
+    if field.model._meta.label_lower == TEAM_MODEL and field.primary_key:
+        return True
+    return field.many_to_one and field.related_model._meta.label_lower == TEAM_MODEL
+
+
+def _is_pk_column(field):
+    return field.primary_key
+
+
+def _where_values(node, matches):
+    """
+    Values the rows of a WHERE tree are limited to by exact or IN lookups on
+    columns accepted by ``matches``, or None if there are no such limits.
+    """
+    if node.negated or (node.connector != AND and len(node.children) > 1):
+        return None
+    found = None
+    for child in node.children:
+        if isinstance(child, WhereNode):
+            values = _where_values(child, matches)
+        else:
+            values = _lookup_values(child, matches)
+        if values is not None:
+            found = values if found is None else found & values
+    return found
+
+
+def _lookup_values(lookup, matches):
+    lhs = getattr(lookup, 'lhs', None)
+    if not isinstance(lhs, Col) or lookup.lookup_name not in ('exact', 'in') or not matches(lhs.target):
+        return None
+    values = [lookup.rhs] if lookup.lookup_name == 'exact' else lookup.rhs
+    try:
+        return {int(value) for value in values}
+    except (TypeError, ValueError):
+        return None
+
+
+def target_shards(queryset):
+    """
+    Shards a query has to run on, or None when it is not sharded and runs
+    on the database the routers pick. Queries narrowed to some teams, and
+    those of related managers, only go to the shards of those teams.
+    """
+    shards = settings.DATABASE_SHARDS
+    if queryset._db is not None or not is_sharded(queryset.model):
+        return None
+    instance = queryset._hints.get('instance')
+    if instance is not None and instance._state.db in shards:
+        return [instance._state.db]
+    team_ids = _where_values(queryset.query.where, _is_team_column)
+    if team_ids is None:
+        return list(shards)
+    placement = set(team_shards(team_ids).values())
+    return [alias for alias in shards if alias in placement]
+
+
+def per_database(queryset):
+    """The queryset once for every database it has to run on."""
+    aliases = target_shards(queryset)
+    if aliases is None:
+        return [queryset]
+    return [queryset.using(alias) for alias in aliases]
+
+
+def _nulls_first(value):
+    # Databases sort NULL before any value in ascending order.
+    return (value is not None, value)
+
+
+def _sum(values):
+    values = [value for value in values if value is not None]
+    return sum(values) if values else None
+
+
+COMBINE_AGGREGATES = {
+    'Count': lambda values: sum(value or 0 for value in values),
+    'Sum': _sum,
+    'Max': lambda values: max((value for value in values if value is not None), default=None),
+    'Min': lambda values: min((value for value in values if value is not None), default=None),
+}
+
+
+class ShardedQuerySet(models.QuerySet):
+    """
+    Without DATABASE_SHARDS, or with an explicit using(), a plain QuerySet.
+    Otherwise queries go to the shards of the teams they filter on (all
+    shards if there is no such filter) and the results are combined:
+    rows are merged in the query's order and sliced, counts and Count, Sum,
+    Max and Min aggregates are added up or compared, and update() and
+    delete() run on each shard. Subqueries and joins see one shard only.
+    """
+
+    def _target_shards(self):
+        aliases = target_shards(self)
+        if aliases is not None and len(aliases) == 1:
+            # One shard: run exactly as without sharding.
+            self._db = aliases[0]
+            return None
+        return aliases
+
+    def _ordering(self):
+        if self.query.order_by:
+            names = self.query.order_by
+        elif self.query.default_ordering:
+            names = self.query.get_meta().ordering
+        else:
+            names = ()
+        ordering = []
+        for name in names:
+            if not isinstance(name, str) or name == '?':
+                return None
+            ordering.append((name.lstrip('-'), name.startswith('-')))
+        return ordering
+
+    def _row_names(self):
+        return list(self._fields) or [field.attname for field in self.model._meta.concrete_fields]
+
+    def _can_merge_by(self, name):
+        if self._iterable_class is not ModelIterable:
+            names = self._row_names()
+            if name == 'pk' and name not in names:
+                name = self.model._meta.pk.attname
+            if self._iterable_class is FlatValuesListIterable:
+                return names == [name]
+            return name in names
+        if name == 'pk' or name in self.query.annotations:
+            return True
+        opts = self.model._meta
+        *path, last = name.split(LOOKUP_SEP)
+        try:
+            for part in path:
+                field = opts.get_field(part)
+                if not (field.many_to_one or field.one_to_one):
+                    return False
+                opts = field.related_model._meta
+            field = opts.get_field(last)
+        except FieldDoesNotExist:
+            return False
+        # A relation by its name orders by the related model's ordering.
+        return field.concrete and (not field.is_relation or last == field.attname)
+
+    def _merge_ordering(self):
+        """
+        The ordering the shards' rows are merged by. An explicit order_by()
+        the merge can't reproduce raises NotSupportedError; a Meta.ordering
+        over fields the rows don't carry is left out, the rows then come in
+        shard order.
+        """
+        ordering = self._ordering()
+        if ordering is None:
+            raise NotSupportedError('Cannot merge rows ordered by an expression or at random across shards.')
+        unsupported = [name for name, _ in ordering if not self._can_merge_by(name)]
+        if unsupported and self.query.order_by:
+            raise NotSupportedError(
+                f'Cannot merge rows ordered by {", ".join(unsupported)} across shards; select the fields to order by.'
+            )
+        return [] if unsupported else ordering
+
+    def _row_value(self, row, name):
+        if self._iterable_class is ModelIterable:
+            for part in name.split(LOOKUP_SEP):
+                row = getattr(row, part)
+            return row
+        names = self._row_names()
+        if name == 'pk' and name not in names:
+            name = self.model._meta.pk.attname
+        if isinstance(row, dict):
+            return row[name]
+        if self._iterable_class is FlatValuesListIterable:
+            return row
+        return row[names.index(name)]
+
+    def _sort_key(self, ordering):
+        if not ordering:
+            return None, False
+        if len({descending for _, descending in ordering}) > 1:
+            raise NotSupportedError('Cannot stream rows ordered in mixed directions across shards.')
+
+        def key(row):
+            return [_nulls_first(self._row_value(row, name)) for name, _ in ordering]
+        return key, ordering[0][1]
+
+    def _merge(self, rows, ordering):
+        # Stable sorts from the last key to the first give the full order.
+        for name, descending in reversed(ordering):
+            rows.sort(key=lambda row: _nulls_first(self._row_value(row, name)), reverse=descending)
+        return rows
+
+    def _fetch_all(self):
+        aliases = self._target_shards() if self._result_cache is None else None
+        if aliases is None:
+            return super()._fetch_all()
+        ordering = self._merge_ordering()
+        low, high = self.query.low_mark, self.query.high_mark
+        rows = []
+        for alias in aliases:
+            clone = self.using(alias)
+            if low or high is not None:
+                # Every shard may hold the first rows of the merged result.
+                clone.query.clear_limits()
+                clone.query.set_limits(0, high)
+            rows.extend(clone)
+        self._result_cache = self._merge(rows, ordering)[low:high]
+        self._prefetch_done = True
+
+    def iterator(self, chunk_size=None):
+        aliases = self._target_shards()
+        if aliases is None:
+            return super().iterator(chunk_size=chunk_size)
+        key, descending = self._sort_key(self._merge_ordering())
+        iterators = [self.using(alias).iterator(chunk_size=chunk_size) for alias in aliases]
+        if key is None:
+            return itertools.chain.from_iterable(iterators)
+        return heapq.merge(*iterators, key=key, reverse=descending)
+
+    def count(self):
+        aliases = self._target_shards() if self._result_cache is None else None
+        if aliases is None:
+            return super().count()
+        if self.query.is_sliced:
+            return len(self)
+        return sum(self.using(alias).count() for alias in aliases)
+
+    def exists(self):
+        aliases = self._target_shards() if self._result_cache is None else None
+        if aliases is None:
+            return super().exists()
+        return any(self.using(alias).exists() for alias in aliases)
+
+    def get(self, *args, **kwargs):
+        clone = self.filter(*args, **kwargs) if args or kwargs else self._chain()
+        aliases = clone._target_shards()
+        if aliases is None:
+            return super(ShardedQuerySet, clone).get()
+        pks = _where_values(clone.query.where, _is_pk_column)
+        if pks is not None and len(pks) == 1:
+            aliases = [alias for alias in _home_shards(next(iter(pks))) if alias in aliases]
+        for alias in aliases:
+            try:
+                return clone.using(alias).get()
+            except self.model.DoesNotExist:
+                pass
+        raise self.model.DoesNotExist(f'{self.model._meta.object_name} matching query does not exist.')
+
+    def aggregate(self, *args, **kwargs):
+        aliases = self._target_shards()
+        if aliases is None:
+            return super().aggregate(*args, **kwargs)
+        expressions = {**{arg.default_alias: arg for arg in args}, **kwargs}
+        unsupported = [
+            name for name, expression in expressions.items()
+            if getattr(expression, 'name', None) not in COMBINE_AGGREGATES
+        ]
+        if unsupported:
+            raise NotSupportedError(f'Cannot combine {", ".join(unsupported)} across shards.')
+        results = [self.using(alias).aggregate(**expressions) for alias in aliases]
+        return {
+            name: COMBINE_AGGREGATES[expression.name]([result[name] for result in results])
+            for name, expression in expressions.items()
+        }
+
+    def update(self, **kwargs):
+        aliases = self._target_shards()
+        if aliases is None:
+            return super().update(**kwargs)
+        return sum(self.using(alias).update(**kwargs) for alias in aliases)
+
+    def delete(self):
+        aliases = self._target_shards()
+        if aliases is None:
+            return super().delete()
+        total, counts = 0, Counter()
+        for alias in aliases:
+            deleted, per_model = self.using(alias).delete()
+            total += deleted
+            counts.update(per_model)
+        return total, dict(counts)
+
+    def create(self, **kwargs):
+        if self._db is not None or not is_sharded(self.model):
+            return super().create(**kwargs)
+        obj = self.model(**kwargs)
+        # The router places the object by its team.
+        obj.save(force_insert=True)
+        return obj
+
+    def bulk_create(self, objs, *args, **kwargs):
+        if self._db is not None or not is_sharded(self.model):
+            return super().bulk_create(objs, *args, **kwargs)
+        objs = list(objs)
+        groups = defaultdict(list)
+        for obj in objs:
+            groups[router.db_for_write(self.model, instance=obj)].append(obj)
+        for alias, group in groups.items():
+            self.using(alias).bulk_create(group, *args, **kwargs)
+        return objs
+
+
+ShardedManager = models.Manager.from_queryset(ShardedQuerySet)
+
+
+class ShardRouter:
+    """
+    With settings.DATABASE_SHARDS, teams and their memberships, projects,
+    tasks, comments, attachments, blobs and uploads live on the shard of
+    the team. Objects are written to the shard of their team; related
+    objects are read from the shard of the object they belong to. Users and
+    profiles are written to 'default' and mirrored to every shard.
+    """
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is None or not settings.DATABASE_SHARDS:
+            return None
+        if instance._state.db in settings.DATABASE_SHARDS and (is_sharded(model) or _is_mirrored(model)):
+            return instance._state.db
+        return None
+
+    def db_for_write(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is None or not is_sharded(model):
+            return None
+        if not isinstance(instance, model):
+            # Hint from a related object, e.g. the team of a membership.
+            return instance._state.db if instance._state.db in settings.DATABASE_SHARDS else None
+        return shard_for_instance(instance)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        shards = settings.DATABASE_SHARDS
+        if not {obj1._state.db, obj2._state.db} & set(shards):
+            return None
+        if obj1._state.db == obj2._state.db or obj1._state.adding or obj2._state.adding:
+            return True
+        return _is_mirrored(type(obj1)) or _is_mirrored(type(obj2))
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The team directory is global.
+        if db in settings.DATABASE_SHARDS and app_label == 'accounts' and model_name in (
+            'teamshard', 'sharddirectory'
+        ):
+            return False
+        return None
+
+
+def reserve_id_ranges(using):
+    """
+    Move the id sequences of a shard to its range, and those of the
+    directory past the teams of an unsharded 'default'. SQLite only; other
+    databases need the same done with their sequences.
+    """
+    from .models import TeamShard
+
+    shards = settings.DATABASE_SHARDS
+    connection = connections[using]
+    if connection.vendor != 'sqlite' or not shards:
+        return
+    if using in shards:
+        floor = (shards.index(using) + 1) * SHARD_ID_STRIDE
+        tables = {apps.get_model(label)._meta.db_table: floor for label in RANGED_MODELS}
+    elif using == DEFAULT_DB_ALIAS:
+        from .models import Team
+
+        floor = Team._base_manager.using(using).aggregate(last=Max('pk'))['last'] or 0
+        tables = {TeamShard._meta.db_table: floor}
+    else:
+        return
+    with connection.cursor() as cursor:
+        for table, floor in tables.items():
+            cursor.execute(
+                'INSERT INTO sqlite_sequence (name, seq) SELECT %s, 0 '
+                'WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = %s)',
+                [table, table],
+            )
+            cursor.execute('UPDATE sqlite_sequence SET seq = %s WHERE name = %s AND seq < %s', [floor, table, floor])
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def mirror_users(user_ids=None, databases=None):
+    """Copy users and their profiles from 'default' to the shards, all of them or ``user_ids``."""
+    from .models import Profile, User
+
+    databases = settings.DATABASE_SHARDS if databases is None else databases
+    if not databases:
+        return
+    for model, lookup in ((User, 'pk__in'), (Profile, 'user_id__in')):
+        queryset = model._base_manager.using(DEFAULT_DB_ALIAS).order_by('pk')
+        if user_ids is not None:
+            queryset = queryset.filter(**{lookup: user_ids})
+        fields = [field.name for field in model._meta.concrete_fields if not field.primary_key]
+        for batch in _batches(queryset.iterator(chunk_size=MIRROR_BATCH_SIZE), MIRROR_BATCH_SIZE):
+            for alias in databases:
+                model._base_manager.using(alias).bulk_create(
+                    batch, update_conflicts=True, unique_fields=['id'],
+                    update_fields=[name for name in fields if name != 'created_at'],
+                )
+
+
+def delete_mirrored_users(user_ids):
+    from .models import User
+
+    for alias in settings.DATABASE_SHARDS:
+        # Cascades to their teams and tasks there, with the usual signals.
+        User._base_manager.using(alias).filter(pk__in=user_ids).delete()
+
+
+def _team_querysets(team_id, source):
+    from .models import Attachment, Comment, Project, Task, Team, UploadSession
+
+    lookups = [
+        (Team, {'pk': team_id}),
+        (Team.members.through, {'team_id': team_id}),
+        (Project, {'team_id': team_id}),
+        (Task, {'project__team_id': team_id}),
+        (Comment, {'task__project__team_id': team_id}),
+        (Attachment, {'task__project__team_id': team_id}),
+        (UploadSession, {'task__project__team_id': team_id}),
+    ]
+    return {model: model._base_manager.using(source).filter(**lookup).order_by('pk') for model, lookup in lookups}
+
+
+def _copy_rows(queryset, target, prepare=None):
+    """Copy rows in batches of MOVE_BATCH_SIZE and return their primary keys."""
+    pks = []
+    for batch in _batches(queryset.iterator(chunk_size=MOVE_BATCH_SIZE), MOVE_BATCH_SIZE):
+        pks.extend(row.pk for row in batch)
+        for row in batch:
+            if prepare is not None:
+                prepare(row)
+        queryset.model._base_manager.using(target).bulk_create(batch)
+    return pks
+
+
+def _delete_rows(cursor, model, pks):
+    for batch in _batches(pks, MOVE_BATCH_SIZE):
+        cursor.execute(
+            f'DELETE FROM {model._meta.db_table} WHERE {model._meta.pk.column} IN ({", ".join(["%s"] * len(batch))})',
+            [model._meta.pk.get_db_prep_value(pk, cursor.db) for pk in batch],
+        )
+
+
+def move_team(team_id, target, source=None):
+    """
+    Copy a team with everything in it to the ``target`` shard, point the
+    directory at it and delete it from ``source`` (default: its shard; use
+    'default' to move in a team from before sharding). Ids stay the same.
+
+    The copy and the delete are separate transactions, so writes to the team
+    during a move can be lost: move teams while nobody works in them. Rows
+    are copied in batches of MOVE_BATCH_SIZE, keeping only their ids for
+    the delete. Returns a Counter of the rows moved.
+    """
+    from .imports import keep_timestamps
+    from .models import Attachment, Blob, Comment, Project, Task, Team, TeamShard, UploadSession
+
+    shards = settings.DATABASE_SHARDS
+    if target not in shards:
+        raise ShardingError(f'{target} is not a shard; DATABASE_SHARDS is {", ".join(shards) or "empty"}.')
+    source = source or shard_for_team(team_id)
+    if source == DEFAULT_DB_ALIAS:
+        # Teams created before sharding keep their ids; keep new ones clear of them.
+        reserve_id_ranges(DEFAULT_DB_ALIAS)
+    if source == target:
+        raise ShardingError(f'Team {team_id} is already in {target}.')
+    querysets = _team_querysets(team_id, source)
+    if not querysets[Team].exists():
+        raise ShardingError(f'Team {team_id} is not in {source}.')
+
+    user_ids = set()
+    for model, fields in (
+        (Team, ['owner_id']), (Team.members.through, ['user_id']), (Task, ['assigned_to_id', 'created_by_id']),
+        (Comment, ['author_id']), (Attachment, ['uploaded_by_id']), (UploadSession, ['user_id']),
+    ):
+        for field in fields:
+            user_ids.update(querysets[model].order_by().values_list(field, flat=True).distinct())
+    mirror_users(sorted(user_ids - {None}), [target])
+
+    def clear_pk(membership):
+        # Membership ids are not ranged and nothing refers to them.
+        membership.pk = None
+
+    references = Counter(dict(
+        querysets[Attachment].exclude(blob=None).order_by().values_list('blob_id').annotate(count=Count('pk'))
+    ))
+    moved = {}
+    with keep_timestamps(*querysets, Blob), transaction.atomic(using=target):
+        for model in (Team, Team.members.through, Project, Task, Comment):
+            moved[model] = _copy_rows(
+                querysets[model], target, prepare=clear_pk if model is Team.members.through else None
+            )
+        # Blob ids are per shard; content the target already has is shared.
+        blob_ids = {}
+        for blob in Blob.objects.using(source).filter(pk__in=references).iterator(chunk_size=MOVE_BATCH_SIZE):
+            existing = Blob.objects.using(target).filter(sha256=blob.sha256).values_list('pk', flat=True).first()
+            if existing is None:
+                copy = Blob(sha256=blob.sha256, file=blob.file.name, size=blob.size, created_at=blob.created_at)
+                copy.save(using=target)
+                existing = copy.pk
+            Blob.objects.using(target).filter(pk=existing).update(ref_count=F('ref_count') + references[blob.pk])
+            blob_ids[blob.pk] = existing
+
+        def map_blob(attachment):
+            attachment.blob_id = blob_ids.get(attachment.blob_id)
+
+        moved[Attachment] = _copy_rows(querysets[Attachment], target, prepare=map_blob)
+        moved[UploadSession] = _copy_rows(querysets[UploadSession], target)
+
+    # The version bump makes every process look the team up again.
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        TeamShard.objects.using(DEFAULT_DB_ALIAS).update_or_create(pk=team_id, defaults={'shard': target})
+        _bump_directory_version()
+
+    # Raw deletes: to everyone else the team did not change, so no signals,
+    # change log entries or file deletions.
+    with transaction.atomic(using=source), connections[source].cursor() as cursor:
+        for model in (Team.members.through, UploadSession, Attachment, Comment, Task, Project, Team):
+            _delete_rows(cursor, model, moved[model])
+        for blob_id, count in references.items():
+            Blob.objects.using(source).filter(pk=blob_id).update(ref_count=F('ref_count') - count)
+        Blob.objects.using(source).filter(pk__in=references, ref_count__lte=0).delete()
+    moved[Blob] = blob_ids
+    return Counter({
+        model._meta.verbose_name_plural: len(moved[model])
+        for model in (Team, Team.members.through, Project, Task, Comment, Blob, Attachment, UploadSession)
+    })
@@ -0,0 +1,356 @@
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_init, post_migrate, post_save, pre_delete, pre_save
+)
+from django.dispatch import Signal, receiver
+
+from .blobs import release_blob
+from .changes import attachment_data, change, comment_data, project_data, record_changes, task_data
+from .dashboard import invalidate_dashboards, invalidate_team_dashboards
+from .counters import (
+    adjust_project_count, adjust_task_counts, refresh_member_counts, refresh_task_counts
+)
+from .events import publish_project_event
+from .membership import invalidate_user_teams
+from .models import User, Profile, Team, Project, Task, Comment, Attachment
+from .search import install_search_triggers
+from .sharding import delete_mirrored_users, mirror_users, reserve_id_ranges
+from .sqlite import apply_pragmas
+from .thumbnails import delete_thumbnails, generate_avatar_thumbnails
+from .versions import BOARD, MEMBERSHIP, PROJECT_LIST, bump_versions
+
+# Sent after QuerySet.bulk_update() on tasks, which skips post_save.
+tasks_bulk_updated = Signal()
+
+
+@receiver(post_migrate)
+def migrated(sender, using, **kwargs):
+    if sender.name == 'apps.accounts':
+        install_search_triggers(using)
+        reserve_id_ranges(using)
+        if using in settings.DATABASE_SHARDS:
+            # Users that signed up before the shard existed.
+            mirror_users(databases=[using])
+
+
+@receiver(connection_created)
+def database_connected(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        apply_pragmas(connection)
+
+
+def _membership_change(team_id, user_id, action):
+    return change(
+        'membership', user_id, 'created' if action == 'post_add' else 'deleted',
+        team_id=team_id, user_id=user_id, data={'team_id': team_id, 'user_id': user_id},
+    )
+
+
+@receiver(m2m_changed, sender=Team.members.through)
+def team_members_changed(sender, instance, action, reverse, pk_set, using, **kwargs):
+    if action == 'pre_clear':
+        if reverse:
+            instance._cleared_team_ids = set(
+                sender.objects.using(using).filter(user_id=instance.pk).values_list('team_id', flat=True)
+            )
+        else:
+            instance._cleared_member_ids = set(
+                sender.objects.using(using).filter(team_id=instance.pk).values_list('user_id', flat=True)
+            )
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if reverse:
+        invalidate_user_teams([instance.pk], using=using)
+        if action == 'post_clear':
+            team_ids = instance.__dict__.pop('_cleared_team_ids', ())
+        else:
+            team_ids = pk_set or ()
+        refresh_member_counts(team_ids, using=using)
+        bump_versions(MEMBERSHIP, team_ids, using=using)
+        record_changes(
+            (_membership_change(team_id, instance.pk, action) for team_id in team_ids), using=using
+        )
+        # Member counts changed for everyone else in those teams too.
+        invalidate_dashboards([instance.pk], using=using)
+        invalidate_team_dashboards(team_ids, using=using)
+    else:
+        if action == 'post_clear':
+            user_ids = instance.__dict__.pop('_cleared_member_ids', ())
+        else:
+            user_ids = pk_set or ()
+        invalidate_user_teams(user_ids, using=using)
+        refresh_member_counts([instance.pk], using=using)
+        bump_versions(MEMBERSHIP, [instance.pk], using=using)
+        record_changes(
+            (_membership_change(instance.pk, user_id, action) for user_id in user_ids), using=using
+        )
+        invalidate_dashboards(user_ids, using=using)
+        invalidate_team_dashboards([instance.pk], using=using)
+
+
+@receiver(pre_delete, sender=Team)
+def team_pre_delete(sender, instance, using, **kwargs):
+    instance._deleted_member_ids = set(
+        Team.members.through.objects.using(using).filter(team_id=instance.pk).values_list('user_id', flat=True)
+    )
+
+
+@receiver(post_save, sender=Team)
+def team_saved(sender, instance, created, using, **kwargs):
+    # New teams only get members through m2m_changed.
+    if not created:
+        invalidate_team_dashboards([instance.pk], using=using)
+
+
+@receiver(post_delete, sender=Team)
+def team_post_delete(sender, instance, using, **kwargs):
+    member_ids = instance.__dict__.pop('_deleted_member_ids', ())
+    invalidate_user_teams(member_ids, using=using)
+    invalidate_dashboards(member_ids, using=using)
+    # Clearing memberships on delete sends no m2m_changed.
+    record_changes(
+        (_membership_change(instance.pk, user_id, 'post_remove') for user_id in member_ids), using=using
+    )
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Profile)
+def account_saved(sender, instance, using, update_fields=None, **kwargs):
+    # Logins only touch last_login, which the shards do not need.
+    if using != DEFAULT_DB_ALIAS or not settings.DATABASE_SHARDS or update_fields == frozenset(['last_login']):
+        return
+    user_id = instance.pk if sender is User else instance.user_id
+    transaction.on_commit(lambda: mirror_users([user_id]), using=using)
+
+
+@receiver(post_delete, sender=User)
+def account_deleted(sender, instance, using, **kwargs):
+    if using == DEFAULT_DB_ALIAS and settings.DATABASE_SHARDS:
+        user_id = instance.pk
+        transaction.on_commit(lambda: delete_mirrored_users([user_id]), using=using)
+
+
+def _avatar_name(profile):
+    value = profile.__dict__.get('avatar')
+    return getattr(value, 'name', value) or ''
+
+
+@receiver(post_init, sender=Profile)
+def profile_loaded(sender, instance, **kwargs):
+    instance._thumbnailed_avatar = _avatar_name(instance)
+
+
+@receiver(pre_save, sender=Profile)
+def profile_saving(sender, instance, **kwargs):
+    instance._stale_thumbnails = ''
+    if _avatar_name(instance) != instance._thumbnailed_avatar:
+        # Pages fall back to the original until the new set is rendered.
+        instance._stale_thumbnails = instance.avatar_thumbnails
+        instance.avatar_thumbnails = ''
+
+
+@receiver(post_save, sender=Profile)
+def profile_saved(sender, instance, using, **kwargs):
+    name = _avatar_name(instance)
+    if name == instance._thumbnailed_avatar:
+        return
+    instance._thumbnailed_avatar = name
+    stale = instance._stale_thumbnails
+    if stale:
+        storage = instance.avatar.storage
+        transaction.on_commit(lambda: delete_thumbnails(storage, instance.user_id, stale), using=using)
+    if name:
+        generate_avatar_thumbnails.enqueue({'profile_id': instance.pk, 'using': using}, using=using)
+
+
+@receiver(post_init, sender=Project)
+def project_loaded(sender, instance, **kwargs):
+    instance._counted_team_id = instance.__dict__.get('team_id')
+
+
+@receiver(post_save, sender=Project)
+def project_saved(sender, instance, created, using, **kwargs):
+    previous = None if created else instance._counted_team_id
+    if previous != instance.team_id:
+        if previous is not None:
+            adjust_project_count(previous, -1, using=using)
+        adjust_project_count(instance.team_id, 1, using=using)
+        bump_versions(PROJECT_LIST, [previous, instance.team_id], using=using)
+    if not created:
+        # Urgent tasks on dashboards show the project name.
+        invalidate_team_dashboards([previous, instance.team_id], using=using)
+    moved = previous not in (None, instance.team_id)
+    changes = [change('project', instance.pk, 'deleted', team_id=previous)] if moved else []
+    changes.append(change(
+        'project', instance.pk, 'created' if created or moved else 'updated',
+        team_id=instance.team_id, project_id=instance.pk, data=project_data(instance),
+    ))
+    record_changes(changes, using=using)
+    instance._counted_team_id = instance.team_id
+
+
+@receiver(post_delete, sender=Project)
+def project_deleted(sender, instance, using, origin=None, **kwargs):
+    if isinstance(origin, Team):
+        return
+    team_id = instance._counted_team_id or instance.team_id
+    adjust_project_count(team_id, -1, using=using)
+    bump_versions(PROJECT_LIST, [team_id], using=using)
+    invalidate_team_dashboards([team_id], using=using)
+    # Its tasks, comments and attachments go with it on the clients.
+    record_changes([change('project', instance.pk, 'deleted', team_id=team_id, project_id=instance.pk)], using=using)
+
+
+def _task_event_data(task):
+    return {'task': {
+        'id': task.pk,
+        'title': task.title,
+        'status': task.status,
+        'position': task.position,
+        'priority': task.priority,
+        'due_date': task.due_date,
+        'assigned_to_id': task.assigned_to_id,
+    }}
+
+
+@receiver(post_init, sender=Task)
+def task_loaded(sender, instance, **kwargs):
+    instance._counted_as = (instance.__dict__.get('project_id'), instance.__dict__.get('status'))
+    instance._placed_in = (*instance._counted_as, instance.__dict__.get('position'))
+    instance._dashboard_user_id = instance.__dict__.get('assigned_to_id')
+
+
+@receiver(post_save, sender=Task)
+def task_saved(sender, instance, created, using, **kwargs):
+    current = (instance.project_id, instance.status)
+    previous = None if created else instance._counted_as
+    if previous is not None and None in previous:
+        # Loaded with deferred fields, so the old column is unknown.
+        refresh_task_counts({previous[0], current[0]} - {None}, using=using)
+    elif previous != current:
+        deltas = Counter({current: 1})
+        if previous is not None:
+            deltas[previous] -= 1
+        adjust_task_counts(deltas, using=using)
+    if previous is None or previous[0] != current[0]:
+        # The task count shown in project lists changed; a task leaving a
+        # project also leaves no updated_at behind on the old board.
+        bump_versions(BOARD, [previous and previous[0]], using=using)
+        bump_versions(PROJECT_LIST, [instance.project.team_id], using=using)
+    moved = previous is not None and previous[0] not in (None, current[0])
+    changes = []
+    if moved:
+        publish_project_event(previous[0], 'task.deleted', {'task': {'id': instance.pk}}, using=using)
+        changes.append(change(
+            'task', instance.pk, 'deleted', project_id=previous[0],
+            team_id=Project.objects.using(using).filter(pk=previous[0]).values_list('team_id', flat=True).first(),
+        ))
+    action = 'created' if created or moved else 'updated'
+    publish_project_event(instance.project_id, f'task.{action}', _task_event_data(instance), using=using)
+    changes.append(change(
+        'task', instance.pk, action, team_id=instance.project.team_id, project_id=instance.project_id,
+        data=task_data(instance),
+    ))
+    record_changes(changes, using=using)
+    invalidate_dashboards([instance._dashboard_user_id, instance.assigned_to_id], using=using)
+    instance._counted_as = current
+    instance._placed_in = (*current, instance.position)
+    instance._dashboard_user_id = instance.assigned_to_id
+
+
+@receiver(tasks_bulk_updated, sender=Task)
+def tasks_bulk_saved(sender, tasks, fields, using, **kwargs):
+    deltas = Counter()
+    for task in tasks:
+        current = (task.project_id, task.status)
+        if task._counted_as != current:
+            deltas[current] += 1
+            deltas[task._counted_as] -= 1
+        task._counted_as = current
+        task._placed_in = (*current, task.position)
+    adjust_task_counts(deltas, using=using)
+    dashboard_user_ids = set()
+    for task in tasks:
+        dashboard_user_ids.update((task._dashboard_user_id, task.assigned_to_id))
+        task._dashboard_user_id = task.assigned_to_id
+    invalidate_dashboards(dashboard_user_ids, using=using)
+    by_project = defaultdict(list)
+    for task in tasks:
+        by_project[task.project_id].append(_task_event_data(task)['task'])
+    for project_id, changed in by_project.items():
+        publish_project_event(project_id, 'tasks.updated', {'tasks': changed}, using=using)
+    record_changes(
+        (
+            change(
+                'task', task.pk, 'updated', team_id=task.project.team_id, project_id=task.project_id,
+                data=task_data(task),
+            )
+            for task in tasks
+        ),
+        using=using,
+    )
+
+
+@receiver(post_delete, sender=Task)
+def task_deleted(sender, instance, using, origin=None, **kwargs):
+    if isinstance(origin, (Project, Team)):
+        return
+    adjust_task_counts(Counter({instance._counted_as: -1}), using=using)
+    invalidate_dashboards([instance.assigned_to_id], using=using)
+    bump_versions(BOARD, [instance.project_id], using=using)
+    publish_project_event(instance.project_id, 'task.deleted', {'task': {'id': instance.pk}}, using=using)
+    # The project may be going away in the same cascade (e.g. a user delete),
+    # so look its team up instead of touching instance.project.
+    team_id = Project.objects.using(using).filter(pk=instance.project_id).values_list('team_id', flat=True).first()
+    bump_versions(PROJECT_LIST, [team_id], using=using)
+    record_changes(
+        [change('task', instance.pk, 'deleted', team_id=team_id, project_id=instance.project_id)], using=using
+    )
+
+
+@receiver(post_delete, sender=Comment)
+@receiver(post_delete, sender=Attachment)
+def task_content_deleted(sender, instance, using, origin=None, **kwargs):
+    # Deleted rows leave no updated_at behind, so the board validators
+    # need an explicit version bump.
+    if isinstance(origin, (Task, Project, Team)):
+        return
+    projects = list(
+        Task.objects.using(using).filter(pk=instance.task_id).values_list('project_id', 'project__team_id')
+    )
+    bump_versions(BOARD, [project_id for project_id, _ in projects], using=using)
+    name = sender._meta.model_name
+    data = {'id': instance.pk, 'task_id': instance.task_id}
+    for project_id, team_id in projects:
+        publish_project_event(project_id, f'{name}.deleted', {name: data}, using=using)
+        record_changes(
+            [change(name, instance.pk, 'deleted', team_id=team_id, project_id=project_id, data=data)], using=using
+        )
+
+
+@receiver(post_delete, sender=Attachment)
+def attachment_deleted(sender, instance, using, **kwargs):
+    # Runs for cascades too: the last attachment of a blob removes its file.
+    if instance.blob_id:
+        release_blob(instance.blob_id, using=using)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_save, sender=Attachment)
+def task_content_saved(sender, instance, created, using, **kwargs):
+    name = sender._meta.model_name
+    action = 'created' if created else 'updated'
+    project = instance.task.project
+    publish_project_event(
+        project.pk, f'{name}.{action}', {name: {'id': instance.pk, 'task_id': instance.task_id}}, using=using
+    )
+    data = comment_data(instance) if sender is Comment else attachment_data(instance)
+    record_changes(
+        [change(name, instance.pk, action, team_id=project.team_id, project_id=project.pk, data=data)], using=using
+    )
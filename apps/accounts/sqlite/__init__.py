@@ -0,0 +1,26 @@
+"""
+SQLite backend for a web server with concurrent writers.
+
+ENGINE 'apps.accounts.sqlite' is Django's sqlite3 backend plus the
+OPTIONS['transaction_mode'] of Django 5.1. The pragmas in SQLITE_PRAGMAS are
+set on every new SQLite connection by a connection_created receiver.
+"""
+from django.conf import settings
+
+
+def apply_pragmas(connection):
+    # Run on the raw connection so that the pragmas stay out of the query
+    # log and the query budgets.
+    for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
+
+
+def copy_database(source, target):
+    """
+    Copy the database of connection ``source`` into that of ``target`` with
+    SQLite's online backup, which gives a consistent snapshot while the
+    source is being written and lets readers of the target carry on.
+    """
+    source.ensure_connection()
+    target.ensure_connection()
+    source.connection.backup(target.connection)
@@ -0,0 +1,30 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = ('DEFERRED', 'EXCLUSIVE', 'IMMEDIATE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def __init__(self, settings_dict, *args, **kwargs):
+        super().__init__(settings_dict, *args, **kwargs)
+        mode = settings_dict['OPTIONS'].get('transaction_mode')
+        if mode is not None and mode.upper() not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f'settings.DATABASES[{self.alias!r}]["OPTIONS"]["transaction_mode"] must be one of '
+                f'{", ".join(TRANSACTION_MODES)}.'
+            )
+        self.transaction_mode = mode.upper() if mode else None
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('transaction_mode', None)
+        return params
+
+    def _start_transaction_under_autocommit(self):
+        # A deferred transaction that reads and then writes cannot wait for
+        # another writer: SQLite fails it with "database is locked" at once,
+        # busy_timeout or not. IMMEDIATE takes the write lock at BEGIN, where
+        # waiting is possible.
+        if self.transaction_mode is None:
+            return super()._start_transaction_under_autocommit()
+        self.cursor().execute(f'BEGIN {self.transaction_mode}')
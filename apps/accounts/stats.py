@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.utils import timezone
+
+from .counters import TASK_COUNT_FIELDS
+from .models import Project, Task
+
+PROJECT_STATS_CACHE_TIMEOUT = getattr(settings, 'PROJECT_STATS_CACHE_TIMEOUT', 24 * 60 * 60)
+
+
+def _finalize(stats):
+    total_tasks = sum(stats['by_status'].values())
+    completed_tasks = stats['by_status']['done']
+    stats['total_tasks'] = total_tasks
+    stats['completed_tasks'] = completed_tasks
+    stats['completion_rate'] = (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0
+    return stats
+
+
+def _stats_key(row, today):
+    # Task saves move the latest updated_at and deletions or moves out of
+    # the project bump board_changed_at, so any change to the project's
+    # tasks makes a new key in every process. Overdue counts also change
+    # at midnight.
+    tasks_modified = row['tasks_modified'].timestamp() if row['tasks_modified'] else None
+    return (
+        f'project-stats:{row["pk"]}:{row["board_changed_at"].timestamp()}:{tasks_modified}:{today.isoformat()}'
+    )
+
+
+def get_project_stats(project_ids, today=None):
+    # Status counts are the stored counters, read with the versions; only
+    # the overdue counts of projects with no cached entry are counted.
+    today = today or timezone.localdate()
+    latest = Task.objects.filter(project_id=OuterRef('pk')).order_by().values('project_id').annotate(
+        latest=Max('updated_at')
+    ).values('latest')
+    rows = list(Project.objects.filter(pk__in=project_ids).annotate(tasks_modified=Subquery(latest)).values(
+        'pk', 'board_changed_at', 'tasks_modified', *TASK_COUNT_FIELDS.values()
+    ))
+    keys = {row['pk']: _stats_key(row, today) for row in rows}
+    cached = cache.get_many(keys.values())
+    overdue = {pk: cached[key] for pk, key in keys.items() if key in cached}
+    missing = [pk for pk in keys if pk not in overdue]
+    if missing:
+        counted = dict.fromkeys(missing, 0)
+        counted.update(
+            Task.objects.filter(project_id__in=missing, due_date__lt=today).exclude(status='done').order_by()
+            .values('project_id').annotate(total=Count('pk')).values_list('project_id', 'total')
+        )
+        cache.set_many({keys[pk]: count for pk, count in counted.items()}, PROJECT_STATS_CACHE_TIMEOUT)
+        overdue.update(counted)
+    stats = {
+        row['pk']: _finalize({
+            'project_id': row['pk'],
+            'by_status': {status: row[field] for status, field in TASK_COUNT_FIELDS.items()},
+            'overdue_tasks': overdue[row['pk']],
+        })
+        for row in rows
+    }
+    return [stats[project_id] for project_id in project_ids if project_id in stats]
@@ -0,0 +1,38 @@
+from django import template
+from django.urls import reverse
+from django.utils.dateformat import format as format_date
+from django.utils.html import format_html
+
+from ..thumbnails import AVATAR_SIZES
+
+register = template.Library()
+
+
+@register.simple_tag
+def avatar(user, size='small', css_class=None):
+    """Render a user's avatar at one of AVATAR_SIZES.
+
+    Uses the WebP thumbnail with a JPEG fallback once they are generated,
+    and the original upload until then.
+    """
+    if size not in AVATAR_SIZES:
+        raise template.TemplateSyntaxError(f'Unknown avatar size {size!r}')
+    profile = getattr(user, 'profile', None)
+    if profile is None or not profile.avatar:
+        return ''
+    css_class = css_class or f'avatar-{size}'
+
+    if profile.avatar_thumbnails:
+        webp, jpg = (
+            reverse('avatar_thumbnail', args=[user.pk, f'{size}.{extension}']) + f'?v={profile.avatar_thumbnails}'
+            for extension in ('webp', 'jpg')
+        )
+        return format_html(
+            '<picture><source type="image/webp" srcset="{}">'
+            '<img src="{}" class="{}" alt="{}" loading="lazy"></picture>',
+            webp, jpg, css_class, user.username,
+        )
+    return format_html(
+        '<img src="{}?v={}" class="{}" alt="{}" loading="lazy">',
+        reverse('avatar', args=[user.pk]), format_date(profile.updated_at, 'U'), css_class, user.username,
+    )
@@ -0,0 +1,37 @@
+from django import template
+
+from ..fragments import get_fragment
+
+register = template.Library()
+
+
+class FragmentNode(template.Node):
+    def __init__(self, nodelist, name, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        name = self.name.resolve(context)
+        vary_on = [expression.resolve(context) for expression in self.vary_on]
+        return get_fragment(name, vary_on, lambda: self.nodelist.render(context))
+
+
+@register.tag
+def fragment(parser, token):
+    """
+    Cache the enclosed markup under a key built from the given values::
+
+        {% fragment 'task-card' task.pk task.updated_at %}...{% endfragment %}
+
+    Pass every value the markup depends on; there is no expiry-based
+    invalidation, a new value simply makes a new key.
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes a name and at least one value to vary on.")
+    nodelist = parser.parse(('endfragment',))
+    parser.delete_first_token()
+    return FragmentNode(
+        nodelist, parser.compile_filter(bits[1]), [parser.compile_filter(bit) for bit in bits[2:]]
+    )
@@ -0,0 +1,23 @@
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+
+from .middleware import get_query_budget
+
+
+class QueryBudgetTestMixin:
+    def assertWithinQueryBudget(self, url, method='get', data=None, using='default', **extra):
+        path = url.split('?', 1)[0]
+        budget = get_query_budget(resolve(path).func)
+        self.assertIsNotNone(budget, f'No query budget declared for {path}')
+
+        with CaptureQueriesContext(connections[using]) as context:
+            response = getattr(self.client, method)(url, data, **extra)
+
+        executed = len(context.captured_queries)
+        if executed > budget:
+            queries = '\n'.join(
+                f'{i}. {query["sql"]}' for i, query in enumerate(context.captured_queries, start=1)
+            )
+            self.fail(f'{path} ran {executed} queries, budget is {budget}:\n{queries}')
+        return response
@@ -1,7 +1,56 @@
-from django.test import TestCase, Client
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from asgiref.sync import sync_to_async
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.template import Context, Template, TemplateSyntaxError
+from django.core.management.base import CommandError
+from django.db import NotSupportedError, OperationalError, connection, connections, transaction
+from django.db.models import F
+from django.db.models.functions import Lower
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from .models import User, Team, Project, Task
+from django.utils import timezone
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework_simplejwt.tokens import AccessToken
+from .models import (
+    User, Profile, Team, Project, Task, Comment, Attachment, Blob, UploadSession, Change, Job, TeamShard
+)
+from .events import InProcessBroker, RedisBroker, event_stream, get_broker, project_channel
 from .forms import TeamForm
+from .fragments import fragment_cache_stats
+from .fractional import key_between, keys_between
+from .jobs import Worker, claim_jobs, job, requeue_stale_jobs
+from .blobs import attach_file, blob_path, complete_upload
+from .bulk import bulk_update_tasks
+from .counters import find_drift
+from .dashboard import get_dashboard_summary
+from .membership import get_team_ids
+from .renderers import FastJSONRenderer
+from .routers import PrimaryReplicaRouter, primary_reads, replica_reads
+from .search import SEARCH_CANDIDATES, search
+from .sharding import SHARD_ID_STRIDE, shard_for_team, team_shards
+from .sqlite.base import DatabaseWrapper
+from .serializers import ProjectSerializer, ProjectReadSerializer, TaskSerializer, TaskReadSerializer
+from .stats import get_project_stats
+from .thumbnails import thumbnail_name
+from .testing import QueryBudgetTestMixin
 
 class TeamAccessTests(TestCase):
     def setUp(self):
@@ -123,4 +172,2453 @@ class TeamFormValidationTests(TestCase):
         form = TeamForm(data={'name': 'Team A', 'add_member': 'nonexistent'}, instance=self.team)
         self.assertFalse(form.is_valid())
         self.assertIn('add_member', form.errors)
-        self.assertIn('nie istnieje', str(form.errors['add_member']))
\ No newline at end of file
+        self.assertIn('nie istnieje', str(form.errors['add_member']))
+
+class QueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(
+                username=f'user{i}',
+                email=f'user{i}@example.com',
+                password='pass123'
+            )
+            for i in range(4)
+        ]
+        for user in self.users:
+            Profile.objects.create(user=user)
+
+        for n in range(3):
+            self.team = Team.objects.create(name=f'Team {n}', owner=self.users[0])
+            self.team.members.add(*self.users[1:])
+            for _ in range(3):
+                self.project = Project.objects.create(name='Project', team=self.team)
+                for i, status in enumerate(['todo', 'in_progress', 'done'] * 2):
+                    self.task = Task.objects.create(
+                        title=f'Task {i}',
+                        project=self.project,
+                        created_by=self.users[0],
+                        assigned_to=self.users[i % 4],
+                        status=status
+                    )
+                    Comment.objects.create(task=self.task, author=self.users[i % 4], content='OK')
+
+        self.client.login(username='user0', password='pass123')
+
+    def test_html_views_within_budget(self):
+        urls = [
+            reverse('dashboard'),
+            reverse('team_list'),
+            reverse('team_create'),
+            reverse('team_detail', kwargs={'pk': self.team.pk}),
+            reverse('project_create', kwargs={'team_id': self.team.pk}),
+            reverse('project_detail', kwargs={'pk': self.project.pk}),
+            reverse('task_create', kwargs={'project_id': self.project.pk}),
+            reverse('task_detail', kwargs={'pk': self.task.pk}),
+            reverse('task_edit', kwargs={'pk': self.task.pk}),
+            reverse('profile'),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.assertWithinQueryBudget(url)
+                self.assertEqual(response.status_code, 200)
+
+    def test_api_views_within_budget(self):
+        self.client.logout()
+        auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.users[1])}'}
+        urls = [
+            '/accounts/api/projects/',
+            f'/accounts/api/projects/{self.project.pk}/',
+            f'/accounts/api/projects/{self.project.pk}/stats/',
+            reverse('my_tasks'),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.assertWithinQueryBudget(url, **auth)
+                self.assertEqual(response.status_code, 200)
+
+    def test_post_within_budget(self):
+        url = reverse('task_detail', kwargs={'pk': self.task.pk})
+        response = self.assertWithinQueryBudget(url, method='post', data={
+            'comment_submit': '1',
+            'content': 'Nowy komentarz',
+        })
+        self.assertEqual(response.status_code, 302)
+
+    def test_response_reports_query_count(self):
+        response = self.client.get(reverse('dashboard'))
+        self.assertGreater(int(response['X-Query-Count']), 0)
+        self.assertIn('X-Query-Time-Ms', response)
+        self.assertEqual(response['X-Query-Budget'], '6')
+
+    def test_team_list_counts_all_members(self):
+        response = self.client.get(reverse('team_list'))
+        self.assertEqual(
+            {team.member_count for team in response.context['teams']},
+            {4}
+        )
+
+
+class ProjectBoardTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='user1',
+            email='user1@example.com',
+            password='pass123'
+        )
+        self.team = Team.objects.create(name='Team A', owner=self.user)
+        self.project = Project.objects.create(name='Project 1', team=self.team)
+        for i in range(5):
+            Task.objects.create(
+                title=f'Todo {i}',
+                project=self.project,
+                created_by=self.user,
+                assigned_to=self.user,
+                status='todo'
+            )
+        Task.objects.create(title='Done', project=self.project, created_by=self.user, status='done')
+        self.client.login(username='user1', password='pass123')
+
+    def get_columns(self, **params):
+        response = self.client.get(
+            reverse('project_detail', kwargs={'pk': self.project.pk}), params
+        )
+        self.assertEqual(response.status_code, 200)
+        return {column['status']: column for column in response.context['columns']}
+
+    def test_columns_follow_status_choices(self):
+        columns = self.get_columns()
+        self.assertEqual(list(columns), [status for status, _ in Task.STATUS_CHOICES])
+        self.assertEqual(columns['todo']['total'], 5)
+        self.assertEqual(
+            [task.title for task in columns['todo']['tasks']],
+            [f'Todo {i}' for i in reversed(range(5))]
+        )
+        self.assertEqual(columns['in_progress']['tasks'], [])
+        self.assertEqual(columns['in_progress']['total'], 0)
+        self.assertEqual(len(columns['done']['tasks']), 1)
+
+    def test_column_limit_and_load_more(self):
+        columns = self.get_columns(todo_limit=2)
+        self.assertEqual(len(columns['todo']['tasks']), 2)
+        self.assertTrue(columns['todo']['has_more'])
+        self.assertIn('todo_limit=52', columns['todo']['load_more_url'])
+        self.assertFalse(columns['done']['has_more'])
+
+
+
+class MembershipCacheTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            username='user1',
+            email='user1@example.com',
+            password='pass123'
+        )
+        self.member = User.objects.create_user(
+            username='user2',
+            email='user2@example.com',
+            password='pass123'
+        )
+        self.team = Team.objects.create(name='Team A', owner=self.owner)
+        self.other_team = Team.objects.create(name='Team B', owner=self.owner)
+
+    def test_lookup_is_cached(self):
+        self.assertEqual(get_team_ids(self.owner), {self.team.pk, self.other_team.pk})
+        with self.assertNumQueries(0):
+            self.assertEqual(get_team_ids(self.owner), {self.team.pk, self.other_team.pk})
+
+    def reloaded(self, user):
+        # As the next request would load it.
+        return User.objects.get(pk=user.pk)
+
+    def test_add_and_remove_invalidate(self):
+        self.assertEqual(get_team_ids(self.member), set())
+        self.team.members.add(self.member)
+        self.assertEqual(get_team_ids(self.reloaded(self.member)), {self.team.pk})
+        self.team.members.remove(self.member)
+        self.assertEqual(get_team_ids(self.reloaded(self.member)), set())
+
+    def test_reverse_add_and_clear_invalidate(self):
+        self.member.teams.add(self.other_team)
+        self.assertEqual(get_team_ids(self.reloaded(self.member)), {self.other_team.pk})
+        self.other_team.members.clear()
+        self.assertEqual(get_team_ids(self.reloaded(self.member)), set())
+        self.assertEqual(get_team_ids(self.reloaded(self.owner)), {self.team.pk})
+
+    def test_team_delete_invalidates(self):
+        self.team.members.add(self.member)
+        self.assertEqual(get_team_ids(self.reloaded(self.member)), {self.team.pk})
+        self.team.delete()
+        self.assertEqual(get_team_ids(self.reloaded(self.member)), set())
+
+    def test_changes_do_not_depend_on_this_process_cache(self):
+        # Other workers keep their own cache: the old entry stays, but the
+        # user row of their next request has a new version.
+        stale = self.reloaded(self.member)
+        self.assertEqual(get_team_ids(stale), set())
+        self.team.members.add(self.member)
+        self.assertEqual(get_team_ids(stale), set())
+        self.assertEqual(get_team_ids(self.reloaded(self.member)), {self.team.pk})
+
+    def test_saving_an_old_copy_keeps_the_version(self):
+        stale = self.reloaded(self.member)
+        self.team.members.add(self.member)
+        stale.first_name = 'Anna'
+        stale.save()
+        self.assertEqual(get_team_ids(self.reloaded(self.member)), {self.team.pk})
+        self.assertEqual(self.reloaded(self.member).first_name, 'Anna')
+
+    def test_removed_member_loses_access(self):
+        self.team.members.add(self.member)
+        self.client.login(username='user2', password='pass123')
+        url = reverse('team_detail', kwargs={'pk': self.team.pk})
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.team.members.remove(self.member)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_anonymous_user_is_redirected_to_login(self):
+        response = self.client.get(reverse('project_create', kwargs={'team_id': self.team.pk}))
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(reverse('login'), response['Location'])
+
+
+class CounterTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            username='user1',
+            email='user1@example.com',
+            password='pass123'
+        )
+        self.member = User.objects.create_user(
+            username='user2',
+            email='user2@example.com',
+            password='pass123'
+        )
+        self.team = Team.objects.create(name='Team A', owner=self.owner)
+        self.project = Project.objects.create(name='Project 1', team=self.team)
+        self.other_project = Project.objects.create(name='Project 2', team=self.team)
+
+    def assertCounts(self, project, todo, in_progress, done):
+        project.refresh_from_db()
+        self.assertEqual(
+            (project.todo_count, project.in_progress_count, project.done_count),
+            (todo, in_progress, done)
+        )
+
+    def test_member_and_project_counts(self):
+        self.team.refresh_from_db()
+        self.assertEqual((self.team.member_count, self.team.project_count), (1, 2))
+        self.team.members.add(self.member)
+        self.other_project.delete()
+        self.team.refresh_from_db()
+        self.assertEqual((self.team.member_count, self.team.project_count), (2, 1))
+        self.member.teams.clear()
+        self.team.refresh_from_db()
+        self.assertEqual(self.team.member_count, 1)
+
+    def test_task_counts_follow_status_and_project(self):
+        task = Task.objects.create(title='Task', project=self.project, created_by=self.owner)
+        Task.objects.create(title='Done', project=self.project, created_by=self.owner, status='done')
+        self.assertCounts(self.project, 1, 0, 1)
+
+        task.status = 'in_progress'
+        task.save()
+        self.assertCounts(self.project, 0, 1, 1)
+
+        task = Task.objects.get(pk=task.pk)
+        task.project = self.other_project
+        task.save()
+        self.assertCounts(self.project, 0, 0, 1)
+        self.assertCounts(self.other_project, 0, 1, 0)
+
+        task.delete()
+        self.assertCounts(self.other_project, 0, 0, 0)
+        self.assertEqual(self.project.task_count, 1)
+
+    def test_deferred_status_is_recounted(self):
+        task = Task.objects.create(title='Task', project=self.project, created_by=self.owner)
+        task = Task.objects.only('title', 'project').get(pk=task.pk)
+        task.status = 'done'
+        task.save()
+        self.assertCounts(self.project, 0, 0, 1)
+
+    def test_team_list_uses_stored_counts(self):
+        self.client.login(username='user1', password='pass123')
+        response = self.client.get(reverse('team_list'))
+        self.assertContains(response, '1 członków | 2 projektów')
+
+    def test_rebuild_counters_repairs_drift(self):
+        Task.objects.create(title='Task', project=self.project, created_by=self.owner)
+        Project.objects.filter(pk=self.project.pk).update(todo_count=7)
+        Team.objects.filter(pk=self.team.pk).update(member_count=0)
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_counters', '--check', stdout=StringIO())
+
+        out = StringIO()
+        call_command('rebuild_counters', stdout=out)
+        self.assertIn('fixed 2 counter(s)', out.getvalue())
+        self.assertCounts(self.project, 1, 0, 0)
+        call_command('rebuild_counters', '--check', stdout=StringIO())
+
+class BulkProjectStatsTests(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='user1',
+            email='user1@example.com',
+            password='pass123'
+        )
+        self.other = User.objects.create_user(
+            username='user2',
+            email='user2@example.com',
+            password='pass123'
+        )
+        self.team = Team.objects.create(name='Team A', owner=self.user)
+        self.project = Project.objects.create(name='Project 1', team=self.team)
+        self.empty_project = Project.objects.create(name='Project 2', team=self.team)
+        self.hidden_project = Project.objects.create(
+            name='Project 3',
+            team=Team.objects.create(name='Team B', owner=self.other)
+        )
+        yesterday = timezone.localdate() - timedelta(days=1)
+        Task.objects.create(title='Late', project=self.project, created_by=self.user, due_date=yesterday)
+        Task.objects.create(title='Doing', project=self.project, created_by=self.user, status='in_progress')
+        Task.objects.create(
+            title='Done', project=self.project, created_by=self.user, status='done', due_date=yesterday
+        )
+        self.url = reverse('project-bulk-stats')
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    def test_stats_for_visible_projects(self):
+        response = self.assertWithinQueryBudget(self.url, **self.auth)
+        stats = {row['project_id']: row for row in response.json()}
+        self.assertEqual(set(stats), {self.project.pk, self.empty_project.pk})
+        self.assertEqual(stats[self.project.pk]['by_status'], {'todo': 1, 'in_progress': 1, 'done': 1})
+        self.assertEqual(stats[self.project.pk]['overdue_tasks'], 1)
+        self.assertEqual(stats[self.project.pk]['total_tasks'], 3)
+        self.assertAlmostEqual(stats[self.project.pk]['completion_rate'], 100 / 3)
+        self.assertEqual(stats[self.empty_project.pk]['total_tasks'], 0)
+
+    def test_ids_are_filtered_by_visibility(self):
+        ids = f'{self.project.pk},{self.hidden_project.pk}'
+        response = self.client.get(self.url, {'ids': ids}, **self.auth)
+        self.assertEqual([row['project_id'] for row in response.json()], [self.project.pk])
+        response = self.client.get(self.url, {'ids': 'abc'}, **self.auth)
+        self.assertEqual(response.status_code, 400)
+
+    def test_stats_follow_task_changes_in_other_processes(self):
+        cache.clear()
+        with self.assertNumQueries(2):
+            get_project_stats([self.project.pk, self.empty_project.pk])
+        # Cached overdue counts leave only the counters and versions to read.
+        with self.assertNumQueries(1):
+            get_project_stats([self.project.pk, self.empty_project.pk])
+        # The change runs in another process, with a cache of its own.
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'project_stats',
+        }}):
+            task = Task.objects.get(title='Doing')
+            task.status = 'done'
+            task.due_date = timezone.localdate() - timedelta(days=1)
+            task.save()
+        stats, = get_project_stats([self.project.pk])
+        self.assertEqual(stats['completed_tasks'], 2)
+        task.status = 'todo'
+        task.save()
+        stats, = get_project_stats([self.project.pk])
+        self.assertEqual(stats['overdue_tasks'], 2)
+        task.delete()
+        stats, = get_project_stats([self.project.pk])
+        self.assertEqual((stats['total_tasks'], stats['overdue_tasks']), (2, 1))
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='user1',
+            email='user1@example.com',
+            password='pass123'
+        )
+        self.team = Team.objects.create(name='Team A', owner=self.user)
+        self.project = Project.objects.create(name='Project 1', team=self.team)
+        for i in range(7):
+            Task.objects.create(
+                title=f'Task {i}',
+                project=self.project,
+                created_by=self.user,
+                assigned_to=self.user,
+                status='done' if i % 2 else 'todo'
+            )
+        # Identical timestamps must still page by id.
+        Task.objects.filter(title__in=['Task 2', 'Task 3', 'Task 4']).update(
+            created_at=Task.objects.get(title='Task 2').created_at
+        )
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    def collect(self, url, params):
+        titles = []
+        response = self.client.get(url, params, **self.auth)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            body = response.json()
+            self.assertLessEqual(len(body['results']), 3)
+            titles += [row.get('title', row.get('name')) for row in body['results']]
+            if not body['next']:
+                return titles
+            response = self.client.get(body['next'], **self.auth)
+
+    def test_pages_cover_every_task_once(self):
+        titles = self.collect(reverse('my_tasks'), {'page_size': 3})
+        expected = list(Task.objects.order_by('-created_at', '-id').values_list('title', flat=True))
+        self.assertEqual(titles, expected)
+
+    def test_status_filter_is_kept_across_pages(self):
+        titles = self.collect(reverse('my_tasks'), {'page_size': 3, 'status': 'todo'})
+        self.assertEqual(sorted(titles), ['Task 0', 'Task 2', 'Task 4', 'Task 6'])
+
+    def test_project_list_is_paginated(self):
+        for i in range(4):
+            Project.objects.create(name=f'Extra {i}', team=self.team)
+        names = self.collect('/accounts/api/projects/', {'page_size': 3})
+        self.assertEqual(len(names), 5)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('my_tasks'), {'cursor': 'nope'}, **self.auth)
+        self.assertEqual(response.status_code, 404)
+
+
+class QueryPlanTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='user1',
+            email='user1@example.com',
+            password='pass123'
+        )
+        self.team = Team.objects.create(name='Team A', owner=self.user)
+        self.project = Project.objects.create(name='Project 1', team=self.team)
+        self.task = Task.objects.create(
+            title='Task 1', project=self.project, created_by=self.user, assigned_to=self.user
+        )
+
+    def test_hot_queries_use_composite_indexes(self):
+        plans = {
+            'task_assignee_due_idx': Task.objects.filter(
+                assigned_to=self.user, status__in=['todo', 'in_progress']
+            ).order_by('due_date')[:10],
+            'task_project_position_idx': Task.objects.filter(
+                project=self.project, status='todo'
+            ).order_by('position', 'id'),
+            'comment_task_created_idx': Comment.objects.filter(task=self.task).order_by('created_at'),
+        }
+        for index, queryset in plans.items():
+            with self.subTest(index=index):
+                plan = queryset.explain()
+                self.assertIn(index, plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+
+
+class ReadSerializerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='user1',
+            email='user1@example.com',
+            password='pass123'
+        )
+        self.team = Team.objects.create(name='Team A', owner=self.user)
+        self.project = Project.objects.create(name='Project 1', team=self.team)
+        Task.objects.create(
+            title='Zadanie   ąę',
+            project=self.project,
+            created_by=self.user,
+            assigned_to=self.user,
+            due_date=timezone.localdate(),
+            status='in_progress'
+        )
+        Task.objects.create(title='Unassigned', project=self.project, created_by=self.user)
+
+    def test_task_output_matches_model_serializer(self):
+        tasks = Task.objects.select_related('project', 'assigned_to').order_by('pk')
+        expected = TaskSerializer(tasks, many=True).data
+        actual = TaskReadSerializer(TaskReadSerializer.values(tasks)).data
+        self.assertEqual(actual, expected)
+        self.assertNotIn('assigned_to_id', actual[1])
+
+    def test_project_output_matches_model_serializer(self):
+        projects = Project.objects.select_related('team')
+        expected = ProjectSerializer(projects, many=True).data
+        actual = ProjectReadSerializer(ProjectReadSerializer.values(projects)).data
+        self.assertEqual(actual, expected)
+        self.assertEqual(actual[0]['task_count'], 2)
+
+    def test_fast_renderer_matches_json_renderer(self):
+        tasks = Task.objects.select_related('project', 'assigned_to').order_by('pk')
+        data = {'next': None, 'results': TaskSerializer(tasks, many=True).data, 'rate': 100 / 3}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        # Rows that skip the serializer keep their datetimes and Decimals.
+        for data in [{'results': list(tasks.values('id', 'created_at', 'due_date'))}, {'total': Decimal('1.50')}]:
+            self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        for value in [float('nan'), float('-inf')]:
+            with self.assertRaises(ValueError):
+                JSONRenderer().render({'results': [{'rate': value}]})
+            with self.assertRaises(ValueError):
+                FastJSONRenderer().render({'results': [{'rate': value}]})
+
+class ConditionalResponseTests(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='user1',
+            email='user1@example.com',
+            password='pass123'
+        )
+        self.other = User.objects.create_user(
+            username='user2',
+            email='user2@example.com',
+            password='pass123'
+        )
+        self.team = Team.objects.create(name='Team A', owner=self.user)
+        self.project = Project.objects.create(name='Project 1', team=self.team)
+        self.task = Task.objects.create(title='Task', project=self.project, created_by=self.user)
+        self.comment = Comment.objects.create(task=self.task, author=self.user, content='OK')
+        self.client.login(username='user1', password='pass123')
+        self.board_url = reverse('project_detail', kwargs={'pk': self.project.pk})
+
+    def assertNotModified(self, url, etag, **extra):
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag, **extra)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+        return response
+
+    def assertModified(self, url, etag, **extra):
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag, **extra)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        return response['ETag']
+
+    def test_board_not_modified(self):
+        response = self.client.get(self.board_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('Last-Modified', response)
+        etag = response['ETag']
+
+        not_modified = self.assertNotModified(self.board_url, etag)
+        self.assertIsNone(not_modified.context)
+        self.assertLessEqual(int(not_modified['X-Query-Count']), 5)
+
+        response = self.client.get(self.board_url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_board_changes_invalidate_etag(self):
+        etag = self.client.get(self.board_url)['ETag']
+        self.task.status = 'done'
+        self.task.save()
+        etag = self.assertModified(self.board_url, etag)
+
+        self.comment.delete()
+        etag = self.assertModified(self.board_url, etag)
+
+        self.team.members.add(self.other)
+        etag = self.assertModified(self.board_url, etag)
+
+        Task.objects.create(title='Other', project=Project.objects.create(name='P2', team=self.team),
+                            created_by=self.user).delete()
+        self.assertNotModified(self.board_url, etag)
+
+    def test_versions_do_not_depend_on_this_process_cache(self):
+        older = Comment.objects.create(task=self.task, author=self.user, content='Starszy')
+        Comment.objects.filter(pk=older.pk).update(updated_at=self.comment.updated_at - timedelta(days=1))
+        board_etag = self.client.get(self.board_url)['ETag']
+        auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+        list_url = '/accounts/api/projects/'
+        list_etag = self.client.get(list_url, **auth)['ETag']
+        # The deletes run in another process, with a cache of its own. The
+        # older comment moves none of the aggregated columns.
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'conditional',
+        }}):
+            older.delete()
+            Task.objects.create(title='Other', project=self.project, created_by=self.user).delete()
+        self.assertModified(self.board_url, board_etag)
+        self.assertModified(list_url, list_etag, **auth)
+
+    def test_assignee_and_viewer_profiles_invalidate_etag(self):
+        self.team.members.add(self.other)
+        self.task.assigned_to = self.other
+        self.task.save()
+        assignee_profile = Profile.objects.create(user=self.other)
+        viewer_profile = Profile.objects.create(user=self.user)
+        etag = self.client.get(self.board_url)['ETag']
+
+        assignee_profile.bio = 'Nowe zdjęcie'
+        assignee_profile.save()
+        etag = self.assertModified(self.board_url, etag)
+        # As the thumbnail job publishes a new set.
+        Profile.objects.filter(user=self.other).update(avatar_thumbnails='abc123', updated_at=timezone.now())
+        etag = self.assertModified(self.board_url, etag)
+
+        viewer_profile.save()
+        etag = self.assertModified(self.board_url, etag)
+        self.assertNotModified(self.board_url, etag)
+
+    def test_etag_is_per_user(self):
+        self.team.members.add(self.other)
+        etag = self.client.get(self.board_url)['ETag']
+        self.client.login(username='user2', password='pass123')
+        self.assertModified(self.board_url, etag)
+
+    def test_pending_messages_are_rendered(self):
+        etag = self.client.get(self.board_url)['ETag']
+        response = self.client.post(
+            reverse('task_create', kwargs={'project_id': self.project.pk}),
+            {'title': 'Nowe', 'status': 'todo', 'priority': 'medium'}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.client.get(response['Location'])
+        etag = self.assertModified(self.board_url, etag)
+        self.assertNotModified(self.board_url, etag)
+
+    def test_api_not_modified(self):
+        self.client.logout()
+        auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+        list_url = '/accounts/api/projects/'
+        detail_url = f'/accounts/api/projects/{self.project.pk}/'
+        list_etag = self.client.get(list_url, **auth)['ETag']
+        detail_etag = self.client.get(detail_url, **auth)['ETag']
+        self.assertNotModified(list_url, list_etag, **auth)
+        self.assertNotModified(detail_url, detail_etag, **auth)
+
+        Task.objects.create(title='Task 2', project=self.project, created_by=self.user)
+        self.assertModified(list_url, list_etag, **auth)
+        self.assertModified(detail_url, detail_etag, **auth)
+
+class SearchTests(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='user1',
+            email='user1@example.com',
+            password='pass123'
+        )
+        self.other = User.objects.create_user(
+            username='user2',
+            email='user2@example.com',
+            password='pass123'
+        )
+        self.team = Team.objects.create(name='Team A', owner=self.user)
+        self.other_team = Team.objects.create(name='Team B', owner=self.other)
+        self.project = Project.objects.create(name='Project 1', team=self.team)
+        self.other_project = Project.objects.create(name='Project 2', team=self.other_team)
+        self.task = Task.objects.create(
+            title='Migracja bazy danych',
+            description='Przenieść dane <script> na nowy serwer',
+            project=self.project,
+            created_by=self.user
+        )
+        self.comment = Comment.objects.create(
+            task=self.task, author=self.user, content='Serwer zamówiony, czekamy na dostęp'
+        )
+        Task.objects.create(title='Serwer testowy', project=self.other_project, created_by=self.other)
+        self.client.login(username='user1', password='pass123')
+
+    def test_results_are_scoped_to_teams(self):
+        results = search(self.user, 'serwer')
+        self.assertEqual({(r['type'], r['id']) for r in results}, {('task', self.task.pk), ('comment', self.comment.pk)})
+        self.assertEqual(search(self.other, 'migracja'), [])
+
+    def test_prefix_diacritics_and_ranking(self):
+        Task.objects.create(title='Inne', description='wspomina migracje', project=self.project, created_by=self.user)
+        results = search(self.user, 'migrac')
+        self.assertEqual(results[0]['id'], self.task.pk)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(len(search(self.user, 'zamowiony')), 1)
+
+    def test_only_the_newest_candidates_are_ranked(self):
+        Task.objects.bulk_create(
+            Task(title=f'Zadanie {index}', description='kiedyś migracja', project=self.project,
+                 created_by=self.user, position=f'a{index}')
+            for index in range(SEARCH_CANDIDATES - 1)
+        )
+        results = search(self.user, 'migracja', kinds=('task',), limit=5)
+        self.assertEqual(results[0]['id'], self.task.pk)
+        self.assertIn('<mark>', results[0]['snippet'])
+        # One more newer match pushes the best one out of the ranked set.
+        Task.objects.create(title='Ostatnie', description='migracja', project=self.project, created_by=self.user)
+        results = search(self.user, 'migracja', kinds=('task',), limit=5)
+        self.assertNotIn(self.task.pk, [result['id'] for result in results])
+
+    def test_snippet_is_escaped(self):
+        result, = search(self.user, 'dane', kinds=('task',))
+        self.assertIn('<mark>dane</mark>', result['snippet'])
+        self.assertIn('&lt;script&gt;', result['snippet'])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.task.title = 'Aktualizacja systemu'
+        self.task.save()
+        self.assertEqual(search(self.user, 'bazy'), [])
+        self.assertEqual(len(search(self.user, 'aktualizacja')), 1)
+        self.comment.delete()
+        self.assertEqual(search(self.user, 'czekamy'), [])
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(search(self.user, '"serwer AND ( NEAR'), [])
+        self.assertEqual(search(self.user, '*'), [])
+
+    def test_rebuild_command(self):
+        out = StringIO()
+        call_command('rebuild_search_index', '--optimize', stdout=out)
+        self.assertIn('rebuilt', out.getvalue())
+        self.assertEqual(len(search(self.user, 'serwer')), 2)
+
+    def test_views_within_budget(self):
+        response = self.assertWithinQueryBudget(reverse('search') + '?q=serwer')
+        self.assertContains(response, 'Migracja bazy danych')
+        self.assertContains(response, '<mark>serwer</mark>')
+
+        self.client.logout()
+        auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+        response = self.assertWithinQueryBudget(reverse('search_api') + '?q=serwer&type=comment', **auth)
+        self.assertEqual([r['id'] for r in response.json()], [self.comment.pk])
+        response = self.client.get(reverse('search_api') + '?q=serwer&type=project', **auth)
+        self.assertEqual(response.status_code, 400)
+
+class BulkTaskUpdateTests(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='user1',
+            email='user1@example.com',
+            password='pass123'
+        )
+        self.member = User.objects.create_user(
+            username='user2',
+            email='user2@example.com',
+            password='pass123'
+        )
+        self.outsider = User.objects.create_user(
+            username='user3',
+            email='user3@example.com',
+            password='pass123'
+        )
+        self.team = Team.objects.create(name='Team A', owner=self.user)
+        self.team.members.add(self.member)
+        other_team = Team.objects.create(name='Team B', owner=self.outsider)
+        self.projects = [Project.objects.create(name=f'Project {i}', team=self.team) for i in range(2)]
+        self.tasks = [
+            Task.objects.create(title=f'Task {i}', project=self.projects[i % 2], created_by=self.user)
+            for i in range(6)
+        ]
+        self.foreign_task = Task.objects.create(
+            title='Foreign', project=Project.objects.create(name='Other', team=other_team), created_by=self.outsider
+        )
+        self.url = reverse('task_bulk_update')
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    def post(self, changes):
+        return self.client.post(self.url, {'tasks': changes}, content_type='application/json', **self.auth)
+
+    def test_updates_tasks_and_counters(self):
+        get_project_stats([project.pk for project in self.projects])
+        changes = [
+            {'id': task.pk, 'status': 'done', 'assigned_to': self.member.pk, 'priority': 'high'}
+            for task in reversed(self.tasks[:4])
+        ]
+        changes.append({'id': self.tasks[4].pk, 'due_date': '2030-01-01'})
+        response = self.assertWithinQueryBudget(
+            self.url, method='post', data={'tasks': changes}, content_type='application/json', **self.auth
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([task['id'] for task in data], [change['id'] for change in changes])
+        self.assertEqual(data[0]['assigned_to_username'], 'user2')
+        self.assertEqual(data[0]['status'], 'done')
+        self.assertEqual(data[-1]['due_date'], '2030-01-01')
+
+        for project in self.projects:
+            project.refresh_from_db()
+            self.assertEqual((project.todo_count, project.done_count), (1, 2))
+        self.assertEqual(get_project_stats([self.projects[0].pk])[0]['completed_tasks'], 2)
+        task = Task.objects.get(pk=self.tasks[0].pk)
+        self.assertEqual((task.status, task.priority, task.assigned_to_id), ('done', 'high', self.member.pk))
+        self.assertGreater(task.updated_at, self.tasks[0].updated_at)
+
+        response = self.post([{'id': self.tasks[0].pk, 'assigned_to': None}])
+        self.assertNotIn('assigned_to_id', response.json()[0])
+
+    def test_inaccessible_tasks_abort_the_whole_batch(self):
+        response = self.post([
+            {'id': self.tasks[0].pk, 'status': 'done'},
+            {'id': self.foreign_task.pk, 'status': 'done'},
+        ])
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(Task.objects.filter(status='done').count(), 0)
+
+    def test_assignee_must_be_team_member(self):
+        response = self.post([
+            {'id': self.tasks[0].pk, 'status': 'done'},
+            {'id': self.tasks[1].pk, 'assigned_to': self.outsider.pk},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(self.tasks[1].pk), response.json()['tasks'])
+        self.assertEqual(Task.objects.filter(status='done').count(), 0)
+
+    def test_invalid_payloads(self):
+        for changes in (
+            [],
+            [{'id': self.tasks[0].pk}],
+            [{'id': self.tasks[0].pk, 'status': 'done'}, {'id': self.tasks[0].pk, 'status': 'todo'}],
+            [{'id': self.tasks[0].pk, 'status': 'archived'}],
+        ):
+            with self.subTest(changes=changes):
+                self.assertEqual(self.post(changes).status_code, 400)
+
+
+class FractionalIndexTests(TestCase):
+    def test_keys_between_any_neighbours(self):
+        keys = [key_between(None, None)]
+        for i in range(500):
+            index = (i * 7919) % (len(keys) + 1)
+            lower = keys[index - 1] if index > 0 else None
+            upper = keys[index] if index < len(keys) else None
+            key = key_between(lower, upper)
+            keys.insert(index, key)
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(len(set(keys)), len(keys))
+
+    def test_keys_stay_short_at_the_ends(self):
+        key = None
+        for _ in range(1000):
+            key = key_between(None, key)
+        self.assertLessEqual(len(key), 4)
+        many = keys_between(None, None, 1000)
+        self.assertEqual(many, sorted(many))
+        self.assertLessEqual(max(map(len, many)), 3)
+
+    def test_invalid_bounds(self):
+        with self.assertRaises(ValueError):
+            key_between('a1', 'a0')
+        with self.assertRaises(ValueError):
+            key_between('a10', None)
+
+
+class TaskPositionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='user1',
+            email='user1@example.com',
+            password='pass123'
+        )
+        self.team = Team.objects.create(name='Team A', owner=self.user)
+        self.project = Project.objects.create(name='Project 1', team=self.team)
+        self.tasks = [
+            Task.objects.create(title=f'Task {i}', project=self.project, created_by=self.user)
+            for i in range(4)
+        ]
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+        self.client.login(username='user1', password='pass123')
+
+    def board(self, status='todo'):
+        response = self.client.get(reverse('project_detail', kwargs={'pk': self.project.pk}))
+        column, = [column for column in response.context['columns'] if column['status'] == status]
+        return [task.title for task in column['tasks']]
+
+    def move(self, task, **data):
+        return self.client.post(
+            reverse('task_move', kwargs={'pk': task.pk}), data, content_type='application/json', **self.auth
+        )
+
+    def test_new_tasks_go_to_the_top(self):
+        self.assertEqual(self.board(), ['Task 3', 'Task 2', 'Task 1', 'Task 0'])
+
+    def test_move_writes_one_row(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.move(self.tasks[3], after=self.tasks[1].pk, before=self.tasks[0].pk)
+        self.assertEqual(response.status_code, 200)
+        updates = [query['sql'] for query in context.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(self.board(), ['Task 2', 'Task 1', 'Task 3', 'Task 0'])
+
+        self.move(self.tasks[0], after=self.tasks[2].pk)
+        self.move(self.tasks[1])
+        self.assertEqual(self.board(), ['Task 1', 'Task 2', 'Task 0', 'Task 3'])
+
+    def test_move_to_another_column(self):
+        response = self.move(self.tasks[2], status='done')
+        self.assertEqual(response.json()['status'], 'done')
+        self.move(self.tasks[0], status='done', before=self.tasks[2].pk)
+        self.assertEqual(self.board('done'), ['Task 0', 'Task 2'])
+        self.project.refresh_from_db()
+        self.assertEqual((self.project.todo_count, self.project.done_count), (2, 2))
+
+    def test_edits_and_bulk_changes_put_cards_on_top_of_the_new_column(self):
+        self.move(self.tasks[3], status='done')
+        response = self.client.post(reverse('task_edit', kwargs={'pk': self.tasks[0].pk}), {
+            'title': 'Task 0', 'description': '', 'priority': 'medium', 'status': 'done',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.board('done'), ['Task 0', 'Task 3'])
+
+        response = self.client.post(reverse('task_bulk_update'), {'tasks': [
+            {'id': self.tasks[1].pk, 'status': 'done'},
+            {'id': self.tasks[2].pk, 'status': 'done'},
+            {'id': self.tasks[3].pk, 'status': 'todo'},
+        ]}, content_type='application/json', **self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.board('done'), ['Task 1', 'Task 2', 'Task 0'])
+        self.assertEqual(self.board(), ['Task 3'])
+        positions = list(Task.objects.filter(status='done').values_list('position', flat=True))
+        self.assertEqual(len(set(positions)), 3)
+
+    def test_neighbours_must_be_in_the_target_column(self):
+        response = self.move(self.tasks[0], status='done', after=self.tasks[1].pk)
+        self.assertEqual(response.status_code, 400)
+        other = Task.objects.create(
+            title='Other', project=Project.objects.create(name='P2', team=self.team), created_by=self.user
+        )
+        self.assertEqual(self.move(self.tasks[0], after=other.pk).status_code, 400)
+        outsider = User.objects.create_user(username='user2', email='user2@example.com', password='pass123')
+        auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(outsider)}'}
+        response = self.client.post(
+            reverse('task_move', kwargs={'pk': self.tasks[0].pk}), {}, content_type='application/json', **auth
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_rebalance_keeps_order(self):
+        # Keep squeezing cards under Task 3 so the gap halves every move.
+        moving, below = self.tasks[0], self.tasks[2]
+        for _ in range(200):
+            self.move(moving, after=self.tasks[3].pk, before=below.pk)
+            moving, below = below, moving
+        order = self.board()
+        self.assertGreater(max(len(task.position) for task in Task.objects.all()), 32)
+        Task.objects.filter(pk=self.tasks[1].pk).update(position='')
+        out = StringIO()
+        call_command('rebalance_task_positions', stdout=out)
+        self.assertIn('Renumbered 1 column(s)', out.getvalue())
+        self.assertEqual(self.board(), ['Task 1'] + [title for title in order if title != 'Task 1'])
+        self.assertLessEqual(max(len(task.position) for task in Task.objects.all()), 2)
+
+    def test_project_tasks_api_uses_board_order(self):
+        self.move(self.tasks[0])
+        self.move(self.tasks[1], status='in_progress')
+        self.client.logout()
+        response = self.client.get(f'/accounts/api/projects/{self.project.pk}/tasks/', **self.auth)
+        self.assertEqual(
+            [(task['status'], task['title']) for task in response.json()['results']],
+            [('todo', 'Task 0'), ('todo', 'Task 3'), ('todo', 'Task 2'), ('in_progress', 'Task 1')]
+        )
+        # The cursor carries the column across pages.
+        pages, url = [], f'/accounts/api/projects/{self.project.pk}/tasks/?page_size=1'
+        while url:
+            data = self.client.get(url, **self.auth).json()
+            pages += [task['title'] for task in data['results']]
+            url = data['next']
+        self.assertEqual(pages, ['Task 0', 'Task 3', 'Task 2', 'Task 1'])
+
+
+class RecordingBroker(InProcessBroker):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.published = []
+
+    def publish(self, channel, message):
+        self.published.append((channel, message['event']))
+        super().publish(channel, message)
+
+
+@override_settings(BOARD_EVENTS_BROKER='apps.accounts.tests.RecordingBroker')
+class BoardEventTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='user1',
+            email='user1@example.com',
+            password='pass123'
+        )
+        self.team = Team.objects.create(name='Team A', owner=self.user)
+        self.project = Project.objects.create(name='Project 1', team=self.team)
+        self.other_project = Project.objects.create(name='Project 2', team=self.team)
+        self.channel = project_channel(self.project.pk)
+        self.client.login(username='user1', password='pass123')
+
+    def test_changes_are_published_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            task = Task.objects.create(title='Task', project=self.project, created_by=self.user)
+        self.assertEqual(get_broker().published, [])
+        for callback in callbacks:
+            callback()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            task.status = 'done'
+            task.save()
+            comment = Comment.objects.create(task=task, author=self.user, content='OK')
+            comment.delete()
+            bulk_update_tasks(self.user, [{'id': task.pk, 'priority': 'high'}])
+            task.project = self.other_project
+            task.save()
+            task.delete()
+        other_channel = project_channel(self.other_project.pk)
+        self.assertEqual(get_broker().published, [
+            (self.channel, 'task.created'),
+            (self.channel, 'task.updated'),
+            (self.channel, 'comment.created'),
+            (self.channel, 'comment.deleted'),
+            (self.channel, 'tasks.updated'),
+            (self.channel, 'task.deleted'),
+            (other_channel, 'task.created'),
+            (other_channel, 'task.deleted'),
+        ])
+
+    def test_broker_accepts_publishes_from_other_threads(self):
+        async def receive():
+            broker = InProcessBroker(queue_size=2)
+            async with broker.subscribe('project:1') as queue:
+                thread = threading.Thread(target=broker.publish, args=('project:1', {'event': 'ping'}))
+                thread.start()
+                first = await asyncio.wait_for(queue.get(), 2)
+                for i in range(5):
+                    broker.publish('project:1', {'event': 'flood'})
+                await asyncio.sleep(0)
+                overflow = [queue.get_nowait() for _ in range(queue.qsize())]
+            return first, overflow, broker._subscribers
+        first, overflow, subscribers = asyncio.run(receive())
+        self.assertEqual(first, {'event': 'ping'})
+        self.assertEqual(overflow[0], None)
+        self.assertEqual(dict(subscribers), {})
+
+    def test_stream_requires_membership(self):
+        url = reverse('project_events', kwargs={'pk': self.project.pk})
+        outsider = User.objects.create_user(username='user2', email='user2@example.com', password='pass123')
+        self.client.force_login(outsider)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.logout()
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    async def test_stream_delivers_events(self):
+        await sync_to_async(self.async_client.force_login)(self.user)
+        response = await self.async_client.get(reverse('project_events', kwargs={'pk': self.project.pk}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertTrue(response.is_async)
+
+        stream = event_stream(self.channel, heartbeat=0.05)
+        self.assertEqual(await stream.__anext__(), 'retry: 3000\n\n')
+        self.assertEqual(await stream.__anext__(), ': ping\n\n')
+        get_broker().publish(self.channel, {'event': 'task.updated', 'task': {'id': 1}})
+        chunk = await asyncio.wait_for(stream.__anext__(), 2)
+        self.assertTrue(chunk.startswith('event: task.updated\ndata: {'))
+        await stream.aclose()
+        self.assertEqual(dict(get_broker()._subscribers), {})
+
+
+class FakeRedisServer:
+    def __init__(self):
+        self.subscribers = {}
+        self.publish_failures = 0
+
+    def drop_subscribers(self):
+        for queue in list(self.subscribers.values()):
+            queue.put_nowait(ConnectionError('Connection reset by peer'))
+
+
+class FakeRedisPubSub:
+    def __init__(self, server):
+        self.server = server
+        self.messages = asyncio.Queue()
+        self.channels = []
+        self.closed = False
+
+    async def subscribe(self, channel):
+        self.channels.append(channel)
+        self.server.subscribers[self] = self.messages
+
+    async def unsubscribe(self):
+        self.channels = []
+        self.server.subscribers.pop(self, None)
+
+    async def listen(self):
+        while True:
+            item = await self.messages.get()
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeRedis:
+    """The parts of the sync and asyncio redis clients the broker uses."""
+
+    def __init__(self, server):
+        self.server = server
+        self.pubsubs = []
+
+    def publish(self, channel, data):
+        if self.server.publish_failures:
+            self.server.publish_failures -= 1
+            raise ConnectionError('Connection reset by peer')
+        for pubsub, queue in list(self.server.subscribers.items()):
+            if channel in pubsub.channels:
+                queue.put_nowait({'type': 'message', 'channel': channel, 'data': data.encode()})
+
+    def pubsub(self):
+        self.pubsubs.append(FakeRedisPubSub(self.server))
+        return self.pubsubs[-1]
+
+    async def close(self):
+        pass
+
+
+class FakeRedisBroker(RedisBroker):
+    def __init__(self, server, **kwargs):
+        self.server = server
+        super().__init__(**kwargs)
+
+    def connect(self):
+        return FakeRedis(self.server)
+
+    def connect_async(self):
+        return FakeRedis(self.server)
+
+
+class RedisBrokerTests(SimpleTestCase):
+    def setUp(self):
+        self.server = FakeRedisServer()
+        # Two workers sharing one Redis.
+        self.first = FakeRedisBroker(self.server)
+        self.second = FakeRedisBroker(self.server)
+
+    def test_events_fan_out_to_every_worker(self):
+        async def receive():
+            async with self.first.subscribe('project:1') as one, self.second.subscribe('project:1') as two:
+                async with self.second.subscribe('project:2') as other:
+                    self.second.publish('project:1', {'event': 'task.updated', 'due_date': timezone.localdate()})
+                    received = [await asyncio.wait_for(queue.get(), 2) for queue in (one, two)]
+                    return received, other.qsize()
+        received, other = asyncio.run(receive())
+        expected = {'event': 'task.updated', 'due_date': timezone.localdate().isoformat()}
+        self.assertEqual(received, [expected, expected])
+        self.assertEqual(other, 0)
+
+    def test_leaving_the_stream_unsubscribes(self):
+        async def receive():
+            async with self.first.subscribe('project:1') as queue:
+                self.assertEqual(len(self.server.subscribers), 1)
+                self.first.publish('project:1', {'event': 'ping'})
+                await asyncio.wait_for(queue.get(), 2)
+        asyncio.run(receive())
+        self.assertEqual(self.server.subscribers, {})
+
+    def test_publish_retries_on_a_new_connection(self):
+        async def receive():
+            async with self.first.subscribe('project:1') as queue:
+                self.server.publish_failures = 1
+                self.second.publish('project:1', {'event': 'ping'})
+                return await asyncio.wait_for(queue.get(), 2)
+        self.assertEqual(asyncio.run(receive()), {'event': 'ping'})
+
+    def test_lost_subscription_asks_the_client_to_reconnect(self):
+        async def receive():
+            stream = event_stream('project:1', heartbeat=5)
+            await stream.__anext__()
+            self.server.drop_subscribers()
+            chunk = await asyncio.wait_for(stream.__anext__(), 2)
+            with self.assertRaises(StopAsyncIteration):
+                await stream.__anext__()
+            # The browser opens a new stream, which subscribes again.
+            async with self.first.subscribe('project:1') as queue:
+                self.second.publish('project:1', {'event': 'ping'})
+                return chunk, await asyncio.wait_for(queue.get(), 2)
+        with override_settings(BOARD_EVENTS_BROKER='apps.accounts.tests.FakeRedisBroker',
+                               BOARD_EVENTS_BROKER_OPTIONS={'server': self.server}):
+            with self.assertLogs('apps.accounts.events', 'WARNING'):
+                chunk, message = asyncio.run(receive())
+        self.assertEqual(chunk, 'event: resync\ndata: {}\n\n')
+        self.assertEqual(message, {'event': 'ping'})
+        self.assertEqual(self.server.subscribers, {})
+
+
+class AttachmentUploadTests(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        override = override_settings(
+            MEDIA_ROOT=directory, UPLOAD_SESSION_DIR=os.path.join(directory, 'uploads'), ATTACHMENT_MAX_SIZE=1024
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.user = User.objects.create_user(
+            username='user1',
+            email='user1@example.com',
+            password='pass123'
+        )
+        self.member = User.objects.create_user(
+            username='user2',
+            email='user2@example.com',
+            password='pass123'
+        )
+        self.team = Team.objects.create(name='Team A', owner=self.user)
+        self.team.members.add(self.member)
+        self.project = Project.objects.create(name='Project 1', team=self.team)
+        self.task = Task.objects.create(title='Task', project=self.project, created_by=self.user)
+        self.content = b'%PDF-1.4 specyfikacja ' * 20
+        self.sha256 = hashlib.sha256(self.content).hexdigest()
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    def start(self, **data):
+        data = {'filename': 'spec.pdf', 'size': len(self.content), **data}
+        return self.client.post(
+            reverse('upload_create', kwargs={'pk': self.task.pk}), data, content_type='application/json', **self.auth
+        )
+
+    def send(self, url, chunk, offset):
+        return self.client.patch(
+            url, chunk, content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET=str(offset), **self.auth
+        )
+
+    def test_chunked_upload_resumes_and_is_stored_once(self):
+        response = self.assertWithinQueryBudget(
+            reverse('upload_create', kwargs={'pk': self.task.pk}), method='post',
+            data={'filename': 'spec.pdf', 'size': len(self.content)}, content_type='application/json', **self.auth
+        )
+        self.assertEqual(response.status_code, 201)
+        url = response['Location']
+        session = UploadSession.objects.get()
+
+        cache.clear()
+        response = self.assertWithinQueryBudget(
+            url, method='patch', data=self.content[:100], content_type='application/offset+octet-stream',
+            HTTP_UPLOAD_OFFSET='0', **self.auth
+        )
+        self.assertEqual((response.status_code, response['Upload-Offset']), (200, '100'))
+        response = self.send(url, self.content[:100], 0)
+        self.assertEqual((response.status_code, response.json()['offset']), (409, 100))
+        complete_url = reverse('upload_complete', kwargs={'pk': session.pk})
+        self.assertEqual(self.client.post(complete_url, **self.auth).status_code, 409)
+
+        response = self.client.get(url, **self.auth)
+        self.assertEqual(response.json()['offset'], 100)
+        self.assertEqual(self.send(url, self.content[100:], 100).json()['offset'], len(self.content))
+        response = self.assertWithinQueryBudget(complete_url, method='post', **self.auth)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['sha256'], self.sha256)
+        self.assertEqual(response.json()['name'], 'spec.pdf')
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(os.path.exists(session.part_path))
+
+        self.client.force_login(self.member)
+        self.client.post(reverse('task_detail', kwargs={'pk': self.task.pk}), {
+            'attachment_submit': '1', 'file': SimpleUploadedFile('kopia.pdf', self.content),
+        })
+        cache.clear()
+        response = self.assertWithinQueryBudget(
+            reverse('upload_create', kwargs={'pk': self.task.pk}), method='post',
+            data={'filename': 'trzecia.pdf', 'size': len(self.content), 'sha256': self.sha256},
+            content_type='application/json', **self.auth
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['size'], len(self.content))
+
+        blob = Blob.objects.get()
+        self.assertEqual((blob.sha256, blob.ref_count, blob.file.name), (self.sha256, 3, blob_path(self.sha256)))
+        with blob.file.open('rb') as file:
+            self.assertEqual(file.read(), self.content)
+        attachments = Attachment.objects.order_by('id')
+        self.assertEqual([attachment.name for attachment in attachments], ['spec.pdf', 'kopia.pdf', 'trzecia.pdf'])
+        self.assertEqual({attachment.file.name for attachment in attachments}, {blob.file.name})
+        self.assertEqual(os.listdir(os.path.dirname(blob.file.path)), [self.sha256])
+
+    def test_last_attachment_removes_stored_file(self):
+        for name in ('a.pdf', 'b.pdf'):
+            self.client.force_login(self.user)
+            cache.clear()
+            response = self.assertWithinQueryBudget(
+                reverse('task_detail', kwargs={'pk': self.task.pk}), method='post',
+                data={'attachment_submit': '1', 'file': SimpleUploadedFile(name, self.content)}
+            )
+            self.assertEqual(response.status_code, 302)
+        blob = Blob.objects.get()
+        path = blob.file.path
+        with self.captureOnCommitCallbacks(execute=True):
+            Attachment.objects.first().delete()
+        self.assertEqual(Blob.objects.get().ref_count, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.task.delete()
+        self.assertFalse(Blob.objects.exists())
+        self.assertFalse(os.path.exists(path))
+
+    def test_blob_attached_again_while_released_keeps_its_file(self):
+        attachment = attach_file(self.task, self.user, SimpleUploadedFile('a.pdf', self.content))
+        path = attachment.blob.file.path
+
+        def attach_after_read(execute, sql, params, many, context):
+            result = execute(sql, params, many, context)
+            if sql.startswith('SELECT "accounts_blob"."file"'):
+                # Another request attaches the same content right then.
+                Blob.objects.filter(pk=attachment.blob_id).update(ref_count=F('ref_count') + 1)
+            return result
+
+        with self.captureOnCommitCallbacks(execute=True), connection.execute_wrapper(attach_after_read):
+            attachment.delete()
+        self.assertEqual(Blob.objects.get().ref_count, 1)
+        self.assertTrue(os.path.exists(path))
+
+    def test_failed_completion_keeps_nothing_half_done(self):
+        url = self.start()['Location']
+        self.assertEqual(self.send(url, self.content, 0).status_code, 200)
+        session = UploadSession.objects.get()
+
+        def fail_session_delete(execute, sql, params, many, context):
+            if sql.startswith('DELETE FROM "accounts_uploadsession"'):
+                raise OperationalError('database is locked')
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(fail_session_delete), self.assertRaises(OperationalError):
+            complete_upload(session)
+        self.assertFalse(Attachment.objects.exists())
+        self.assertTrue(UploadSession.objects.exists())
+        # The part file is in storage by now; the retry asks for a new upload.
+        response = self.client.post(reverse('upload_complete', kwargs={'pk': session.pk}), **self.auth)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_rejects_invalid_uploads(self):
+        self.assertEqual(self.start(size=2048).status_code, 400)
+        url = self.start(sha256='0' * 64)['Location']
+        self.assertEqual(self.send(url, self.content + b'!', 0).status_code, 400)
+        self.assertEqual(self.send(url, self.content, 0).status_code, 200)
+        session = UploadSession.objects.get()
+        response = self.client.post(reverse('upload_complete', kwargs={'pk': session.pk}), **self.auth)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Attachment.objects.exists())
+
+        other = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.member)}'}
+        self.assertEqual(self.client.get(url, **other).status_code, 404)
+        self.assertEqual(self.client.delete(url, **self.auth).status_code, 204)
+        self.assertFalse(os.path.exists(session.part_path))
+
+    def test_cleanup_removes_stale_uploads_and_orphans(self):
+        self.start()
+        UploadSession.objects.update(updated_at=timezone.now() - timedelta(days=2))
+        path = UploadSession.objects.get().part_path
+        orphan = os.path.join(self.task.attachments.model.file.field.storage.location, 'attachments', 'old.pdf')
+        os.makedirs(os.path.dirname(orphan))
+        with open(orphan, 'wb') as file:
+            file.write(self.content)
+        fresh = os.path.join(os.path.dirname(orphan), 'new.pdf')
+        with open(fresh, 'wb') as file:
+            file.write(self.content)
+        aged = (timezone.now() - timedelta(days=2)).timestamp()
+        os.utime(orphan, (aged, aged))
+
+        out = StringIO()
+        call_command('cleanup_uploads', stdout=out)
+        self.assertIn('Deleted 1 upload(s) and 1 file(s).', out.getvalue())
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(os.path.exists(orphan))
+        # Saved by a request whose row is not committed yet, as far as cleanup knows.
+        self.assertTrue(os.path.exists(fresh))
+
+    def test_a_claimed_offset_is_not_written_twice(self):
+        url = self.start()['Location']
+        session = UploadSession.objects.get()
+        UploadSession.objects.update(writer='other')
+
+        response = self.send(url, self.content[:100], 0)
+        self.assertEqual((response.status_code, response.json()['offset']), (409, 0))
+        self.assertEqual(os.path.getsize(session.part_path), 0)
+
+        # The claim of a writer that died expires.
+        UploadSession.objects.update(updated_at=timezone.now() - timedelta(minutes=1))
+        response = self.send(url, self.content[:100], 0)
+        self.assertEqual((response.status_code, response['Upload-Offset']), (200, '100'))
+        self.assertEqual(UploadSession.objects.get().writer, '')
+
+
+class DownloadTests(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        override = override_settings(MEDIA_ROOT=directory, SENDFILE_BACKEND='')
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.user = User.objects.create_user(
+            username='user1',
+            email='user1@example.com',
+            password='pass123'
+        )
+        self.outsider = User.objects.create_user(
+            username='user2',
+            email='user2@example.com',
+            password='pass123'
+        )
+        self.team = Team.objects.create(name='Team A', owner=self.user)
+        self.project = Project.objects.create(name='Project 1', team=self.team)
+        self.task = Task.objects.create(title='Task', project=self.project, created_by=self.user)
+        self.content = bytes(range(256)) * 4
+        self.attachment = attach_file(self.task, self.user, SimpleUploadedFile('raport.pdf', self.content))
+        self.url = reverse('attachment_download', kwargs={'pk': self.attachment.pk})
+        self.client.login(username='user1', password='pass123')
+
+    def test_streams_file_with_validators(self):
+        response = self.assertWithinQueryBudget(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(response['Content-Length'], str(len(self.content)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['ETag'], f'"{self.attachment.blob.sha256}"')
+        self.assertIn('private', response['Cache-Control'])
+        self.assertTrue(response['Content-Disposition'].startswith('inline;'))
+        self.assertIn('filename="raport.pdf"', response['Content-Disposition'])
+        self.assertEqual(response['Content-Security-Policy'], 'sandbox')
+
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(self.url, {'download': '1'})
+        self.assertTrue(response['Content-Disposition'].startswith('attachment;'))
+
+    def test_active_content_is_always_downloaded(self):
+        for name, content in (('strona.html', b'<script>alert(1)</script>'), ('rysunek.svg', b'<svg/>')):
+            attachment = attach_file(self.task, self.user, SimpleUploadedFile(name, content))
+            url = reverse('attachment_download', kwargs={'pk': attachment.pk})
+            response = self.client.get(url)
+            self.assertTrue(response['Content-Disposition'].startswith('attachment;'))
+            self.assertEqual(response['Content-Security-Policy'], 'sandbox')
+            self.assertEqual(response['X-Content-Type-Options'], 'nosniff')
+            with self.settings(SENDFILE_BACKEND='x-accel-redirect'):
+                response = self.client.get(url)
+            self.assertTrue(response['Content-Disposition'].startswith('attachment;'))
+            self.assertEqual(response['Content-Security-Policy'], 'sandbox')
+
+    def test_range_requests(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.content)}')
+        self.assertEqual(b''.join(response.streaming_content), self.content[10:20])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=1000-')
+        self.assertEqual(b''.join(response.streaming_content), self.content[1000:])
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), self.content[-5:])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=5000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-1,5-6')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        etag = f'"{self.attachment.blob.sha256}"'
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+
+    def test_requires_membership(self):
+        self.client.logout()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response['Location'].startswith(reverse('login')))
+
+        auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+        self.assertEqual(self.client.get(self.url, **auth).status_code, 200)
+        self.client.force_login(self.outsider)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.assertEqual(self.client.post(self.url).status_code, 405)
+
+    def test_sendfile_offload(self):
+        with self.settings(SENDFILE_BACKEND='x-accel-redirect'):
+            response = self.client.get(self.url, HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.attachment.file.name}')
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+
+        with self.settings(SENDFILE_BACKEND='x-sendfile'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Sendfile'], self.attachment.file.path)
+
+    def test_avatars_are_visible_to_teammates_only(self):
+        profile = Profile.objects.create(user=self.outsider)
+        profile.avatar = SimpleUploadedFile('avatar.png', b'\x89PNG avatar')
+        profile.save()
+        url = reverse('avatar', kwargs={'user_id': self.outsider.pk})
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        self.team.members.add(self.outsider)
+        response = self.assertWithinQueryBudget(url, data={'v': '1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(self.client.get(reverse('avatar', kwargs={'user_id': self.user.pk})).status_code, 404)
+
+
+@override_settings(JOB_QUEUE_EAGER=True)
+class AvatarThumbnailTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        override = override_settings(MEDIA_ROOT=directory, SENDFILE_BACKEND='')
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.user = User.objects.create_user(
+            username='user1',
+            email='user1@example.com',
+            password='pass123'
+        )
+        self.profile = Profile.objects.create(user=self.user)
+        self.client.login(username='user1', password='pass123')
+
+    def image(self, size=(1200, 800), mode='RGBA', image_format='PNG'):
+        buffer = io.BytesIO()
+        Image.new(mode, size, (200, 30, 30, 128) if mode == 'RGBA' else (200, 30, 30)).save(buffer, image_format)
+        return SimpleUploadedFile(f'avatar.{image_format.lower()}', buffer.getvalue())
+
+    def upload(self, file):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profile.avatar = file
+            self.profile.save()
+        self.profile.refresh_from_db()
+
+    def render(self, size='small'):
+        return Template("{% load avatar_tags %}{% avatar user size %}").render(
+            Context({'user': User.objects.select_related('profile').get(pk=self.user.pk), 'size': size})
+        )
+
+    def test_thumbnails_are_generated_after_upload(self):
+        self.assertEqual(self.render(), '')
+        self.upload(self.image())
+        key = self.profile.avatar_thumbnails
+        self.assertTrue(key)
+        storage = self.profile.avatar.storage
+        for size, pixels in (('small', 60), ('medium', 100), ('large', 440)):
+            for extension, image_format in (('webp', 'WEBP'), ('jpg', 'JPEG')):
+                with storage.open(thumbnail_name(self.user.pk, key, size, extension)) as file, Image.open(file) as image:
+                    self.assertEqual((image.format, image.size), (image_format, (pixels, pixels)))
+
+        html = self.render('medium')
+        self.assertIn('<source type="image/webp" srcset="/accounts/users/%d/avatar/medium.webp/?v=%s">' % (self.user.pk, key), html)
+        self.assertIn('class="avatar-medium"', html)
+
+        response = self.client.get(reverse('avatar_thumbnail', args=[self.user.pk, 'small.webp']), {'v': key})
+        self.assertEqual((response.status_code, response['Content-Type']), (200, 'image/webp'))
+        self.assertIn('immutable', response['Cache-Control'])
+        for variant in ('huge.webp', 'small.gif'):
+            self.assertEqual(self.client.get(reverse('avatar_thumbnail', args=[self.user.pk, variant])).status_code, 404)
+
+    def test_replacing_avatar_drops_old_thumbnails(self):
+        self.upload(self.image())
+        old_key = self.profile.avatar_thumbnails
+        storage = self.profile.avatar.storage
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.profile.avatar = self.image(size=(50, 300), mode='RGB', image_format='JPEG')
+            self.profile.save()
+        self.assertEqual(Profile.objects.get().avatar_thumbnails, '')
+        self.assertIn('/accounts/users/%d/avatar/?v=' % self.user.pk, self.render())
+        for callback in callbacks:
+            callback()
+
+        self.profile.refresh_from_db()
+        self.assertNotEqual(self.profile.avatar_thumbnails, old_key)
+        self.assertFalse(storage.exists(thumbnail_name(self.user.pk, old_key, 'small', 'webp')))
+        self.assertTrue(storage.exists(thumbnail_name(self.user.pk, self.profile.avatar_thumbnails, 'large', 'jpg')))
+
+    def test_broken_images_keep_the_original(self):
+        with self.assertLogs('apps.accounts.thumbnails', 'WARNING'):
+            self.upload(SimpleUploadedFile('avatar.png', b'not an image'))
+        self.assertEqual(self.profile.avatar_thumbnails, '')
+
+        self.upload(self.image())
+        Profile.objects.update(avatar_thumbnails='')
+        out = StringIO()
+        call_command('generate_avatar_thumbnails', stdout=out)
+        self.assertIn('Generated thumbnails for 1 avatar(s), 0 failed.', out.getvalue())
+
+
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        fragment_cache_stats(reset=True)
+        self.user = User.objects.create_user(
+            username='user1',
+            email='user1@example.com',
+            password='pass123'
+        )
+        self.member = User.objects.create_user(
+            username='user2',
+            email='user2@example.com',
+            password='pass123'
+        )
+        Profile.objects.create(user=self.member)
+        self.team = Team.objects.create(name='Team A', owner=self.user)
+        self.team.members.add(self.member)
+        self.project = Project.objects.create(name='Project 1', team=self.team)
+        self.tasks = [
+            Task.objects.create(title=f'Task {i}', project=self.project, created_by=self.user, assigned_to=self.member)
+            for i in range(3)
+        ]
+        self.url = reverse('project_detail', kwargs={'pk': self.project.pk})
+        self.client.login(username='user1', password='pass123')
+
+    def test_board_cards_are_cached_until_they_change(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Fragment-Cache'], 'hits=0 misses=3')
+        first = response.content
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Fragment-Cache'], 'hits=3 misses=0')
+        self.assertEqual(response.content, first)
+
+        task = self.tasks[0]
+        task.title = 'Renamed'
+        task.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Fragment-Cache'], 'hits=2 misses=1')
+        self.assertContains(response, 'Renamed')
+
+        # Thumbnails are published without touching updated_at.
+        Profile.objects.filter(user=self.member).update(avatar_thumbnails='abc')
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Fragment-Cache'], 'hits=0 misses=3')
+        self.assertEqual(fragment_cache_stats()['task-card'], {'hits': 5, 'misses': 7})
+
+    def test_team_fragments_follow_membership_and_owner(self):
+        dashboard = reverse('dashboard')
+        team_url = reverse('team_detail', kwargs={'pk': self.team.pk})
+        self.client.get(dashboard)
+        self.client.get(team_url)
+        self.assertEqual(self.client.get(dashboard)['X-Fragment-Cache'], 'hits=1 misses=0')
+        self.assertEqual(self.client.get(team_url)['X-Fragment-Cache'], 'hits=2 misses=0')
+
+        self.team.members.remove(self.member)
+        response = self.client.get(dashboard)
+        self.assertEqual(response['X-Fragment-Cache'], 'hits=0 misses=1')
+        self.assertContains(response, '1 członków')
+
+        self.client.force_login(self.member)
+        self.team.members.add(self.member)
+        response = self.client.get(dashboard)
+        self.assertEqual(response['X-Fragment-Cache'], 'hits=0 misses=1')
+        self.assertNotContains(response, 'Właściciel')
+
+    def test_tag_requires_values_to_vary_on(self):
+        with self.assertRaises(TemplateSyntaxError):
+            Template("{% load fragment_tags %}{% fragment 'name' %}x{% endfragment %}")
+
+
+class DashboardCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='user1',
+            email='user1@example.com',
+            password='pass123'
+        )
+        self.other = User.objects.create_user(
+            username='user2',
+            email='user2@example.com',
+            password='pass123'
+        )
+        self.team = Team.objects.create(name='Team A', owner=self.user)
+        self.project = Project.objects.create(name='Project 1', team=self.team)
+        self.task = Task.objects.create(
+            title='Overdue', project=self.project, created_by=self.user, assigned_to=self.user,
+            due_date=timezone.localdate() - timedelta(days=1)
+        )
+        self.client.login(username='user1', password='pass123')
+
+    def summary(self, user):
+        # With the user row as the next request would load it.
+        return get_dashboard_summary(User.objects.get(pk=user.pk))
+
+    def assertCached(self, user, cached=True):
+        user = User.objects.get(pk=user.pk)
+        with CaptureQueriesContext(connection) as context:
+            get_dashboard_summary(user)
+        self.assertEqual(len(context.captured_queries) == 0, cached)
+
+    def test_cached_dashboard_skips_the_database(self):
+        response = self.client.get(reverse('dashboard'))
+        self.assertContains(response, 'Po terminie: 1')
+        self.assertContains(response, 'Project 1')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('dashboard'))
+        # Session, user and the profile for the avatar in the header.
+        self.assertEqual(len(context.captured_queries), 3)
+        self.assertContains(response, '1 członków')
+
+    def test_only_affected_users_are_invalidated(self):
+        self.summary(self.user)
+        self.summary(self.other)
+        Task.objects.create(title='Someone else', project=self.project, created_by=self.user, assigned_to=self.other)
+        self.assertCached(self.user)
+        self.assertCached(self.other, cached=False)
+
+        self.task.status = 'done'
+        self.task.save()
+        self.assertCached(self.user, cached=False)
+        self.assertEqual(self.summary(self.user)['overdue_count'], 0)
+        self.assertCached(self.other)
+
+        bulk_update_tasks(self.user, [{'id': self.task.pk, 'status': 'todo', 'assigned_to': None}])
+        self.assertCached(self.user, cached=False)
+        self.assertEqual(self.summary(self.user)['urgent_tasks'], [])
+
+    def test_membership_and_team_changes_invalidate_members(self):
+        self.summary(self.user)
+        self.team.members.add(self.other)
+        self.assertEqual(self.summary(self.user)['teams'][0]['member_count'], 2)
+        self.assertEqual(len(self.summary(self.other)['teams']), 1)
+
+        self.team.name = 'Team B'
+        self.team.save()
+        self.assertEqual(self.summary(self.other)['teams'][0]['name'], 'Team B')
+        self.project.name = 'Renamed'
+        self.project.save()
+        self.assertEqual(self.summary(self.user)['urgent_tasks'][0]['project_name'], 'Renamed')
+
+        self.other.teams.remove(self.team)
+        self.assertEqual(self.summary(self.other)['teams'], [])
+        self.assertEqual(self.summary(self.user)['teams'][0]['member_count'], 1)
+        self.team.delete()
+        self.assertEqual(self.summary(self.user), {'teams': [], 'urgent_tasks': [], 'overdue_count': 0})
+
+    def test_changes_do_not_depend_on_this_process_cache(self):
+        self.assertEqual(self.summary(self.user)['overdue_count'], 1)
+        # The change runs in another process, with a cache of its own.
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'dashboard',
+        }}):
+            self.task.status = 'done'
+            self.task.save()
+        self.assertEqual(self.summary(self.user)['overdue_count'], 0)
+
+    def test_saving_an_old_copy_keeps_the_version(self):
+        stale = User.objects.get(pk=self.user.pk)
+        self.summary(self.user)
+        self.task.status = 'done'
+        self.task.save()
+        stale.first_name = 'Anna'
+        stale.save()
+        self.assertEqual(self.summary(self.user)['overdue_count'], 0)
+
+
+class ChangeFeedTests(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='user1',
+            email='user1@example.com',
+            password='pass123'
+        )
+        self.other = User.objects.create_user(
+            username='user2',
+            email='user2@example.com',
+            password='pass123'
+        )
+        self.team = Team.objects.create(name='Team A', owner=self.user)
+        self.other_team = Team.objects.create(name='Team B', owner=self.other)
+        self.project = Project.objects.create(name='Project 1', team=self.team)
+        self.other_project = Project.objects.create(name='Project 2', team=self.other_team)
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    def fetch(self, cursor='', **params):
+        response = self.assertWithinQueryBudget(
+            reverse('change_feed'), data={'cursor': cursor, **params}, **self.auth
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def summary(self, feed):
+        return [(change['kind'], change['action'], change['object_id']) for change in feed['changes']]
+
+    def test_returns_visible_changes_after_cursor(self):
+        cursor = self.fetch()['cursor']
+        task = Task.objects.create(title='Task', project=self.project, created_by=self.user)
+        Task.objects.create(title='Hidden', project=self.other_project, created_by=self.other)
+        task.status = 'done'
+        task.save()
+        comment = Comment.objects.create(task=task, author=self.user, content='Hello')
+        comment_id = comment.pk
+        comment.delete()
+        bulk_update_tasks(self.user, [{'id': task.pk, 'priority': 'high'}])
+
+        feed = self.fetch(cursor)
+        self.assertEqual(self.summary(feed), [
+            ('task', 'created', task.pk),
+            ('task', 'updated', task.pk),
+            ('comment', 'created', comment_id),
+            ('comment', 'deleted', comment_id),
+            ('task', 'updated', task.pk),
+        ])
+        self.assertEqual(feed['changes'][-1]['data']['priority'], 'high')
+        self.assertEqual(feed['changes'][3]['data'], {'id': comment_id, 'task_id': task.pk})
+        self.assertFalse(feed['has_more'])
+        self.assertEqual(self.fetch(feed['cursor'])['changes'], [])
+
+        page = self.fetch(cursor, limit=2)
+        self.assertTrue(page['has_more'])
+        self.assertEqual(self.summary(self.fetch(page['cursor'])), self.summary(feed)[2:])
+
+    def test_membership_changes_reach_removed_members(self):
+        self.team.members.add(self.other)
+        auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.other)}'}
+        cursor = self.client.get(reverse('change_feed'), **auth).json()['cursor']
+        self.project.name = 'Renamed'
+        self.project.save()
+        self.other.teams.remove(self.team)
+        self.project.name = 'Renamed again'
+        self.project.save()
+
+        changes = self.client.get(reverse('change_feed'), {'cursor': cursor}, **auth).json()['changes']
+        # Earlier entries of the team are no longer visible either; the
+        # client drops the whole team when it sees the removal.
+        self.assertEqual([(change['kind'], change['action']) for change in changes], [('membership', 'deleted')])
+        self.assertEqual(changes[0]['data'], {'team_id': self.team.pk, 'user_id': self.other.pk})
+
+    def test_task_moved_to_another_team_is_deleted_there(self):
+        self.other_team.members.add(self.user)
+        task = Task.objects.create(title='Task', project=self.project, created_by=self.user)
+        cursor = self.fetch()['cursor']
+        task.project = self.other_project
+        task.save()
+        changes = self.fetch(cursor)['changes']
+        self.assertEqual(
+            [(change['action'], change['team_id']) for change in changes],
+            [('deleted', self.team.pk), ('created', self.other_team.pk)]
+        )
+
+    def test_compaction_expires_old_cursors(self):
+        for index in range(3):
+            Task.objects.create(title=f'Task {index}', project=self.project, created_by=self.user)
+        newest = Change.objects.latest('id')
+        Change.objects.update(created_at=timezone.now() - timedelta(days=60))
+
+        out = StringIO()
+        call_command('compact_changes', '--max-age', '30', stdout=out)
+        self.assertEqual(list(Change.objects.values_list('id', flat=True)), [newest.pk])
+
+        response = self.client.get(reverse('change_feed'), {'cursor': 0}, **self.auth)
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(response.json()['cursor'], newest.pk)
+        self.assertEqual(self.fetch(newest.pk - 1)['changes'][0]['cursor'], newest.pk)
+
+
+job_calls = []
+
+
+@job(name='tests.record', max_attempts=3)
+def record_job(value, fail=False):
+    job_calls.append(value)
+    if fail:
+        raise RuntimeError('boom')
+
+
+@job(name='tests.limited', concurrency=1)
+def limited_job():
+    pass
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        job_calls.clear()
+        self.worker = Worker()
+
+    def test_enqueued_jobs_run_after_commit_and_finish(self):
+        queued = record_job.enqueue({'value': timezone.localdate()})
+        self.assertEqual((queued.status, job_calls), ('queued', []))
+        record_job.enqueue({'value': 'later'}, delay=timedelta(hours=1))
+
+        self.assertEqual(self.worker.work_off(), {'done': 1, 'failed': 0})
+        self.assertEqual(job_calls, [timezone.localdate().isoformat()])
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts, queued.locked_by), ('done', 1, ''))
+        self.assertIsNotNone(queued.finished_at)
+
+    def test_failed_jobs_are_retried_with_backoff(self):
+        queued = record_job.enqueue({'value': 1, 'fail': True})
+        for attempt in range(1, 4):
+            with self.assertLogs('apps.accounts.jobs', 'WARNING'):
+                self.assertEqual(self.worker.work_off(), {'done': 0, 'failed': 1})
+            queued.refresh_from_db()
+            self.assertEqual(queued.attempts, attempt)
+            self.assertIn('RuntimeError: boom', queued.last_error)
+            if queued.status == 'queued':
+                self.assertGreater(queued.run_at, timezone.now() + timedelta(seconds=4))
+                self.assertEqual(self.worker.work_off(), {'done': 0, 'failed': 0})
+                Job.objects.update(run_at=timezone.now())
+        self.assertEqual(queued.status, 'failed')
+        self.assertEqual(len(job_calls), 3)
+
+    def test_concurrency_limit_and_stale_jobs(self):
+        first = limited_job.enqueue()
+        second = limited_job.enqueue()
+        self.assertEqual([claimed.pk for claimed in claim_jobs('worker-a', 5)], [first.pk])
+        self.assertEqual(claim_jobs('worker-b', 5), [])
+
+        Job.objects.filter(pk=first.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(requeue_stale_jobs(), 1)
+        self.assertEqual([claimed.pk for claimed in claim_jobs('worker-b', 5)], [first.pk])
+        self.assertEqual(Job.objects.get(pk=first.pk).attempts, 2)
+        self.assertEqual(Job.objects.get(pk=second.pk).status, 'queued')
+
+    def test_password_reset_email_is_sent_by_the_worker(self):
+        user = User.objects.create_user(username='user1', email='user1@example.com', password='pass123')
+        response = self.client.post(reverse('password_reset'), {'email': 'user1@example.com'})
+        self.assertRedirects(response, reverse('password_reset_done'))
+        self.assertEqual(mail.outbox, [])
+        # The stored job has no token or link for the week it is kept.
+        kwargs = Job.objects.get().kwargs
+        self.assertEqual(kwargs['user_id'], user.pk)
+        self.assertNotIn('password-reset/confirm', json.dumps(kwargs))
+        self.assertFalse({'token', 'uid', 'user'} & set(kwargs['context']))
+
+        self.assertEqual(self.worker.work_off(), {'done': 1, 'failed': 0})
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['user1@example.com'])
+        link = re.search(r'https?://testserver(/accounts/password-reset/confirm/\S+)', mail.outbox[0].body)
+        response = self.client.get(link.group(1), follow=True)
+        self.assertTrue(response.context['validlink'])
+
+
+class ExportImportTests(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        override = override_settings(MEDIA_ROOT=directory)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.user = User.objects.create_user(
+            username='user1',
+            email='user1@example.com',
+            password='pass123'
+        )
+        self.member = User.objects.create_user(
+            username='user2',
+            email='user2@example.com',
+            password='pass123'
+        )
+        self.outsider = User.objects.create_user(
+            username='user3',
+            email='user3@example.com',
+            password='pass123'
+        )
+        self.team = Team.objects.create(name='Team A', owner=self.user)
+        self.team.members.add(self.member)
+        self.project = Project.objects.create(name='Projekt Łódź', team=self.team)
+        self.task = Task.objects.create(
+            title='Task 1', project=self.project, created_by=self.user, assigned_to=self.member,
+            status='in_progress', due_date=timezone.localdate()
+        )
+        Task.objects.create(title='Task 2', project=self.project, created_by=self.member)
+        Comment.objects.create(task=self.task, author=self.member, content='Komentarz, z przecinkiem')
+        with self.captureOnCommitCallbacks(execute=True):
+            attach_file(self.task, self.user, SimpleUploadedFile('spec.pdf', b'%PDF-1.4'))
+        Task.objects.filter(pk=self.task.pk).update(created_at=timezone.now() - timedelta(days=100))
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    def export(self, url_name, pk, **params):
+        response = self.assertWithinQueryBudget(reverse(url_name, args=[pk]), data=params, **self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_project_export_streams_jsonl(self):
+        response, content = self.export('project_export', self.project.pk)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        self.assertIn("filename*=utf-8''projekt-%C5%82%C3%B3d%C5%BA.jsonl", response['Content-Disposition'])
+        records = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(
+            [record['type'] for record in records], ['project', 'task', 'task', 'comment', 'attachment']
+        )
+        self.assertEqual(records[1]['assigned_to'], 'user2')
+        self.assertEqual(records[4]['name'], 'spec.pdf')
+        self.assertEqual(records[4]['sha256'], Blob.objects.get().sha256)
+
+        self.client.login(username='user3', password='pass123')
+        self.assertEqual(self.client.get(reverse('project_export', args=[self.project.pk])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('team_export', args=[self.team.pk])).status_code, 404)
+
+    def test_team_export_as_csv(self):
+        Project.objects.create(name='Empty', team=self.team)
+        response, content = self.export('team_export', self.team.pk, format='csv', records='comments')
+        self.assertIn('filename="team-a-comments.csv"', response['Content-Disposition'])
+        rows = list(csv.reader(io.StringIO(content)))
+        self.assertEqual(rows[0], ['id', 'task_id', 'author', 'content', 'created_at', 'updated_at'])
+        self.assertEqual(rows[1][2:4], ['user2', 'Komentarz, z przecinkiem'])
+        self.assertEqual(len(rows), 2)
+        response = self.client.get(reverse('team_export', args=[self.team.pk]), {'format': 'xml'}, **self.auth)
+        self.assertEqual(response.status_code, 400)
+
+    def test_import_round_trip(self):
+        _, content = self.export('team_export', self.team.pk)
+        content = content.replace('"created_by": "user2"', '"created_by": "ghost"')
+        target = Team.objects.create(name='Team B', owner=self.outsider)
+        path = os.path.join(tempfile.mkdtemp(), 'export.jsonl')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+
+        out = StringIO()
+        call_command('import_project_data', path, '--team', target.pk, '--batch-size', 1, stdout=out)
+        self.assertIn('Imported 1 project(s), 2 task(s), 1 comment(s) and 1 attachment(s).', out.getvalue())
+        self.assertIn('Unknown users (left unassigned or replaced): ghost', out.getvalue())
+
+        project = Project.objects.get(team=target)
+        self.assertEqual((project.name, project.todo_count, project.in_progress_count), ('Projekt Łódź', 1, 1))
+        task = project.tasks.get(title='Task 1')
+        self.assertEqual((task.assigned_to, task.due_date), (self.member, self.task.due_date))
+        self.assertEqual(task.created_at, Task.objects.get(pk=self.task.pk).created_at)
+        self.assertEqual(project.tasks.get(title='Task 2').created_by, self.outsider)
+        self.assertEqual(task.comments.get().author, self.member)
+        self.assertEqual(task.attachments.get().blob, Blob.objects.get())
+        self.assertEqual(Blob.objects.get().ref_count, 2)
+        # Delta-sync clients get the imported rows, not just the project.
+        feed = Change.objects.filter(project_id=project.pk).order_by('id')
+        self.assertEqual(
+            list(feed.values_list('kind', 'action')),
+            [('project', 'created'), ('task', 'created'), ('task', 'created'),
+             ('comment', 'created'), ('attachment', 'created')]
+        )
+        self.assertEqual(feed.get(kind='comment').data['task_id'], task.pk)
+        self.assertEqual(set(feed.values_list('team_id', flat=True)), {target.pk})
+
+    def test_import_stops_at_invalid_records(self):
+        target = Team.objects.create(name='Team B', owner=self.outsider)
+        path = os.path.join(tempfile.mkdtemp(), 'export.jsonl')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write('{"type": "project", "id": 1, "name": "Ok"}\n')
+            file.write('{"type": "task", "id": 1, "project_id": 1, "title": "T"}\n')
+            file.write('{"type": "project", "id": 2, "name": "Broken"}\n')
+            file.write('{"type": "task", "id": 2, "project_id": 2, "title": "T", "status": "blocked"}\n')
+        with self.assertRaisesMessage(CommandError, "Line 4: invalid status 'blocked'."):
+            call_command('import_project_data', path, '--team', target.pk, stdout=StringIO())
+        self.assertEqual(list(target.projects.values_list('name', flat=True)), ['Ok'])
+        self.assertEqual(Task.objects.filter(project__team=target).count(), 1)
+
+
+
+class GenerateDataTests(TestCase):
+    def test_generates_requested_shape(self):
+        out = StringIO()
+        call_command(
+            'generate_data', '--teams', 3, '--members', 4, '--projects', 2, '--tasks', 20, '--comments', 2,
+            stdout=out
+        )
+        self.assertIn('Log in as user0', out.getvalue())
+        self.assertEqual(Team.objects.count(), 3)
+        self.assertEqual(Project.objects.count(), 6)
+        for team in Team.objects.all():
+            self.assertEqual(team.members.count(), 4)
+            self.assertIn(team.owner, team.members.all())
+        self.assertGreater(Task.objects.count(), 0)
+        self.assertGreater(Comment.objects.count(), 0)
+        self.assertEqual(find_drift(), [])
+        # Cards of a column have distinct, ordered positions.
+        for project in Project.objects.all():
+            positions = list(project.tasks.filter(status='todo').order_by('position').values_list('position', flat=True))
+            self.assertEqual(len(set(positions)), len(positions))
+        self.assertTrue(self.client.login(username='user0', password='benchmark'))
+
+    def test_same_seed_gives_same_data(self):
+        call_command('generate_data', '--teams', 2, '--tasks', 10, '--prefix', 'a', stdout=StringIO())
+        call_command('generate_data', '--teams', 2, '--tasks', 10, '--prefix', 'b', stdout=StringIO())
+        tasks = [
+            list(Task.objects.filter(project__team__owner__username__startswith=prefix).order_by('pk').values_list(
+                'title', 'status', 'position'
+            ))
+            for prefix in ('a', 'b')
+        ]
+        self.assertEqual(tasks[0], tasks[1])
+
+    def test_refuses_existing_prefix(self):
+        User.objects.create_user(username='user1', password='pass123')
+        with self.assertRaisesMessage(CommandError, 'Choose another --prefix.'):
+            call_command('generate_data', '--teams', 1, stdout=StringIO())
+        self.assertFalse(Team.objects.exists())
+
+
+class SQLiteProfileTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def database(self, transaction_mode):
+        alias = f'stress_{transaction_mode.lower()}'
+        connections.settings[alias] = {
+            **connections.settings['default'],
+            'NAME': os.path.join(self.directory, f'{alias}.sqlite3'),
+            'CONN_MAX_AGE': 0,
+            'OPTIONS': {'transaction_mode': transaction_mode},
+        }
+
+        def remove():
+            connections[alias].close()
+            del connections[alias]
+            del connections.settings[alias]
+        self.addCleanup(remove)
+        return alias
+
+    def hammer(self, alias, threads=8, iterations=20):
+        # Every transaction reads the counter and then writes, like a card
+        # move reading its neighbours.
+        with connections[alias].cursor() as cursor:
+            cursor.execute('CREATE TABLE counter (n integer)')
+        errors = []
+        start = threading.Barrier(threads)
+
+        def work():
+            start.wait()
+            try:
+                for _ in range(iterations):
+                    try:
+                        with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+                            cursor.execute('SELECT COALESCE(MAX(n), 0) FROM counter')
+                            cursor.execute('INSERT INTO counter (n) VALUES (%s)', [cursor.fetchone()[0] + 1])
+                    except OperationalError as error:
+                        errors.append(error)
+            finally:
+                connections[alias].close()
+
+        workers = [threading.Thread(target=work) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT n FROM counter ORDER BY n')
+            return errors, [row[0] for row in cursor.fetchall()]
+
+    def test_pragmas_are_set_on_new_connections(self):
+        with connections[self.database('IMMEDIATE')].cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+
+    def test_immediate_transactions_wait_for_each_other(self):
+        errors, values = self.hammer(self.database('IMMEDIATE'))
+        self.assertEqual(errors, [])
+        self.assertEqual(values, list(range(1, 161)))
+
+    def test_deferred_transaction_fails_after_a_concurrent_write(self):
+        alias = self.database('DEFERRED')
+        with connections[alias].cursor() as cursor:
+            cursor.execute('CREATE TABLE counter (n integer)')
+        read, committed = threading.Event(), threading.Event()
+
+        def other_writer():
+            try:
+                with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+                    cursor.execute('SELECT COALESCE(MAX(n), 0) FROM counter')
+                    read.wait(5)
+                    cursor.execute('INSERT INTO counter (n) VALUES (1)')
+            finally:
+                committed.set()
+                connections[alias].close()
+
+        thread = threading.Thread(target=other_writer)
+        thread.start()
+        # Both read first; once the other one commits, this snapshot is
+        # stale and SQLite refuses the write without waiting.
+        with self.assertRaisesMessage(OperationalError, 'database is locked'):
+            with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+                cursor.execute('SELECT COALESCE(MAX(n), 0) FROM counter')
+                read.set()
+                committed.wait(5)
+                cursor.execute('INSERT INTO counter (n) VALUES (1)')
+        thread.join()
+
+    def test_unknown_transaction_mode_is_rejected(self):
+        settings_dict = {**connections.settings['default'], 'OPTIONS': {'transaction_mode': 'EVENTUALLY'}}
+        with self.assertRaises(ImproperlyConfigured):
+            DatabaseWrapper(settings_dict, 'invalid')
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        # A file copy of the test database, refreshed by sync_replicas.
+        connections.settings['replica'] = {
+            **connections.settings['default'], 'NAME': os.path.join(directory, 'replica.sqlite3'), 'CONN_MAX_AGE': 0,
+        }
+
+        def remove():
+            connections['replica'].close()
+            del connections['replica']
+            del connections.settings['replica']
+        self.addCleanup(remove)
+        override = override_settings(DATABASE_REPLICAS=['replica'])
+        override.enable()
+        self.addCleanup(override.disable)
+        cache.clear()
+
+        self.user = User.objects.create_user(username='user1', password='pass123')
+        team = Team.objects.create(name='Team A', owner=self.user)
+        team.members.add(self.user)
+        self.project = Project.objects.create(name='Project A', team=team)
+        self.task = Task.objects.create(title='Stary tytuł', project=self.project, created_by=self.user)
+        call_command('sync_replicas', stdout=StringIO())
+
+    def titles(self, **extra):
+        response = self.client.get(reverse('project-tasks', args=[self.project.pk]), **extra)
+        self.assertEqual(response.status_code, 200)
+        return [task['title'] for task in response.json()['results']]
+
+    def test_reads_come_from_the_replica_until_the_user_writes(self):
+        Task.objects.filter(pk=self.task.pk).update(title='Nowy tytuł')
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+        self.assertEqual(self.titles(**headers), ['Stary tytuł'])
+
+        response = self.client.post(
+            reverse('task_move', args=[self.task.pk]), {'status': 'done'}, content_type='application/json', **headers
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('primary_pin', response.cookies)
+        # API clients without cookies send the pin back in a header; it does
+        # not depend on any process's cache.
+        pin = response['X-Primary-Pin']
+        self.client.cookies.clear()
+        cache.clear()
+        self.assertEqual(self.titles(HTTP_X_PRIMARY_PIN=pin, **headers), ['Nowy tytuł'])
+
+        self.assertEqual(self.titles(**headers), ['Stary tytuł'])
+        self.assertEqual(self.titles(HTTP_X_PRIMARY_PIN=f'{pin}x', **headers), ['Stary tytuł'])
+        with override_settings(REPLICA_PIN_SECONDS=-1):
+            self.assertEqual(self.titles(HTTP_X_PRIMARY_PIN=pin, **headers), ['Stary tytuł'])
+        call_command('sync_replicas', stdout=StringIO())
+        self.assertEqual(self.titles(**headers), ['Nowy tytuł'])
+
+    def test_login_pins_the_browser_to_the_primary(self):
+        response = self.client.post(reverse('login'), {'username': 'user1', 'password': 'pass123'})
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+        self.assertIn('primary_pin', response.cookies)
+        self.assertEqual(self.client.get(reverse('dashboard')).status_code, 200)
+
+        # The replica does not have the new session yet.
+        del self.client.cookies['primary_pin']
+        cache.clear()
+        self.assertRedirects(
+            self.client.get(reverse('dashboard')), f'{reverse("login")}?next={reverse("dashboard")}',
+            fetch_redirect_response=False,
+        )
+
+    def test_reads_outside_requests_and_in_transactions_use_the_primary(self):
+        router = PrimaryReplicaRouter()
+        self.assertEqual(router.db_for_read(Task), 'default')
+        with replica_reads():
+            self.assertEqual(router.db_for_read(Task), 'replica')
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(Task), 'default')
+            with primary_reads():
+                self.assertEqual(router.db_for_read(Task), 'default')
+            self.assertEqual(router.db_for_write(Task), 'default')
+            self.assertEqual(router.db_for_read(Task), 'default')
+
+    def test_sync_replicas_needs_replicas(self):
+        with override_settings(DATABASE_REPLICAS=[]):
+            with self.assertRaisesMessage(CommandError, 'No replicas configured'):
+                call_command('sync_replicas', stdout=StringIO())
+
+
+class ShardingTests(TransactionTestCase):
+    def setUp(self):
+        self.directory = directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.shards = ['shard0', 'shard1']
+        for alias in self.shards:
+            connections.settings[alias] = {
+                **connections.settings['default'], 'NAME': os.path.join(directory, f'{alias}.sqlite3'), 'CONN_MAX_AGE': 0,
+            }
+
+        def remove():
+            for alias in self.shards:
+                connections[alias].close()
+                del connections[alias]
+                del connections.settings[alias]
+        self.addCleanup(remove)
+        override = override_settings(DATABASE_SHARDS=self.shards, MEDIA_ROOT=directory)
+        override.enable()
+        self.addCleanup(override.disable)
+        cache.clear()
+        for alias in self.shards:
+            call_command('migrate', database=alias, verbosity=0)
+        self.user = User.objects.create_user(username='user1', email='user1@example.com', password='pass123')
+
+        # Consecutive team ids land on different shards.
+        self.teams = [Team.objects.create(name=f'Team {i}', owner=self.user) for i in range(2)]
+        self.projects = [Project.objects.create(name=f'Project {i}', team=team) for i, team in enumerate(self.teams)]
+        self.tasks = [
+            Task.objects.create(
+                title=f'Zadanie {i}', project=project, created_by=self.user, assigned_to=self.user,
+                due_date=timezone.localdate() - timedelta(days=1),
+            )
+            for i, project in enumerate(self.projects)
+        ]
+        self.headers = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    def rows(self, model, alias, **lookup):
+        return model._base_manager.using(alias).filter(**lookup).count()
+
+    def assertWithinBudget(self, response):
+        # Counted on every database, with the allowance for fan-out.
+        self.assertLessEqual(int(response['X-Query-Count']), int(response['X-Query-Budget']))
+        return response
+
+    def test_teams_live_on_their_shard_with_their_data(self):
+        shards = [team._state.db for team in self.teams]
+        self.assertCountEqual(shards, self.shards)
+        for team, project, task, alias in zip(self.teams, self.projects, self.tasks, shards):
+            self.assertEqual((project._state.db, task._state.db), (alias, alias))
+            self.assertEqual(self.rows(Team.members.through, alias, team_id=team.pk, user_id=self.user.pk), 1)
+            # Each shard hands out ids from its own range.
+            self.assertEqual(task.pk // SHARD_ID_STRIDE, self.shards.index(alias) + 1)
+        self.assertFalse(Team._base_manager.using('default').exists())
+        self.assertEqual(self.rows(User, 'shard1', pk=self.user.pk), 1)
+        # The change log stays in 'default'.
+        self.assertTrue(Change.objects.filter(kind='task', object_id=self.tasks[1].pk).exists())
+
+        self.assertEqual(get_team_ids(self.user), {team.pk for team in self.teams})
+        self.assertEqual(Task.objects.filter(project__team_id=self.teams[1].pk).get().pk, self.tasks[1].pk)
+        self.assertEqual(Task.objects.count(), 2)
+        self.assertEqual(Task.objects.get(pk=self.tasks[0].pk).title, 'Zadanie 0')
+        self.assertEqual(Task.objects.update(priority='high'), 2)
+
+    def test_views_fan_out_across_shards(self):
+        cache.clear()
+        response = self.assertWithinBudget(self.client.get(reverse('my_tasks'), **self.headers))
+        self.assertEqual(response.status_code, 200)
+        # Merged newest first, as on one database.
+        self.assertEqual([task['title'] for task in response.json()['results']], ['Zadanie 1', 'Zadanie 0'])
+
+        summary = get_dashboard_summary(self.user)
+        self.assertEqual([team['name'] for team in summary['teams']], ['Team 0', 'Team 1'])
+        self.assertEqual(len(summary['urgent_tasks']), 2)
+        self.assertEqual(summary['overdue_count'], 2)
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('team_list'))
+        self.assertContains(response, 'Team 0')
+        self.assertContains(response, 'Team 1')
+        self.assertContains(self.client.get(reverse('team_detail', args=[self.teams[1].pk])), 'Project 1')
+        cache.clear()
+        response = self.assertWithinBudget(self.client.get(reverse('project_detail', args=[self.projects[1].pk])))
+        self.assertContains(response, 'Zadanie 1')
+        cache.clear()
+        response = self.assertWithinBudget(self.client.post(reverse('task_create', args=[self.projects[1].pk]), {
+            'title': 'Nowe zadanie', 'assigned_to': self.user.pk, 'priority': 'low', 'status': 'todo',
+        }))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.rows(Task, self.teams[1]._state.db, title='Nowe zadanie'), 1)
+        response = self.client.post(
+            reverse('task_detail', args=[self.tasks[1].pk]), {'content': 'Komentarz', 'comment_submit': '1'}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.rows(Comment, self.teams[1]._state.db, task_id=self.tasks[1].pk), 1)
+
+        cache.clear()
+        response = self.assertWithinBudget(self.client.post(
+            reverse('task_bulk_update'),
+            {'tasks': [{'id': task.pk, 'status': 'done'} for task in self.tasks]},
+            content_type='application/json', **self.headers
+        ))
+        self.assertEqual(response.status_code, 200)
+        statuses = Task.objects.filter(pk__in=[task.pk for task in self.tasks]).values_list('status', flat=True)
+        self.assertEqual(set(statuses), {'done'})
+        self.assertEqual([project.done_count for project in Project.objects.order_by('name')], [1, 1])
+        self.assertEqual(Task.objects.filter(status='done').count(), 2)
+        self.assertEqual({result['project_id'] for result in search(self.user, 'zadanie')}, {
+            project.pk for project in self.projects
+        })
+
+    def test_rows_are_merged_in_order_or_refused(self):
+        self.assertEqual(list(Task.objects.order_by('title').values_list('title', flat=True)), [
+            'Zadanie 0', 'Zadanie 1',
+        ])
+        self.assertEqual([task.title for task in Task.objects.order_by('-project__name')], ['Zadanie 1', 'Zadanie 0'])
+        self.assertEqual(next(Task.objects.order_by('-title').iterator()).title, 'Zadanie 1')
+        for queryset in [
+            Task.objects.order_by('title').values_list('id', flat=True),
+            Task.objects.order_by('project'),
+            Task.objects.order_by(Lower('title')),
+            Task.objects.order_by('?'),
+        ]:
+            with self.assertRaises(NotSupportedError):
+                list(queryset)
+        with self.assertRaises(NotSupportedError):
+            list(Task.objects.order_by('title', '-id').iterator())
+        # Meta.ordering over fields that aren't selected is left out.
+        self.assertCountEqual(Task.objects.values_list('title', flat=True), ['Zadanie 0', 'Zadanie 1'])
+
+    def test_move_team_copies_it_and_keeps_ids(self):
+        team, project, task = self.teams[0], self.projects[0], self.tasks[0]
+        source = team._state.db
+        target = next(alias for alias in self.shards if alias != source)
+        attachment = attach_file(task, self.user, SimpleUploadedFile('a.txt', b'dane'))
+        attach_file(self.tasks[1], self.user, SimpleUploadedFile('b.txt', b'dane'))
+        Comment.objects.create(task=task, author=self.user, content='Komentarz')
+
+        out = StringIO()
+        call_command('move_team', str(team.pk), '--to', target, stdout=out)
+        self.assertIn(f'Moved team {team.pk} to {target}', out.getvalue())
+
+        for model, lookup in (
+            (Team, {'pk': team.pk}), (Project, {'pk': project.pk}), (Task, {'pk': task.pk}),
+            (Comment, {'task_id': task.pk}), (Attachment, {'pk': attachment.pk}),
+        ):
+            self.assertEqual((self.rows(model, source, **lookup), self.rows(model, target, **lookup)), (0, 1))
+        # The content is now shared with the other team's blob on the target.
+        blob = Blob.objects.using(target).get(sha256=hashlib.sha256(b'dane').hexdigest())
+        self.assertEqual(blob.ref_count, 2)
+        self.assertFalse(Blob.objects.using(source).exists())
+        self.assertTrue(os.path.exists(os.path.join(self.directory, blob.file.name)))
+
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get(reverse('project_detail', args=[project.pk])), 'Zadanie 0')
+        self.assertEqual(self.client.get(reverse('attachment_download', args=[attachment.pk])).status_code, 200)
+        self.assertEqual(Team.objects.get(pk=team.pk)._state.db, target)
+        # Nothing happened as far as clients of the change feed can tell.
+        self.assertFalse(Change.objects.filter(action='deleted').exists())
+
+        with self.assertRaisesMessage(CommandError, 'already in'):
+            call_command('move_team', str(team.pk), '--to', target, stdout=StringIO())
+
+    def test_a_move_reaches_processes_that_cached_the_old_shard(self):
+        team, project = self.teams[0], self.projects[0]
+        source = team._state.db
+        target = next(alias for alias in self.shards if alias != source)
+        self.assertEqual(shard_for_team(team.pk), source)
+
+        # The move runs in another process, with a cache of its own.
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'move_team',
+        }}):
+            call_command('move_team', str(team.pk), '--to', target, stdout=StringIO())
+        self.assertEqual(shard_for_team(team.pk), target)
+        self.assertEqual(Project.objects.filter(team_id=team.pk).get().pk, project.pk)
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get(reverse('project_detail', args=[project.pk])), 'Zadanie 0')
+
+    def test_adding_a_shard_keeps_teams_where_they_are(self):
+        placement = {team.pk: team._state.db for team in self.teams}
+        self.assertEqual(dict(TeamShard.objects.values_list('pk', 'shard')), placement)
+        cache.clear()
+        with override_settings(DATABASE_SHARDS=[*self.shards, 'shard2']):
+            self.assertEqual(team_shards(placement), placement)
+
+    def test_users_and_profiles_are_mirrored(self):
+        user = User.objects.create_user(username='user2', email='user2@example.com', password='pass123')
+        Profile.objects.create(user=user, bio='Cześć')
+        for alias in self.shards:
+            self.assertEqual(Profile.objects.using(alias).get(user_id=user.pk).bio, 'Cześć')
+        self.teams[1].members.add(user)
+        user.delete()
+        for alias in self.shards:
+            self.assertFalse(User.objects.using(alias).filter(pk=user.pk).exists())
+        self.assertEqual(self.rows(Team.members.through, self.teams[1]._state.db, team_id=self.teams[1].pk), 1)
+
@@ -0,0 +1,88 @@
+import io
+import logging
+import secrets
+
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .jobs import job
+from .models import Profile
+from .sharding import mirror_users
+
+logger = logging.getLogger(__name__)
+
+# Twice the CSS boxes of .avatar-small/-medium/-large in base.html, for
+# high-density screens.
+AVATAR_SIZES = {'small': 60, 'medium': 100, 'large': 440}
+AVATAR_FORMATS = {
+    'webp': ('WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', 'image/jpeg', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+
+def thumbnail_name(user_id, key, size, extension):
+    return f'avatars/thumbnails/{user_id}/{key}-{size}.{extension}'
+
+
+def render_thumbnails(file):
+    """Return {(size, extension): bytes} with square crops of the image."""
+    with Image.open(file) as image:
+        # Let the JPEG decoder downscale while reading huge photos.
+        image.draft('RGB', (max(AVATAR_SIZES.values()),) * 2)
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    rendered = {}
+    for size, pixels in AVATAR_SIZES.items():
+        thumbnail = ImageOps.fit(image, (pixels, pixels), Image.LANCZOS)
+        for extension, (image_format, _, options) in AVATAR_FORMATS.items():
+            output = thumbnail
+            if image_format == 'JPEG' and thumbnail.mode == 'RGBA':
+                output = Image.new('RGB', thumbnail.size, 'white')
+                output.paste(thumbnail, mask=thumbnail.getchannel('A'))
+            buffer = io.BytesIO()
+            output.save(buffer, image_format, **options)
+            rendered[size, extension] = buffer.getvalue()
+    return rendered
+
+
+def delete_thumbnails(storage, user_id, key):
+    for size in AVATAR_SIZES:
+        for extension in AVATAR_FORMATS:
+            storage.delete(thumbnail_name(user_id, key, size, extension))
+
+
+# Rendering is CPU-bound; keep it from taking every worker thread.
+@job(max_attempts=3, concurrency=2)
+def generate_avatar_thumbnails(profile_id, using='default'):
+    profile = Profile.objects.using(using).filter(pk=profile_id).only(
+        'id', 'user_id', 'avatar', 'avatar_thumbnails'
+    ).first()
+    if profile is None or not profile.avatar:
+        return None
+    storage, name = profile.avatar.storage, profile.avatar.name
+    try:
+        with storage.open(name, 'rb') as file:
+            rendered = render_thumbnails(file)
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+        logger.warning('Cannot create thumbnails for avatar %s', name, exc_info=True)
+        return None
+
+    key = secrets.token_hex(6)
+    for (size, extension), data in rendered.items():
+        storage.save(thumbnail_name(profile.user_id, key, size, extension), ContentFile(data))
+    # Publish the set only if the avatar was not replaced in the meantime.
+    # updated_at too, for what is validated by it, like the board's ETag.
+    published = Profile.objects.using(using).filter(pk=profile_id, avatar=name).update(
+        avatar_thumbnails=key, updated_at=timezone.now()
+    )
+    if not published:
+        delete_thumbnails(storage, profile.user_id, key)
+        return None
+    # update() sends no post_save, so copy the new set to the shards here.
+    mirror_users([profile.user_id])
+    if profile.avatar_thumbnails:
+        delete_thumbnails(storage, profile.user_id, profile.avatar_thumbnails)
+    return key
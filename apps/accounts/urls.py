@@ -2,6 +2,7 @@ from django.urls import path, include
 from django.contrib.auth import views as auth_views
 from rest_framework.routers import DefaultRouter
 from . import views
+from .forms import QueuedPasswordResetForm
 
 router = DefaultRouter()
 router.register(r'projects', views.ProjectViewSet, basename='project')
@@ -16,6 +17,7 @@ urlpatterns = [
         'password-reset/',
         auth_views.PasswordResetView.as_view(
             template_name='accounts/password_reset.html',
+            form_class=QueuedPasswordResetForm,
             email_template_name='accounts/password_reset_email.txt',
             subject_template_name='accounts/password_reset_subject.txt',
         ),
@@ -42,14 +44,29 @@ urlpatterns = [
     path('teams/', views.TeamListView.as_view(), name='team_list'),
     path('teams/create/', views.TeamCreateView.as_view(), name='team_create'),
     path('teams/<int:pk>/', views.TeamDetailView.as_view(), name='team_detail'),
+    path('teams/<int:pk>/export/', views.team_export, name='team_export'),
     
     path('teams/<int:team_id>/projects/create/', views.ProjectCreateView.as_view(), name='project_create'),
     path('projects/<int:pk>/', views.ProjectDetailView.as_view(), name='project_detail'),
+    path('projects/<int:pk>/events/', views.project_events, name='project_events'),
+    path('projects/<int:pk>/export/', views.project_export, name='project_export'),
     
     path('projects/<int:project_id>/tasks/create/', views.TaskCreateView.as_view(), name='task_create'),
     path('tasks/<int:pk>/', views.TaskDetailView.as_view(), name='task_detail'),
     path('tasks/<int:pk>/edit/', views.TaskUpdateView.as_view(), name='task_edit'),
+    path('attachments/<int:pk>/', views.attachment_download, name='attachment_download'),
+    path('users/<int:user_id>/avatar/', views.avatar, name='avatar'),
+    path('users/<int:user_id>/avatar/<str:variant>/', views.avatar, name='avatar_thumbnail'),
+    
+    path('search/', views.SearchView.as_view(), name='search'),
     
     path('api/', include(router.urls)),
     path('api/my-tasks/', views.my_tasks, name='my_tasks'),
+    path('api/tasks/bulk/', views.task_bulk_update, name='task_bulk_update'),
+    path('api/tasks/<int:pk>/move/', views.task_move, name='task_move'),
+    path('api/tasks/<int:pk>/uploads/', views.upload_create, name='upload_create'),
+    path('api/uploads/<uuid:pk>/', views.upload_detail, name='upload_detail'),
+    path('api/uploads/<uuid:pk>/complete/', views.upload_complete, name='upload_complete'),
+    path('api/search/', views.search_api, name='search_api'),
+    path('api/changes/', views.change_feed, name='change_feed'),
 ]
\ No newline at end of file
@@ -0,0 +1,25 @@
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from .models import Project, Team
+
+# Versions are timestamps on the rows they describe, so that every worker
+# sees a bump as soon as it commits and Last-Modified moves with them.
+MEMBERSHIP = 'membership'
+PROJECT_LIST = 'project-list'
+BOARD = 'board'
+
+VERSION_FIELDS = {
+    MEMBERSHIP: (Team, 'members_changed_at'),
+    PROJECT_LIST: (Team, 'projects_changed_at'),
+    BOARD: (Project, 'board_changed_at'),
+}
+
+
+def bump_versions(kind, ids, using=DEFAULT_DB_ALIAS):
+    ids = {object_id for object_id in ids if object_id}
+    if not ids:
+        return
+    model, field = VERSION_FIELDS[kind]
+    # Same database and transaction as the change it stands for.
+    model.objects.using(using).filter(pk__in=ids).update(**{field: timezone.now()})
@@ -1,19 +1,55 @@
+import io
+import os
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import redirect, get_object_or_404
 from django.contrib.auth import login
+from django.contrib.auth.views import redirect_to_login
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
-from django.db.models import Count, Prefetch
-from django.http import Http404
+from django.db.models.fields.files import FieldFile
+from django.db.models import Count, F, Prefetch, Q, Window
+from django.db.models.functions import RowNumber
+from django.http import Http404, HttpResponseBadRequest, HttpResponseForbidden, StreamingHttpResponse
+from django.views.decorators.http import require_safe
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, TemplateView, FormView
 from django.urls import reverse_lazy, reverse
-from rest_framework import viewsets
+from django.utils.http import content_disposition_header
+from django.utils.text import slugify
+from rest_framework import serializers, viewsets
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from drf_spectacular.utils import extend_schema, OpenApiParameter
+from drf_spectacular.utils import extend_schema, inline_serializer, OpenApiParameter
 from drf_spectacular.types import OpenApiTypes
-from .models import Profile, Team, Project, Task, Comment, Attachment
-from .serializers import ProjectSerializer, TaskSerializer
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from .blobs import (
+    UploadConflict, UploadError, abort_upload, append_chunk, attach_existing, attach_file, complete_upload,
+    start_upload
+)
+from .bulk import bulk_update_tasks
+from .changes import CHANGE_MAX_PAGE_SIZE, CHANGE_PAGE_SIZE, CursorExpired, changes_since, latest_cursor
+from .downloads import serve_file
+from .exports import CSV_RECORDS, EXPORT_FORMATS, export_stream
+from .dashboard import get_dashboard_summary
+from .conditional import (
+    has_pending_messages, not_modified_response, project_list_validators,
+    project_resource_validators, project_validators, set_validators
+)
+from .events import event_stream, project_channel
+from .membership import get_team_ids, is_team_member, shares_team
+from .middleware import query_budget
+from .models import User, Profile, Team, Project, Task, Comment, Attachment, UploadSession
+from .pagination import ColumnPagination, KeysetPagination
+from .positions import move_task
+from .serializers import (
+    ProjectSerializer, ProjectReadSerializer, TaskSerializer, TaskReadSerializer, TaskBulkUpdateSerializer,
+    TaskMoveSerializer, UploadSessionSerializer, AttachmentSerializer, ChangeSerializer
+)
+from .search import SEARCH_CANDIDATES, SEARCH_KINDS, search
+from .stats import get_project_stats
+from .thumbnails import AVATAR_FORMATS, AVATAR_SIZES, thumbnail_name
 from .forms import (
     RegistrationForm, ProfileForm, TeamForm, ProjectForm, 
     TaskForm, CommentForm, AttachmentForm
@@ -23,8 +59,10 @@ class TeamMemberRequiredMixin(LoginRequiredMixin):
     team_url_kwarg = 'team_id'
 
     def dispatch(self, request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return self.handle_no_permission()
         self.team = get_object_or_404(Team, pk=kwargs[self.team_url_kwarg])
-        if request.user not in self.team.members.all():
+        if not is_team_member(request.user, self.team.pk):
             raise Http404("Nie masz dostępu do tego zespołu")
         return super().dispatch(request, *args, **kwargs)
 
@@ -33,8 +71,12 @@ class ProjectMemberRequiredMixin(LoginRequiredMixin):
     project_url_kwarg = 'project_id'
 
     def dispatch(self, request, *args, **kwargs):
-        self.project = get_object_or_404(Project, pk=kwargs[self.project_url_kwarg])
-        if request.user not in self.project.team.members.all():
+        if not request.user.is_authenticated:
+            return self.handle_no_permission()
+        self.project = get_object_or_404(
+            Project.objects.select_related('team'), pk=kwargs[self.project_url_kwarg]
+        )
+        if not is_team_member(request.user, self.project.team_id):
             raise Http404("Nie masz dostępu do tego projektu")
         return super().dispatch(request, *args, **kwargs)
 
@@ -42,7 +84,7 @@ class ProjectMemberRequiredMixin(LoginRequiredMixin):
 class TeamObjectAccessMixin(LoginRequiredMixin):
     def get_object(self, queryset=None):
         team = super().get_object(queryset)
-        if self.request.user not in team.members.all():
+        if not is_team_member(self.request.user, team.pk):
             raise Http404("Nie masz dostępu do tego zespołu")
         return team
 
@@ -50,7 +92,7 @@ class TeamObjectAccessMixin(LoginRequiredMixin):
 class ProjectObjectAccessMixin(LoginRequiredMixin):
     def get_object(self, queryset=None):
         project = super().get_object(queryset)
-        if self.request.user not in project.team.members.all():
+        if not is_team_member(self.request.user, project.team_id):
             raise Http404("Nie masz dostępu do tego projektu")
         return project
 
@@ -58,13 +100,14 @@ class ProjectObjectAccessMixin(LoginRequiredMixin):
 class TaskObjectAccessMixin(LoginRequiredMixin):
     def get_object(self, queryset=None):
         task = super().get_object(queryset)
-        if self.request.user not in task.project.team.members.all():
+        if not is_team_member(self.request.user, task.project.team_id):
             raise Http404("Nie masz dostępu do tego zadania")
         return task
 
 class RegisterView(CreateView):
     template_name = 'accounts/register.html'
     form_class = RegistrationForm
+    query_budget = 8
     success_url = reverse_lazy('dashboard')
     
     def form_valid(self, form):
@@ -78,6 +121,7 @@ class ProfileView(LoginRequiredMixin, FormView):
     template_name = 'accounts/profile.html'
     form_class = ProfileForm
     success_url = reverse_lazy('profile')
+    query_budget = 8
     
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
@@ -98,31 +142,29 @@ class ProfileView(LoginRequiredMixin, FormView):
 
 class DashboardView(LoginRequiredMixin, TemplateView):
     template_name = 'accounts/dashboard.html'
+    query_budget = 6
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['teams'] = Team.objects.filter(members=self.request.user).select_related('owner').prefetch_related('members')
-        context['urgent_tasks'] = Task.objects.filter(
-            assigned_to=self.request.user,
-            status__in=['todo', 'in_progress']
-        ).select_related('project__team', 'created_by').order_by('due_date')[:10]
+        context.update(get_dashboard_summary(self.request.user))
         return context
 
 class TeamListView(LoginRequiredMixin, ListView):
     model = Team
     template_name = 'accounts/team_list.html'
     context_object_name = 'teams'
+    query_budget = 5
     
     def get_queryset(self):
-        return Team.objects.filter(members=self.request.user).select_related('owner').annotate(
-            member_count=Count('members', distinct=True),
-            project_count=Count('projects', distinct=True)
-        )
+        return Team.objects.filter(
+            pk__in=get_team_ids(self.request.user)
+        ).select_related('owner')
 
 class TeamCreateView(LoginRequiredMixin, CreateView):
     model = Team
     form_class = TeamForm
     template_name = 'accounts/team_form.html'
+    query_budget = 12
     
     def form_valid(self, form):
         team = form.save(commit=False)
@@ -140,13 +182,16 @@ class TeamDetailView(TeamObjectAccessMixin, DetailView):
     model = Team
     template_name = 'accounts/team_detail.html'
     context_object_name = 'team'
+    query_budget = 7
     
     def get_queryset(self):
-        return Team.objects.prefetch_related('members', 'projects')
+        return Team.objects.select_related('owner').prefetch_related(
+            Prefetch('members', queryset=User.objects.select_related('profile'))
+        )
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        team = self.get_object()
+        team = self.object
         context['projects'] = team.projects.all()
         if self.request.user == team.owner and 'form' not in context:
             context['form'] = TeamForm(instance=team)
@@ -172,6 +217,7 @@ class ProjectCreateView(TeamMemberRequiredMixin, CreateView):
     model = Project
     form_class = ProjectForm
     template_name = 'accounts/project_form.html'
+    query_budget = 8
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -189,25 +235,187 @@ class ProjectDetailView(ProjectObjectAccessMixin, DetailView):
     model = Project
     template_name = 'accounts/project_detail.html'
     context_object_name = 'project'
+    query_budget = 7
+    # Membership is read from every shard, and the project is looked for on
+    # its home shard first.
+    query_budget_per_shard = 2
+    column_limit = 50
+    max_column_limit = 1000
     
     def get_queryset(self):
-        return Project.objects.select_related('team__owner').prefetch_related(
-            Prefetch('tasks', queryset=Task.objects.select_related('assigned_to', 'created_by'))
-        )
+        return Project.objects.select_related('team__owner')
+    
+    def get_column_limits(self):
+        limits = {}
+        for status, _ in Task.STATUS_CHOICES:
+            try:
+                limit = int(self.request.GET.get(f'{status}_limit', self.column_limit))
+            except ValueError:
+                limit = self.column_limit
+            limits[status] = min(max(limit, 1), self.max_column_limit)
+        return limits
+    
+    def get_board(self):
+        limits = self.get_column_limits()
+        visible = Q()
+        for status, limit in limits.items():
+            visible |= Q(status=status, column_position__lte=limit)
+        
+        tasks = self.object.tasks.select_related('assigned_to__profile').annotate(
+            column_position=Window(
+                RowNumber(),
+                partition_by=F('status'),
+                order_by=[F('position').asc(), F('id').asc()],
+            ),
+            column_total=Window(Count('id'), partition_by=F('status')),
+        ).filter(visible).order_by('position', 'id')
+        
+        columns = {
+            status: {'status': status, 'label': label, 'tasks': [], 'total': 0}
+            for status, label in Task.STATUS_CHOICES
+        }
+        for task in tasks:
+            column = columns[task.status]
+            column['tasks'].append(task)
+            column['total'] = task.column_total
+        
+        for status, column in columns.items():
+            column['has_more'] = column['total'] > len(column['tasks'])
+            if column['has_more']:
+                query = self.request.GET.copy()
+                query[f'{status}_limit'] = limits[status] + self.column_limit
+                column['load_more_url'] = f'?{query.urlencode()}'
+        return list(columns.values())
+    
+    def get(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        # Flash messages are consumed by rendering, so never skip it for them.
+        validators = None
+        if not has_pending_messages(request):
+            validators = project_validators(self.object, request.user)
+            response = not_modified_response(request, *validators)
+            if response is not None:
+                return response
+        
+        response = self.render_to_response(self.get_context_data(object=self.object))
+        if validators:
+            set_validators(response, *validators)
+        return response
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['tasks_by_status'] = {
-            'todo': self.object.tasks.filter(status='todo'),
-            'in_progress': self.object.tasks.filter(status='in_progress'),
-            'done': self.object.tasks.filter(status='done'),
-        }
+        context['columns'] = self.get_board()
         return context
 
+@query_budget(4)
+async def project_events(request, pk):
+    # Server-Sent Events for one board. The session lookup and membership
+    # check are sync code, the stream itself only waits on the broker.
+    user = await sync_to_async(lambda: request.user if request.user.is_authenticated else None)()
+    if user is None:
+        return HttpResponseForbidden()
+    team_id = await Project.objects.filter(pk=pk).values_list('team_id', flat=True).afirst()
+    if team_id is None or not await sync_to_async(is_team_member)(user, team_id):
+        raise Http404
+    
+    response = StreamingHttpResponse(event_stream(project_channel(pk)), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+def _download_user(request):
+    # Links in pages use the session, API clients send their access token.
+    if request.user.is_authenticated:
+        return request.user
+    try:
+        authenticated = JWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    return authenticated[0] if authenticated else None
+
+@query_budget(4)
+@require_safe
+def attachment_download(request, pk):
+    user = _download_user(request)
+    if user is None:
+        return redirect_to_login(request.get_full_path())
+    attachment = get_object_or_404(
+        Attachment.objects.select_related('blob'),
+        pk=pk,
+        task__project__team_id__in=get_team_ids(user)
+    )
+    # Blob content never changes, so its hash is a strong validator.
+    return serve_file(
+        request,
+        attachment.file,
+        attachment.display_name,
+        etag=f'"{attachment.blob.sha256}"' if attachment.blob_id else None,
+        as_attachment=request.GET.get('download') == '1',
+    )
+
+@query_budget(5)
+@require_safe
+def avatar(request, user_id, variant=None):
+    user = _download_user(request)
+    if user is None:
+        return redirect_to_login(request.get_full_path())
+    profile = get_object_or_404(Profile.objects.exclude(avatar=''), user_id=user_id)
+    if user.pk != profile.user_id and not shares_team(user, profile.user_id):
+        raise Http404
+    
+    file, filename = profile.avatar, os.path.basename(profile.avatar.name)
+    if variant is not None:
+        size, _, extension = variant.partition('.')
+        if size not in AVATAR_SIZES or extension not in AVATAR_FORMATS or not profile.avatar_thumbnails:
+            raise Http404
+        name = thumbnail_name(profile.user_id, profile.avatar_thumbnails, size, extension)
+        file, filename = FieldFile(profile, Profile.avatar.field, name), variant
+    # The avatar tag links with ?v=<version>, so a new upload gets a new URL.
+    cache_control = {'private': True, 'max_age': 365 * 24 * 60 * 60, 'immutable': True} if 'v' in request.GET else None
+    return serve_file(request, file, filename, cache_control=cache_control)
+
+def _export_response(request, name, project_ids):
+    export_format = request.GET.get('format', 'jsonl')
+    records = request.GET.get('records', 'tasks')
+    if export_format not in EXPORT_FORMATS or (export_format == 'csv' and records not in CSV_RECORDS):
+        return HttpResponseBadRequest('Nieobsługiwany format eksportu.')
+    if export_format == 'csv':
+        content_type, filename = 'text/csv; charset=utf-8', f'{name}-{records}.csv'
+    else:
+        content_type, filename = 'application/x-ndjson; charset=utf-8', f'{name}.jsonl'
+    # Rows are read and sent in chunks while the response streams.
+    response = StreamingHttpResponse(export_stream(project_ids, export_format, records), content_type=content_type)
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    return response
+
+@query_budget(4)
+@require_safe
+def project_export(request, pk):
+    user = _download_user(request)
+    if user is None:
+        return redirect_to_login(request.get_full_path())
+    project = get_object_or_404(Project.objects.only('pk', 'name'), pk=pk, team_id__in=get_team_ids(user))
+    return _export_response(request, slugify(project.name, allow_unicode=True) or f'project-{project.pk}', [project.pk])
+
+@query_budget(5)
+@require_safe
+def team_export(request, pk):
+    user = _download_user(request)
+    if user is None:
+        return redirect_to_login(request.get_full_path())
+    if pk not in get_team_ids(user):
+        raise Http404
+    team = get_object_or_404(Team.objects.only('pk', 'name'), pk=pk)
+    project_ids = list(team.projects.order_by('pk').values_list('pk', flat=True))
+    return _export_response(request, slugify(team.name, allow_unicode=True) or f'team-{team.pk}', project_ids)
+
 class TaskCreateView(ProjectMemberRequiredMixin, CreateView):
     model = Task
     form_class = TaskForm
     template_name = 'accounts/task_form.html'
+    # The assignee is checked by the form and again by model validation.
+    query_budget = 10
+    query_budget_per_shard = 1
     
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
@@ -231,10 +439,11 @@ class TaskDetailView(TaskObjectAccessMixin, DetailView):
     model = Task
     template_name = 'accounts/task_detail.html'
     context_object_name = 'task'
+    query_budget = 12
     
     def get_queryset(self):
         return Task.objects.select_related(
-            'project__team', 'assigned_to', 'created_by'
+            'project__team', 'assigned_to__profile', 'created_by'
         ).prefetch_related(
             Prefetch('comments', queryset=Comment.objects.select_related('author__profile')),
             Prefetch('attachments', queryset=Attachment.objects.select_related('uploaded_by'))
@@ -247,7 +456,8 @@ class TaskDetailView(TaskObjectAccessMixin, DetailView):
         return context
     
     def post(self, request, *args, **kwargs):
-        task = self.get_object()
+        # The comments and attachments are only needed to render the page.
+        task = self.get_object(Task.objects.select_related('project'))
         
         if 'comment_submit' in request.POST:
             comment_form = CommentForm(request.POST)
@@ -262,10 +472,7 @@ class TaskDetailView(TaskObjectAccessMixin, DetailView):
         elif 'attachment_submit' in request.POST:
             attachment_form = AttachmentForm(request.POST, request.FILES)
             if attachment_form.is_valid():
-                attachment = attachment_form.save(commit=False)
-                attachment.task = task
-                attachment.uploaded_by = request.user
-                attachment.save()
+                attach_file(task, request.user, attachment_form.cleaned_data['file'])
                 messages.success(request, 'Załącznik dodany!')
                 return redirect('task_detail', pk=task.pk)
         
@@ -275,6 +482,10 @@ class TaskUpdateView(TaskObjectAccessMixin, UpdateView):
     model = Task
     form_class = TaskForm
     template_name = 'accounts/task_form.html'
+    query_budget = 8
+    
+    def get_queryset(self):
+        return Task.objects.select_related('project__team')
     
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
@@ -294,15 +505,91 @@ class TaskUpdateView(TaskObjectAccessMixin, UpdateView):
     def get_success_url(self):
         return reverse('task_detail', kwargs={'pk': self.object.pk})
 
+class SearchView(LoginRequiredMixin, TemplateView):
+    template_name = 'accounts/search.html'
+    query_budget = 8
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        query = self.request.GET.get('q', '').strip()
+        context['query'] = query
+        context['results'] = search(self.request.user, query) if query else []
+        return context
+
 class ProjectViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = ProjectSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    query_budget = 5
     
     def get_queryset(self):
         return Project.objects.filter(
-            team__members=self.request.user
+            team_id__in=get_team_ids(self.request.user)
         ).select_related('team')
     
+    def list(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+        validators = project_list_validators(queryset, request.user)
+        response = not_modified_response(request, *validators)
+        if response is not None:
+            return response
+        
+        # The pagination cursor is built from created_at.
+        rows = self.paginate_queryset(ProjectReadSerializer.values(queryset, 'created_at'))
+        return set_validators(self.get_paginated_response(ProjectReadSerializer(rows).data), *validators)
+    
+    def retrieve(self, request, *args, **kwargs):
+        project = self.get_object()
+        validators = project_resource_validators(project, request.user)
+        response = not_modified_response(request, *validators)
+        if response is not None:
+            return response
+        return set_validators(Response(self.get_serializer(project).data), *validators)
+    
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name='status',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description='Only tasks from this column',
+                required=False,
+                enum=['todo', 'in_progress', 'done']
+            ),
+            OpenApiParameter(
+                name='cursor',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description='Kursor następnej strony zwrócony w polu "next"',
+                required=False
+            ),
+            OpenApiParameter(
+                name='page_size',
+                type=OpenApiTypes.INT,
+                location=OpenApiParameter.QUERY,
+                description=f'Liczba wyników na stronie (maks. {ColumnPagination.max_page_size})',
+                required=False
+            )
+        ],
+        responses={200: inline_serializer(
+            name='ProjectTaskCursorPage',
+            fields={
+                'next': serializers.URLField(allow_null=True),
+                'results': TaskSerializer(many=True),
+            }
+        )},
+        description='Tasks of the project in board order (column, then card position), paginated with a cursor',
+        operation_id='accounts_api_projects_tasks_list'
+    )
+    @action(detail=True, methods=['get'], pagination_class=ColumnPagination)
+    def tasks(self, request, pk=None):
+        tasks = self.get_object().tasks.all()
+        status_filter = request.query_params.get('status')
+        if status_filter:
+            tasks = tasks.filter(status=status_filter)
+        rows = self.paginate_queryset(TaskReadSerializer.values(tasks))
+        return self.get_paginated_response(TaskReadSerializer(rows).data)
+    
     @extend_schema(
         responses={200: {
             'type': 'object',
@@ -317,14 +604,57 @@ class ProjectViewSet(viewsets.ReadOnlyModelViewSet):
     @action(detail=True, methods=['get'])
     def stats(self, request, pk=None):
         project = self.get_object()
-        total_tasks = project.tasks.count()
-        completed_tasks = project.tasks.filter(status='done').count()
+        total_tasks = project.task_count
+        completed_tasks = project.done_count
         
         return Response({
             'total_tasks': total_tasks,
             'completed_tasks': completed_tasks,
             'completion_rate': (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0
         })
+    
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name='ids',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description='Comma separated project ids; defaults to every project visible to the user',
+                required=False,
+            )
+        ],
+        responses={200: {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'project_id': {'type': 'integer'},
+                    'by_status': {
+                        'type': 'object',
+                        'properties': {status: {'type': 'integer'} for status, _ in Task.STATUS_CHOICES}
+                    },
+                    'overdue_tasks': {'type': 'integer'},
+                    'total_tasks': {'type': 'integer'},
+                    'completed_tasks': {'type': 'integer'},
+                    'completion_rate': {'type': 'number', 'format': 'float'}
+                }
+            }
+        }},
+        description='Get statistics for many projects at once, including per-status and overdue task counts',
+        operation_id='accounts_api_projects_bulk_stats'
+    )
+    @action(detail=False, methods=['get'], url_path='stats')
+    def bulk_stats(self, request):
+        projects = self.get_queryset()
+        ids = request.query_params.get('ids')
+        if ids:
+            try:
+                ids = [int(pk) for pk in ids.split(',') if pk.strip()]
+            except ValueError:
+                raise serializers.ValidationError({'ids': 'Podaj listę identyfikatorów oddzielonych przecinkami.'})
+            projects = projects.filter(pk__in=ids)
+        project_ids = list(projects.values_list('pk', flat=True))
+        return Response(get_project_stats(project_ids))
 
 @extend_schema(
     parameters=[
@@ -335,20 +665,323 @@ class ProjectViewSet(viewsets.ReadOnlyModelViewSet):
             description='Filter tasks by status (todo, in_progress, done)',
             required=False,
             enum=['todo', 'in_progress', 'done']
+        ),
+        OpenApiParameter(
+            name='cursor',
+            type=OpenApiTypes.STR,
+            location=OpenApiParameter.QUERY,
+            description='Kursor następnej strony zwrócony w polu "next"',
+            required=False
+        ),
+        OpenApiParameter(
+            name='page_size',
+            type=OpenApiTypes.INT,
+            location=OpenApiParameter.QUERY,
+            description=f'Liczba wyników na stronie (maks. {KeysetPagination.max_page_size})',
+            required=False
         )
     ],
-    responses={200: TaskSerializer(many=True)},
-    description='Get all tasks assigned to the authenticated user with optional status filter'
+    responses={200: inline_serializer(
+        name='TaskCursorPage',
+        fields={
+            'next': serializers.URLField(allow_null=True),
+            'results': TaskSerializer(many=True),
+        }
+    )},
+    description='Get tasks assigned to the authenticated user with optional status filter, newest first, paginated with a cursor'
 )
+@query_budget(3, per_shard=2)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def my_tasks(request):
     status_filter = request.query_params.get('status')
     
-    tasks = Task.objects.filter(assigned_to=request.user).select_related('project', 'created_by')
+    # Tasks of teams the user has left are not listed: their pages would 404.
+    tasks = Task.objects.filter(
+        assigned_to=request.user,
+        project__team_id__in=get_team_ids(request.user)
+    )
     
     if status_filter:
         tasks = tasks.filter(status=status_filter)
     
-    serializer = TaskSerializer(tasks, many=True)
-    return Response(serializer.data)
+    paginator = KeysetPagination()
+    page = paginator.paginate_queryset(TaskReadSerializer.values(tasks), request)
+    serializer = TaskReadSerializer(page)
+    return paginator.get_paginated_response(serializer.data)
+
+@extend_schema(
+    request=TaskBulkUpdateSerializer,
+    responses={200: TaskSerializer(many=True)},
+    description='Change status, priority, assignee or due date of many tasks in one transaction; returns the updated tasks in request order'
+)
+@query_budget(12, per_shard=6)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def task_bulk_update(request):
+    serializer = TaskBulkUpdateSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    tasks = bulk_update_tasks(request.user, serializer.validated_data['tasks'])
+    return Response(TaskSerializer(tasks, many=True).data)
+
+@extend_schema(
+    request=TaskMoveSerializer,
+    responses={200: TaskSerializer},
+    description='Move a card within its column or to another column; only the moved task is written'
+)
+@query_budget(8)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def task_move(request, pk):
+    task = get_object_or_404(
+        Task.objects.select_related('project', 'assigned_to'),
+        pk=pk,
+        project__team_id__in=get_team_ids(request.user)
+    )
+    serializer = TaskMoveSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    move_task(task, **serializer.validated_data)
+    return Response(TaskSerializer(task).data)
+
+@extend_schema(
+    request=UploadSessionSerializer,
+    responses={201: UploadSessionSerializer, 200: AttachmentSerializer},
+    description=(
+        'Start a resumable upload of a task attachment. When sha256 matches content the server already '
+        'stores, the attachment is created right away and returned with status 200'
+    )
+)
+@query_budget(9)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def upload_create(request, pk):
+    task = get_object_or_404(
+        Task.objects.select_related('project'), pk=pk, project__team_id__in=get_team_ids(request.user)
+    )
+    serializer = UploadSessionSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    data = serializer.validated_data
+    if data.get('sha256'):
+        attachment = attach_existing(task, request.user, data['filename'], data['sha256'])
+        if attachment is not None:
+            return Response(AttachmentSerializer(attachment).data)
+    try:
+        session = start_upload(task, request.user, data['filename'], data['size'], data.get('sha256', ''))
+    except UploadError as exc:
+        raise serializers.ValidationError({'size': str(exc)})
+    response = Response(UploadSessionSerializer(session).data, status=201)
+    response['Location'] = reverse('upload_detail', args=[session.pk])
+    response['Upload-Offset'] = str(session.offset)
+    return response
+
+def _get_upload_session(request, pk):
+    return get_object_or_404(
+        UploadSession.objects.select_related('task__project', 'user'),
+        pk=pk,
+        user=request.user,
+        task__project__team_id__in=get_team_ids(request.user)
+    )
+
+def _upload_response(session, status=200):
+    response = Response(UploadSessionSerializer(session).data, status=status)
+    response['Upload-Offset'] = str(session.offset)
+    return response
+
+@extend_schema(
+    methods=['GET'],
+    responses={200: UploadSessionSerializer},
+    description='Upload progress; resume by sending the rest of the file from offset'
+)
+@extend_schema(
+    methods=['PATCH'],
+    request={'application/offset+octet-stream': OpenApiTypes.BINARY},
+    parameters=[
+        OpenApiParameter(
+            name='Upload-Offset',
+            type=OpenApiTypes.INT,
+            location=OpenApiParameter.HEADER,
+            description='Byte offset of this chunk; must equal the offset already received',
+            required=True
+        )
+    ],
+    responses={200: UploadSessionSerializer},
+    description=(
+        'Append the raw request body to the upload. The body is streamed to disk; a wrong offset '
+        'is answered with 409 and the current offset'
+    )
+)
+@extend_schema(
+    methods=['DELETE'],
+    responses={204: None},
+    description='Abort the upload and discard received data'
+)
+@query_budget(5)
+@api_view(['GET', 'PATCH', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def upload_detail(request, pk):
+    session = _get_upload_session(request, pk)
+    if request.method == 'DELETE':
+        abort_upload(session)
+        return Response(status=204)
+    if request.method == 'PATCH':
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers.get('Content-Length') or 0)
+        except (KeyError, ValueError):
+            raise serializers.ValidationError({'Upload-Offset': 'Podaj przesunięcie fragmentu w bajtach.'})
+        try:
+            append_chunk(session, request.stream or io.BytesIO(), offset, length)
+        except UploadConflict as exc:
+            session.offset = exc.offset
+            return _upload_response(session, status=409)
+        except UploadError as exc:
+            raise serializers.ValidationError({'detail': str(exc)})
+    return _upload_response(session)
+
+@extend_schema(
+    request=None,
+    responses={201: AttachmentSerializer},
+    description=(
+        'Finish an upload once all bytes were received; identical content is stored only once'
+    )
+)
+@query_budget(13)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def upload_complete(request, pk):
+    session = _get_upload_session(request, pk)
+    try:
+        attachment = complete_upload(session)
+    except UploadConflict as exc:
+        session.offset = exc.offset
+        return _upload_response(session, status=409)
+    except UploadError as exc:
+        raise serializers.ValidationError({'sha256': str(exc)})
+    return Response(AttachmentSerializer(attachment).data, status=201)
+
+@extend_schema(
+    parameters=[
+        OpenApiParameter(
+            name='q',
+            type=OpenApiTypes.STR,
+            location=OpenApiParameter.QUERY,
+            description='Words to search for; the last one also matches as a prefix',
+            required=True
+        ),
+        OpenApiParameter(
+            name='type',
+            type=OpenApiTypes.STR,
+            location=OpenApiParameter.QUERY,
+            description='Limit results to tasks or comments',
+            required=False,
+            enum=list(SEARCH_KINDS)
+        ),
+        OpenApiParameter(
+            name='limit',
+            type=OpenApiTypes.INT,
+            location=OpenApiParameter.QUERY,
+            description='Maximum number of results (max. 100)',
+            required=False
+        )
+    ],
+    responses={200: inline_serializer(
+        name='SearchResult',
+        many=True,
+        fields={
+            'type': serializers.ChoiceField(choices=SEARCH_KINDS),
+            'id': serializers.IntegerField(),
+            'task_id': serializers.IntegerField(),
+            'task_title': serializers.CharField(),
+            'project_id': serializers.IntegerField(),
+            'project_name': serializers.CharField(),
+            'snippet': serializers.CharField(help_text='HTML-escaped, matches wrapped in <mark>'),
+            'rank': serializers.FloatField(allow_null=True),
+        }
+    )},
+    description=f'Full-text search over tasks and comments in the teams of the authenticated user, best matches first; only the newest {SEARCH_CANDIDATES} matches of each type are ranked'
+)
+@query_budget(6)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def search_api(request):
+    kind = request.query_params.get('type')
+    if kind and kind not in SEARCH_KINDS:
+        raise serializers.ValidationError({'type': f'Dozwolone wartości: {", ".join(SEARCH_KINDS)}.'})
+    try:
+        limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+    except ValueError:
+        raise serializers.ValidationError({'limit': 'Podaj liczbę całkowitą.'})
+    
+    results = search(
+        request.user,
+        request.query_params.get('q', ''),
+        kinds=(kind,) if kind else SEARCH_KINDS,
+        limit=limit,
+    )
+    return Response(results)
+
+@extend_schema(
+    parameters=[
+        OpenApiParameter(
+            name='cursor',
+            type=OpenApiTypes.INT,
+            location=OpenApiParameter.QUERY,
+            description='Cursor returned by the previous call; without it no changes are returned, only the '
+                        'current cursor to use after a full download',
+            required=False
+        ),
+        OpenApiParameter(
+            name='limit',
+            type=OpenApiTypes.INT,
+            location=OpenApiParameter.QUERY,
+            description=f'Maximum number of changes (max. {CHANGE_MAX_PAGE_SIZE})',
+            required=False
+        )
+    ],
+    responses={
+        200: inline_serializer(
+            name='ChangeFeed',
+            fields={
+                'changes': ChangeSerializer(many=True),
+                'cursor': serializers.IntegerField(help_text='Pass as cursor in the next call'),
+                'has_more': serializers.BooleanField(),
+            }
+        ),
+        410: inline_serializer(
+            name='ChangeFeedExpired',
+            fields={
+                'detail': serializers.CharField(),
+                'cursor': serializers.IntegerField(help_text='Cursor to use after a full download'),
+            }
+        ),
+    },
+    description='Changes to projects, tasks, comments, attachments and team memberships visible to the '
+                'authenticated user since the cursor, oldest first. 410 means the log was compacted past the '
+                'cursor and the client has to download everything again.'
+)
+@query_budget(4)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def change_feed(request):
+    try:
+        limit = min(max(int(request.query_params.get('limit', CHANGE_PAGE_SIZE)), 1), CHANGE_MAX_PAGE_SIZE)
+    except ValueError:
+        raise serializers.ValidationError({'limit': 'Podaj liczbę całkowitą.'})
+    if not request.query_params.get('cursor'):
+        return Response({'changes': [], 'cursor': latest_cursor(), 'has_more': False})
+    try:
+        cursor = int(request.query_params['cursor'])
+    except ValueError:
+        raise serializers.ValidationError({'cursor': 'Podaj liczbę całkowitą.'})
+    
+    try:
+        changes, cursor, has_more = changes_since(request.user, cursor, limit)
+    except CursorExpired:
+        return Response(
+            {'detail': 'Kursor wygasł, pobierz dane ponownie.', 'cursor': latest_cursor()}, status=410
+        )
+    return Response({
+        'changes': ChangeSerializer(changes, many=True).data,
+        'cursor': cursor,
+        'has_more': has_more,
+    })
@@ -0,0 +1,22 @@
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings')
+
+
+def setup_django(database):
+    from django.conf import settings
+
+    settings.DATABASES['default']['NAME'] = database
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def percentile(timings, fraction):
+    timings = sorted(timings)
+    return timings[max(int(len(timings) * fraction) - 1, 0)]
@@ -0,0 +1,376 @@
+"""
+Measure latency and query counts of every page and API endpoint.
+
+Fills a throwaway SQLite database with the generate_data command's data set,
+requests each view in apps/accounts/urls.py plus the JWT token endpoints with
+the Django test client, and reports p50/p95/p99 latency and the number of
+queries. Results can be saved and compared with an earlier run:
+
+    python benchmarks/endpoints.py --tasks 500 --output baseline.json
+    python benchmarks/endpoints.py --tasks 500 --baseline baseline.json
+
+The comparison exits with status 1 when a view makes more queries than in the
+baseline or its median latency grew by more than --tolerance.
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from common import percentile, setup_django
+
+# Views that cannot be timed as a request/response round trip.
+SKIPPED = {
+    'project_events': 'Server-Sent Events stream that stays open',
+}
+CONTENT = b'benchmark attachment\n' * 512
+
+Scenario = namedtuple(
+    'Scenario', 'name url_name method path data auth content_type prepare',
+    defaults=(None, 'session', None, None),
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--teams', type=int, default=10)
+    parser.add_argument('--members', type=int, default=8)
+    parser.add_argument('--projects', type=int, default=5)
+    parser.add_argument('--tasks', type=int, default=200, help='Average tasks per project.')
+    parser.add_argument('--comments', type=int, default=3, help='Average comments per task.')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--cold', action='store_true', help='Clear the cache before every request.')
+    parser.add_argument('--only', action='append', default=[], help='Run only scenarios starting with this name.')
+    parser.add_argument('--output', help='Write the results to this JSON file.')
+    parser.add_argument('--baseline', help='Compare with the results in this JSON file.')
+    parser.add_argument('--tolerance', type=float, default=1.25, help='Allowed ratio of median latencies.')
+    parser.add_argument('--min-delta', type=float, default=1.0,
+                        help='Ignore latency changes smaller than this many milliseconds.')
+    return parser.parse_args()
+
+
+def prepare_data(args):
+    from django.core.files.base import ContentFile
+    from django.db.models import Count, F
+
+    from apps.accounts.blobs import attach_file
+    from apps.accounts.datagen import generate_dataset
+    from apps.accounts.models import Comment, Profile, Project, Task
+    from apps.accounts.thumbnails import generate_avatar_thumbnails
+
+    started = time.perf_counter()
+    counts = generate_dataset(
+        args.teams, args.members, args.projects, args.tasks, args.comments, seed=args.seed
+    )
+    print(
+        f'Generated {counts["tasks"]} tasks and {counts["comments"]} comments '
+        f'in {time.perf_counter() - started:.1f}s'
+    )
+
+    # The biggest board is the slowest page; benchmark it as its team owner.
+    project = Project.objects.select_related('team__owner').order_by(
+        -(F('todo_count') + F('in_progress_count') + F('done_count')), 'pk'
+    ).first()
+    user = project.team.owner
+    task_id = Comment.objects.filter(task__project=project).values('task').annotate(
+        count=Count('pk')
+    ).order_by('-count').values_list('task', flat=True).first()
+    task = Task.objects.get(pk=task_id) if task_id else Task.objects.filter(project=project).first()
+
+    attachment = attach_file(task, user, ContentFile(CONTENT), name='notes.txt')
+    profile = Profile.objects.get(user=user)
+    profile.avatar.save('avatar.png', ContentFile(avatar_image()))
+    generate_avatar_thumbnails(profile_id=profile.pk)
+    return {
+        'user': user,
+        'team': project.team,
+        'project': project,
+        'task': task,
+        'attachment': attachment,
+        'sha256': hashlib.sha256(CONTENT).hexdigest(),
+    }
+
+
+def avatar_image():
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new('RGB', (800, 800), (40, 120, 200)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def scenarios(data):
+    from django.contrib.auth.tokens import default_token_generator
+    from django.urls import reverse
+    from django.utils.encoding import force_bytes
+    from django.utils.http import urlsafe_base64_encode
+    from rest_framework_simplejwt.tokens import RefreshToken
+
+    from apps.accounts.blobs import append_chunk, start_upload
+    from apps.accounts.datagen import DEFAULT_PASSWORD
+    from apps.accounts.models import Task
+
+    user, team, project, task = data['user'], data['team'], data['project'], data['task']
+    column = list(Task.objects.filter(project=project, status='todo').order_by('position').values_list('pk', flat=True))
+    moved, anchors = column[-1], column[:2]
+    uid = urlsafe_base64_encode(force_bytes(user.pk))
+    token = default_token_generator.make_token(user)
+    refresh = str(RefreshToken.for_user(user))
+    moves = iter_forever(
+        [{'status': 'todo', 'after': anchors[0], 'before': anchors[1]}, {'status': 'todo', 'after': None, 'before': anchors[0]}]
+    )
+    bulk = iter_forever(['high', 'low'])
+    bulk_ids = column[:50]
+
+    def upload_session():
+        session = start_upload(task, user, 'upload.txt', len(CONTENT))
+        append_chunk(session, io.BytesIO(CONTENT), 0, len(CONTENT))
+        return {'path': reverse('upload_complete', args=[session.pk])}
+
+    def new_upload():
+        return {'path': reverse('upload_detail', args=[start_upload(task, user, 'upload.txt', len(CONTENT)).pk])}
+
+    def logged_in_client():
+        client = make_client()
+        client.force_login(user)
+        return {'client': client}
+
+    return [
+        Scenario('register', 'register', 'get', reverse('register'), auth=None),
+        Scenario('login', 'login', 'get', reverse('login'), auth=None),
+        Scenario('logout', 'logout', 'post', reverse('logout'), prepare=logged_in_client),
+        Scenario('profile', 'profile', 'get', reverse('profile')),
+        Scenario('password_reset', 'password_reset', 'get', reverse('password_reset'), auth=None),
+        Scenario('password_reset post', 'password_reset', 'post', reverse('password_reset'),
+                 {'email': user.email}, auth=None),
+        Scenario('password_reset_done', 'password_reset_done', 'get', reverse('password_reset_done'), auth=None),
+        Scenario('password_reset_confirm', 'password_reset_confirm', 'get',
+                 reverse('password_reset_confirm', args=[uid, token]), auth=None),
+        Scenario('password_reset_complete', 'password_reset_complete', 'get',
+                 reverse('password_reset_complete'), auth=None),
+        Scenario('dashboard', 'dashboard', 'get', reverse('dashboard')),
+        Scenario('team_list', 'team_list', 'get', reverse('team_list')),
+        Scenario('team_create', 'team_create', 'get', reverse('team_create')),
+        Scenario('team_detail', 'team_detail', 'get', reverse('team_detail', args=[team.pk])),
+        Scenario('team_export', 'team_export', 'get', reverse('team_export', args=[team.pk])),
+        Scenario('project_create', 'project_create', 'get', reverse('project_create', args=[team.pk])),
+        Scenario('project_detail', 'project_detail', 'get', reverse('project_detail', args=[project.pk])),
+        Scenario('project_export', 'project_export', 'get', reverse('project_export', args=[project.pk])),
+        Scenario('project_export csv', 'project_export', 'get',
+                 reverse('project_export', args=[project.pk]) + '?format=csv&records=comments'),
+        Scenario('task_create', 'task_create', 'get', reverse('task_create', args=[project.pk])),
+        Scenario('task_detail', 'task_detail', 'get', reverse('task_detail', args=[task.pk])),
+        Scenario('task_detail comment', 'task_detail', 'post', reverse('task_detail', args=[task.pk]),
+                 {'content': 'Komentarz z benchmarku', 'comment_submit': '1'}),
+        Scenario('task_edit', 'task_edit', 'get', reverse('task_edit', args=[task.pk])),
+        Scenario('attachment_download', 'attachment_download', 'get',
+                 reverse('attachment_download', args=[data['attachment'].pk])),
+        Scenario('avatar', 'avatar', 'get', reverse('avatar', args=[user.pk])),
+        Scenario('avatar_thumbnail', 'avatar_thumbnail', 'get', reverse('avatar_thumbnail', args=[user.pk, 'small.webp'])),
+        Scenario('search', 'search', 'get', reverse('search') + '?q=serwer'),
+        Scenario('token_obtain_pair', 'token_obtain_pair', 'post', reverse('token_obtain_pair'),
+                 {'username': user.username, 'password': DEFAULT_PASSWORD}, auth=None),
+        Scenario('token_refresh', 'token_refresh', 'post', reverse('token_refresh'), {'refresh': refresh}, auth=None),
+        Scenario('api-root', 'api-root', 'get', reverse('api-root'), auth='jwt'),
+        Scenario('project-list', 'project-list', 'get', reverse('project-list'), auth='jwt'),
+        Scenario('project-detail', 'project-detail', 'get', reverse('project-detail', args=[project.pk]), auth='jwt'),
+        Scenario('project-stats', 'project-stats', 'get', reverse('project-stats', args=[project.pk]), auth='jwt'),
+        Scenario('project-bulk-stats', 'project-bulk-stats', 'get', reverse('project-bulk-stats'), auth='jwt'),
+        Scenario('project-tasks', 'project-tasks', 'get', reverse('project-tasks', args=[project.pk]), auth='jwt'),
+        Scenario('my_tasks', 'my_tasks', 'get', reverse('my_tasks'), auth='jwt'),
+        Scenario('task_bulk_update', 'task_bulk_update', 'post', reverse('task_bulk_update'),
+                 lambda: {'tasks': [{'id': pk, 'priority': priority} for priority in [next(bulk)] for pk in bulk_ids]},
+                 auth='jwt', content_type='application/json'),
+        Scenario('task_move', 'task_move', 'post', reverse('task_move', args=[moved]), lambda: next(moves),
+                 auth='jwt', content_type='application/json'),
+        Scenario('upload_create', 'upload_create', 'post', reverse('upload_create', args=[task.pk]),
+                 {'filename': 'upload.txt', 'size': len(CONTENT)}, auth='jwt', content_type='application/json'),
+        Scenario('upload_create dedup', 'upload_create', 'post', reverse('upload_create', args=[task.pk]),
+                 {'filename': 'copy.txt', 'size': len(CONTENT), 'sha256': data['sha256']},
+                 auth='jwt', content_type='application/json'),
+        Scenario('upload_detail', 'upload_detail', 'get', None, auth='jwt', prepare=new_upload),
+        Scenario('upload_complete', 'upload_complete', 'post', None, auth='jwt', prepare=upload_session),
+        Scenario('search_api', 'search_api', 'get', reverse('search_api') + '?q=faktura b', auth='jwt'),
+        Scenario('change_feed', 'change_feed', 'get', reverse('change_feed') + '?cursor=0', auth='jwt'),
+    ]
+
+
+def iter_forever(values):
+    while True:
+        yield from values
+
+
+def make_client():
+    from django.test import Client
+
+    return Client()
+
+
+def url_names():
+    from django.urls import URLPattern, get_resolver
+
+    names = set()
+    patterns = list(get_resolver().url_patterns)
+    while patterns:
+        pattern = patterns.pop()
+        if isinstance(pattern, URLPattern):
+            names.add(pattern.name)
+        else:
+            # Only this project's URLs; the admin and API docs are not benchmarked.
+            if pattern.app_name != 'admin':
+                patterns.extend(pattern.url_patterns)
+    return names - {None, 'home', 'schema', 'swagger-ui'}
+
+
+def request(scenario, clients):
+    options = scenario.prepare() if scenario.prepare else {}
+    client = options.get('client') or clients[scenario.auth]
+    data = scenario.data() if callable(scenario.data) else scenario.data
+    kwargs = dict(clients.get('headers') if scenario.auth == 'jwt' else {})
+    if scenario.content_type:
+        kwargs['content_type'] = scenario.content_type
+        data = json.dumps(data)
+    return client, options.get('path') or scenario.path, data, kwargs
+
+
+def measure(scenario, clients, args):
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    timings, queries, status = [], 0, None
+    for iteration in range(args.warmup + args.repeat):
+        client, path, data, kwargs = request(scenario, clients)
+        if args.cold:
+            cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            response = getattr(client, scenario.method)(path, data, **kwargs)
+            if response.streaming:
+                for _ in response.streaming_content:
+                    pass
+            elapsed = (time.perf_counter() - start) * 1000
+        if response.status_code >= 400:
+            raise SystemExit(f'{scenario.name}: {scenario.method.upper()} {path} returned {response.status_code}')
+        if iteration >= args.warmup:
+            timings.append(elapsed)
+            queries = max(queries, len(context.captured_queries))
+            status = response.status_code
+    return {
+        'url_name': scenario.url_name,
+        'method': scenario.method.upper(),
+        'status': status,
+        'p50_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+        'queries': queries,
+    }
+
+
+def compare(results, baseline, args):
+    regressions = []
+    print(f'\nCompared with {args.baseline} ({baseline["meta"]["created_at"]}):')
+    for name, result in results.items():
+        before = baseline['results'].get(name)
+        if before is None:
+            print(f'{name:<28} new')
+            continue
+        ratio = result['p50_ms'] / before['p50_ms'] if before['p50_ms'] else 1
+        slower = ratio > args.tolerance and result['p50_ms'] - before['p50_ms'] > args.min_delta
+        more_queries = result['queries'] > before['queries']
+        flag = ' REGRESSION' if slower or more_queries else ''
+        print(
+            f'{name:<28} p50 {before["p50_ms"]:8.2f} -> {result["p50_ms"]:8.2f} ms ({ratio:5.2f}x)   '
+            f'queries {before["queries"]:3} -> {result["queries"]:3}{flag}'
+        )
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    args = parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        setup_django(os.path.join(directory, 'benchmark.sqlite3'))
+
+        import django
+        from django.conf import settings
+        from django.test.utils import setup_test_environment
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        # Keep uploads out of the real media and upload directories; the test
+        # environment also sends emails nowhere and allows the test client's host.
+        settings.MEDIA_ROOT = os.path.join(directory, 'media')
+        settings.UPLOAD_SESSION_DIR = os.path.join(directory, 'uploads')
+        settings.DEBUG = False
+        setup_test_environment()
+
+        data = prepare_data(args)
+        session = make_client()
+        session.force_login(data['user'])
+        clients = {
+            None: make_client(),
+            'session': session,
+            'jwt': make_client(),
+            'headers': {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(data["user"])}'},
+        }
+
+        selected = [
+            scenario for scenario in scenarios(data)
+            if not args.only or any(scenario.name.startswith(prefix) for prefix in args.only)
+        ]
+        results = {}
+        for scenario in selected:
+            results[scenario.name] = result = measure(scenario, clients, args)
+            print(
+                f'{scenario.name:<28} p50 {result["p50_ms"]:8.2f} ms   p95 {result["p95_ms"]:8.2f} ms   '
+                f'p99 {result["p99_ms"]:8.2f} ms   queries {result["queries"]:3}'
+            )
+
+        if not args.only:
+            covered = {scenario.url_name for scenario in selected} | SKIPPED.keys()
+            for name in sorted(url_names() - covered):
+                print(f'Not benchmarked: {name}', file=sys.stderr)
+            for name, reason in SKIPPED.items():
+                print(f'Skipped {name}: {reason}')
+
+        report = {
+            'meta': {
+                'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'shape': {key: getattr(args, key) for key in ('teams', 'members', 'projects', 'tasks', 'comments', 'seed')},
+                'repeat': args.repeat,
+                'cold_cache': args.cold,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'sqlite': sqlite3.sqlite_version,
+            },
+            'results': results,
+        }
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+        print(f'Saved results to {args.output}')
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if baseline['meta']['shape'] != report['meta']['shape']:
+            print('Warning: the baseline was measured on a different data set shape.', file=sys.stderr)
+        if compare(results, baseline, args):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Measure full-text search latency over tasks and comments.
+
+Builds a throwaway SQLite database with generated text (the FTS5 index is
+filled by the insert triggers) and times search() for common, rare, prefix and
+multi-word queries, compared with the icontains fallback:
+
+    python benchmarks/search.py --tasks 200000 --comments 2000000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from common import percentile, setup_django
+
+BATCH_SIZE = 10000
+WORDS = (
+    'serwer baza danych migracja wdrożenie testy klient faktura raport błąd poprawka '
+    'spotkanie dokumentacja interfejs logowanie uprawnienia kopia zapasowa monitoring '
+    'aplikacja mobilna płatność integracja kolejka wydajność zapytanie indeks'
+).split()
+QUERIES = ['serwer', 'faktura błąd', 'migr', 'kopia zapasowa', 'xyzzy']
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--teams', type=int, default=20)
+    parser.add_argument('--tasks', type=int, default=50000)
+    parser.add_argument('--comments', type=int, default=500000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args()
+
+
+def sentence(rng, length):
+    # Zipf-like skew so that some words are common and others rare.
+    return ' '.join(WORDS[min(int(rng.expovariate(0.15)), len(WORDS) - 1)] for _ in range(length))
+
+
+def generate(args):
+    from django.contrib.auth.hashers import make_password
+
+    from apps.accounts.models import User, Team, Project, Task, Comment
+
+    rng = random.Random(args.seed)
+    password = make_password('benchmark')
+    users = User.objects.bulk_create(
+        User(username=f'user{i}', email=f'user{i}@example.com', password=password)
+        for i in range(args.users)
+    )
+    teams = [Team.objects.create(name=f'Team {i}', owner=users[0]) for i in range(args.teams)]
+    for team in teams:
+        team.members.add(*rng.sample(users, k=min(10, len(users))))
+    projects = Project.objects.bulk_create(
+        Project(name=f'Project {i}', team=teams[i % len(teams)]) for i in range(args.teams * 5)
+    )
+    for start in range(0, args.tasks, BATCH_SIZE):
+        Task.objects.bulk_create(
+            Task(
+                title=sentence(rng, 4),
+                description=sentence(rng, rng.randint(0, 30)),
+                project=rng.choice(projects),
+                created_by=rng.choice(users),
+            )
+            for _ in range(start, min(start + BATCH_SIZE, args.tasks))
+        )
+    task_ids = list(Task.objects.values_list('pk', flat=True))
+    for start in range(0, args.comments, BATCH_SIZE):
+        Comment.objects.bulk_create(
+            Comment(task_id=rng.choice(task_ids), author=rng.choice(users), content=sentence(rng, rng.randint(3, 25)))
+            for _ in range(start, min(start + BATCH_SIZE, args.comments))
+        )
+    return users[0]
+
+
+def measure(name, run, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = run()
+        timings.append((time.perf_counter() - start) * 1000)
+    print(
+        f'{name:<32} median {statistics.median(timings):9.2f} ms   '
+        f'p95 {percentile(timings, 0.95):9.2f} ms   results {len(results)}'
+    )
+
+
+def main():
+    args = parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        setup_django(os.path.join(directory, 'benchmark.sqlite3'))
+
+        from apps.accounts import search
+
+        started = time.perf_counter()
+        user = generate(args)
+        print(f'Generated {args.tasks} tasks and {args.comments} comments in {time.perf_counter() - started:.1f}s')
+
+        for query in QUERIES:
+            measure(f'fts5 "{query}"', lambda: search.search(user, query), args.repeat)
+        terms_of = search.search_terms
+        team_ids = sorted(search.get_team_ids(user))
+        for query in QUERIES:
+            measure(
+                f'icontains "{query}"',
+                lambda: search._search_like(terms_of(query), team_ids, search.SEARCH_KINDS, 20, 'default'),
+                max(args.repeat // 10, 1),
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Compare the ModelSerializer path with the values() read path used by
+my_tasks and the project list, including JSON rendering.
+
+    python benchmarks/serializers.py --tasks 50000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from common import percentile, setup_django
+
+BATCH_SIZE = 5000
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tasks', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args()
+
+
+def generate(args):
+    from django.utils import timezone
+
+    from apps.accounts.models import User, Team, Project, Task
+
+    rng = random.Random(args.seed)
+    user = User.objects.create_user(username='user', email='user@example.com', password='benchmark')
+    team = Team.objects.create(name='Benchmark', owner=user)
+    projects = Project.objects.bulk_create(Project(name=f'Project {i}', team=team) for i in range(20))
+    statuses = [status for status, _ in Task.STATUS_CHOICES]
+    for start in range(0, args.tasks, BATCH_SIZE):
+        Task.objects.bulk_create(
+            Task(
+                title=f'Task {i}',
+                description='Opis zadania ' * rng.randint(0, 20),
+                project=rng.choice(projects),
+                assigned_to=user if rng.random() < 0.9 else None,
+                created_by=user,
+                status=rng.choice(statuses),
+                due_date=timezone.localdate() if rng.random() < 0.5 else None,
+            )
+            for i in range(start, min(start + BATCH_SIZE, args.tasks))
+        )
+
+
+def run(name, render, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = render()
+        timings.append((time.perf_counter() - start) * 1000)
+    print(f'{name:<40} median {statistics.median(timings):9.1f} ms   p95 {percentile(timings, 0.95):9.1f} ms')
+    return body
+
+
+def main():
+    args = parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        setup_django(os.path.join(directory, 'benchmark.sqlite3'))
+        generate(args)
+
+        from rest_framework.renderers import JSONRenderer
+
+        from apps.accounts.models import Task
+        from apps.accounts.renderers import FastJSONRenderer
+        from apps.accounts.serializers import TaskSerializer, TaskReadSerializer
+
+        tasks = Task.objects.order_by('-created_at', '-id')
+        print(f'{args.tasks} tasks, {args.repeat} runs each')
+
+        model_body = run(
+            'TaskSerializer + JSONRenderer',
+            lambda: JSONRenderer().render(
+                TaskSerializer(tasks.select_related('project', 'assigned_to'), many=True).data
+            ),
+            args.repeat,
+        )
+        run(
+            'TaskReadSerializer + JSONRenderer',
+            lambda: JSONRenderer().render(TaskReadSerializer(TaskReadSerializer.values(tasks)).data),
+            args.repeat,
+        )
+        fast_body = run(
+            'TaskReadSerializer + FastJSONRenderer',
+            lambda: FastJSONRenderer().render(TaskReadSerializer(TaskReadSerializer.values(tasks)).data),
+            args.repeat,
+        )
+        print('identical output:', model_body == fast_body)
+
+
+if __name__ == '__main__':
+    main()
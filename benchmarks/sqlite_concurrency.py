@@ -0,0 +1,161 @@
+"""
+Compare the stock SQLite setup with the tuned database profile under concurrent writes.
+
+Each profile runs in its own process on a fresh database: threads post
+comments, move cards and bulk-edit tasks through the views at the same time,
+and the script reports throughput, latency and "database is locked" errors:
+
+    python benchmarks/sqlite_concurrency.py --threads 16 --seconds 10
+
+The stock profile is Django's sqlite3 backend with its defaults (rollback
+journal, deferred transactions, a new connection per request); the tuned one
+is settings.DATABASES as shipped (WAL and SQLITE_PRAGMAS, BEGIN IMMEDIATE,
+CONN_MAX_AGE).
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from common import percentile, setup_django
+
+PROFILES = ('stock', 'tuned')
+OPERATIONS = ('comment', 'move', 'bulk')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--tasks', type=int, default=200, help='Average tasks per project.')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--profile', choices=PROFILES, help='Run one profile in this process.')
+    return parser.parse_args()
+
+
+def configure(profile):
+    from django.conf import settings
+
+    if profile == 'stock':
+        settings.DATABASES['default'].update(
+            ENGINE='django.db.backends.sqlite3', OPTIONS={}, CONN_MAX_AGE=0, CONN_HEALTH_CHECKS=False
+        )
+        settings.SQLITE_PRAGMAS = {}
+
+
+def worker(args, user, project, task_ids, deadline, results):
+    from django.db import OperationalError, close_old_connections
+    from django.test import Client
+    from django.urls import reverse
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    rng = random.Random()
+    client = Client()
+    client.force_login(user)
+    headers = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(user)}'}
+    while time.monotonic() < deadline:
+        operation = rng.choice(OPERATIONS)
+        task_id = rng.choice(task_ids)
+        start = time.perf_counter()
+        try:
+            if operation == 'comment':
+                response = client.post(
+                    reverse('task_detail', args=[task_id]), {'content': 'Komentarz', 'comment_submit': '1'}
+                )
+            elif operation == 'move':
+                before, after = rng.sample(task_ids, 2)
+                response = client.post(
+                    reverse('task_move', args=[task_id]), {'status': 'todo', 'after': after, 'before': before},
+                    content_type='application/json', **headers
+                )
+            else:
+                response = client.post(
+                    reverse('task_bulk_update'),
+                    {'tasks': [{'id': pk, 'priority': rng.choice(['low', 'high'])} for pk in rng.sample(task_ids, 20)]},
+                    content_type='application/json', **headers
+                )
+            results.append((operation, (time.perf_counter() - start) * 1000, response.status_code < 500))
+        except OperationalError:
+            results.append((operation, (time.perf_counter() - start) * 1000, False))
+        finally:
+            # The test client keeps connections open; do what the request
+            # handler does at the end of a request.
+            close_old_connections()
+
+
+def run_profile(args):
+    with tempfile.TemporaryDirectory() as directory:
+        from django.conf import settings
+
+        configure(args.profile)
+        setup_django(os.path.join(directory, 'benchmark.sqlite3'))
+        settings.DEBUG = False
+        settings.MEDIA_ROOT = os.path.join(directory, 'media')
+        from django.test.utils import setup_test_environment
+        setup_test_environment()
+
+        from django.db import connections
+
+        from apps.accounts.datagen import generate_dataset
+        from apps.accounts.models import Project, Task
+
+        generate_dataset(2, args.threads, 1, args.tasks, 1, seed=args.seed)
+        project = Project.objects.select_related('team').order_by('pk').first()
+        users = list(project.team.members.all())
+        # Card moves need neighbours in the same column.
+        Task.objects.filter(project=project).update(status='todo')
+        task_ids = list(Task.objects.filter(project=project).values_list('pk', flat=True))
+        connections.close_all()
+
+        results = []
+        deadline = time.monotonic() + args.seconds
+        threads = [
+            threading.Thread(target=worker, args=(args, users[i % len(users)], project, task_ids, deadline, results))
+            for i in range(args.threads)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    timings = [elapsed for _, elapsed, ok in results if ok]
+    report = {
+        'profile': args.profile,
+        'requests': len(results),
+        'errors': sum(1 for *_, ok in results if not ok),
+        'throughput': round(len(timings) / args.seconds, 1),
+        'p50_ms': round(statistics.median(timings), 2) if timings else None,
+        'p95_ms': round(percentile(timings, 0.95), 2) if timings else None,
+    }
+    print(json.dumps(report))
+
+
+def main():
+    args = parse_args()
+    if args.profile:
+        run_profile(args)
+        return
+
+    print(f'{args.threads} threads for {args.seconds:g}s each')
+    for profile in PROFILES:
+        command = [
+            sys.executable, __file__, '--profile', profile, '--threads', str(args.threads),
+            '--seconds', str(args.seconds), '--tasks', str(args.tasks), '--seed', str(args.seed),
+        ]
+        output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+        report = json.loads(output.strip().splitlines()[-1])
+        print(
+            f'{profile:<6} {report["throughput"]:8.1f} req/s   p50 {report["p50_ms"]} ms   '
+            f'p95 {report["p95_ms"]} ms   errors {report["errors"]} of {report["requests"]}'
+        )
+
+
+if __name__ == '__main__':
+    main()
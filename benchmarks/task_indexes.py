@@ -0,0 +1,164 @@
+"""
+Compare the hot Task/Comment query shapes with and without their composite
+indexes (accounts.0004_hot_query_indexes, the board index from 0007).
+
+Builds a throwaway SQLite database, fills it with generated data, then prints
+the query plan and latency of each query with the indexes in place and after
+dropping them:
+
+    python benchmarks/task_indexes.py --tasks 200000 --comments 400000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import timedelta
+
+from common import percentile, setup_django
+
+BATCH_SIZE = 5000
+BENCHMARKED_INDEXES = {
+    'Task': ['task_assignee_due_idx', 'task_project_position_idx'],
+    'Comment': ['comment_task_created_idx'],
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--projects', type=int, default=100)
+    parser.add_argument('--tasks', type=int, default=100000)
+    parser.add_argument('--comments', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args()
+
+
+def generate(args):
+    from django.contrib.auth.hashers import make_password
+    from django.utils import timezone
+
+    from apps.accounts.models import User, Team, Project, Task, Comment
+
+    rng = random.Random(args.seed)
+    password = make_password('benchmark')
+    users = User.objects.bulk_create(
+        User(username=f'user{i}', email=f'user{i}@example.com', password=password)
+        for i in range(args.users)
+    )
+    team = Team.objects.create(name='Benchmark', owner=users[0])
+    team.members.add(*users)
+    projects = Project.objects.bulk_create(
+        Project(name=f'Project {i}', team=team) for i in range(args.projects)
+    )
+
+    now = timezone.now()
+    statuses = [status for status, _ in Task.STATUS_CHOICES]
+    priorities = [priority for priority, _ in Task.PRIORITY_CHOICES]
+    for start in range(0, args.tasks, BATCH_SIZE):
+        Task.objects.bulk_create(
+            Task(
+                title=f'Task {i}',
+                project=rng.choice(projects),
+                assigned_to=rng.choice(users),
+                created_by=rng.choice(users),
+                status=rng.choice(statuses),
+                priority=rng.choice(priorities),
+                due_date=(now + timedelta(days=rng.randint(-30, 60))).date() if rng.random() < 0.7 else None,
+            )
+            for i in range(start, min(start + BATCH_SIZE, args.tasks))
+        )
+
+    task_ids = list(Task.objects.values_list('pk', flat=True))
+    for start in range(0, args.comments, BATCH_SIZE):
+        Comment.objects.bulk_create(
+            Comment(task_id=rng.choice(task_ids), author=rng.choice(users), content='Komentarz')
+            for _ in range(start, min(start + BATCH_SIZE, args.comments))
+        )
+    return users, projects, task_ids
+
+
+def query_shapes(users, projects, task_ids, rng):
+    from apps.accounts.models import Task, Comment
+
+    return {
+        'dashboard urgent tasks': lambda: Task.objects.filter(
+            assigned_to=rng.choice(users), status__in=['todo', 'in_progress']
+        ).order_by('due_date')[:10],
+        'kanban column': lambda: Task.objects.filter(
+            project=rng.choice(projects), status='in_progress'
+        ).order_by('position', 'id')[:50],
+        'task comments': lambda: Comment.objects.filter(
+            task_id=rng.choice(task_ids)
+        ).order_by('created_at'),
+    }
+
+
+def measure(shapes, repeat):
+    results = {}
+    for name, build in shapes.items():
+        plan = build().explain()
+        timings = []
+        for _ in range(repeat):
+            queryset = build()
+            start = time.perf_counter()
+            list(queryset)
+            timings.append((time.perf_counter() - start) * 1000)
+        results[name] = {
+            'plan': plan,
+            'median': statistics.median(timings),
+            'p95': percentile(timings, 0.95),
+        }
+    return results
+
+
+def drop_indexes():
+    from django.db import connection
+
+    from apps.accounts import models
+
+    with connection.schema_editor() as schema_editor:
+        for model_name, index_names in BENCHMARKED_INDEXES.items():
+            model = getattr(models, model_name)
+            for index in model._meta.indexes:
+                if index.name in index_names:
+                    schema_editor.remove_index(model, index)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def report(before, after):
+    for name in after:
+        print(f'== {name}')
+        print(f'   without indexes: median {before[name]["median"]:.3f} ms, p95 {before[name]["p95"]:.3f} ms')
+        print(f'   plan: {before[name]["plan"]}')
+        print(f'   with indexes:    median {after[name]["median"]:.3f} ms, p95 {after[name]["p95"]:.3f} ms')
+        print(f'   plan: {after[name]["plan"]}')
+        speedup = before[name]['median'] / after[name]['median'] if after[name]['median'] else float('inf')
+        print(f'   speedup: {speedup:.1f}x')
+
+
+def main():
+    args = parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        setup_django(os.path.join(directory, 'benchmark.sqlite3'))
+
+        from django.db import connection
+
+        started = time.perf_counter()
+        users, projects, task_ids = generate(args)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        print(f'Generated {args.tasks} tasks and {args.comments} comments in {time.perf_counter() - started:.1f}s')
+
+        after = measure(query_shapes(users, projects, task_ids, random.Random(args.seed)), args.repeat)
+        drop_indexes()
+        before = measure(query_shapes(users, projects, task_ids, random.Random(args.seed)), args.repeat)
+        report(before, after)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,74 @@
+import os
 from pathlib import Path
 from datetime import timedelta
 BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = '8)&ho-cp9y4aw&92%6@b_a*9hn2ge&jq0&4)_zelm1odz4x=c@'
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # Django's sqlite3 backend with OPTIONS['transaction_mode'] backported.
+        'ENGINE': 'apps.accounts.sqlite',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Reuse connections between requests. myproject/asgi.py turns this
+        # off: under ASGI every request gets a new connection anyway.
+        'CONN_MAX_AGE': int(os.environ.get('DATABASE_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Take the write lock at BEGIN so that concurrent transactions
+            # queue on busy_timeout instead of failing with "database is locked".
+            'transaction_mode': 'IMMEDIATE',
+        },
+    }
+}
+
+# Set on every new SQLite connection. WAL lets readers run during a write;
+# with it synchronous=NORMAL is safe and fsyncs only at checkpoints.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 ** 2,
+    'cache_size': -64 * 1024,
+    'temp_store': 'memory',
+}
+
+# Read replicas as comma-separated SQLite files, e.g.
+# DATABASE_REPLICAS=replica1.sqlite3,replica2.sqlite3; `manage.py
+# sync_replicas` copies the primary into them. Requests read from a replica
+# unless the client wrote in the last REPLICA_PIN_SECONDS, which has to be
+# longer than the replication lag.
+DATABASE_REPLICAS = []
+for index, name in enumerate(filter(None, os.environ.get('DATABASE_REPLICAS', '').split(',')), start=1):
+    DATABASES[f'replica{index}'] = {**DATABASES['default'], 'NAME': BASE_DIR / name.strip(), 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(f'replica{index}')
+REPLICA_PIN_SECONDS = 15
+
+# Optional sharding by team, see apps/accounts/sharding.py:
+# DATABASE_SHARDS=shard0.sqlite3,shard1.sqlite3 keeps teams with their
+# projects, tasks and files in those files (`manage.py migrate
+# --database=shardN` each) and users, sessions, the change log and jobs in
+# 'default'.
+DATABASE_SHARDS = []
+for index, name in enumerate(filter(None, os.environ.get('DATABASE_SHARDS', '').split(','))):
+    DATABASES[f'shard{index}'] = {**DATABASES['default'], 'NAME': BASE_DIR / name.strip()}
+    DATABASE_SHARDS.append(f'shard{index}')
+DATABASE_ROUTERS = ['apps.accounts.sharding.ShardRouter', 'apps.accounts.routers.PrimaryReplicaRouter']
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
+MEMBERSHIP_CACHE_TIMEOUT = 60 * 60
+
+# Live board updates. The in-process broker only reaches clients of the same
+# worker; with several ASGI workers set BOARD_EVENTS_BROKER to
+# 'apps.accounts.events.RedisBroker' and REDIS_URL.
+BOARD_EVENTS_BROKER = os.environ.get('BOARD_EVENTS_BROKER', 'apps.accounts.events.InProcessBroker')
+BOARD_EVENTS_BROKER_OPTIONS = {}
+if BOARD_EVENTS_BROKER.endswith('RedisBroker'):
+    BOARD_EVENTS_BROKER_OPTIONS['url'] = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+
 INSTALLED_APPS = [
     'django.contrib.admin',
     'django.contrib.auth',
@@ -22,11 +82,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'apps.accounts.middleware.QueryCountMiddleware',
+    'apps.accounts.middleware.FragmentCacheMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'apps.accounts.middleware.ShardDirectoryMiddleware',
+    'apps.accounts.middleware.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -76,6 +140,30 @@ USE_TZ = True
 STATIC_URL = '/static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+
+# Partial chunked uploads live outside MEDIA_ROOT until they are complete;
+# keep it on the same filesystem so finished files are moved, not copied.
+UPLOAD_SESSION_DIR = BASE_DIR / 'uploads'
+UPLOAD_SESSION_MAX_AGE = timedelta(days=1)
+ATTACHMENT_MAX_SIZE = 2 * 1024 ** 3
+
+# Media is served only through permission-checked views. Behind nginx set
+# SENDFILE_BACKEND=x-accel-redirect and map SENDFILE_URL to MEDIA_ROOT in an
+# internal location; Apache/lighttpd with mod_xsendfile use x-sendfile.
+SENDFILE_BACKEND = os.environ.get('SENDFILE_BACKEND', '')
+SENDFILE_URL = '/protected-media/'
+
+# Background jobs are stored in the database and run by `manage.py run_jobs`.
+# With JOB_QUEUE_EAGER they run in the web process after commit instead.
+JOB_QUEUE_EAGER = False
+JOB_WORKER_CONCURRENCY = 4
+# Running jobs older than this are assumed to have lost their worker.
+JOB_TIMEOUT = timedelta(minutes=15)
+JOB_RETENTION = timedelta(days=7)
+
+# Sync clients whose cursor is older than this have to download everything
+# again; see the compact_changes command.
+CHANGE_LOG_RETENTION = timedelta(days=30)
 DEBUG = True
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 ALLOWED_HOSTS = ['localhost', '127.0.0.1']
@@ -88,6 +176,23 @@ LOGOUT_REDIRECT_URL = '/accounts/login/'
 
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'apps.accounts.queries': {
+            'handlers': ['console'],
+            'level': os.environ.get('QUERY_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework_simplejwt.authentication.JWTAuthentication',
@@ -95,6 +200,10 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'apps.accounts.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
 